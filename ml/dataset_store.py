@@ -0,0 +1,200 @@
+"""
+Sharded, memory-mappable dataset store
+
+Layout:
+    training_data/
+    ├── manifest.json          # fields, dtypes and row count of every shard
+    ├── shard_0000/
+    │   ├── boards.npy         # one raw .npy per field
+    │   ├── sides.npy
+    │   └── ...
+    └── shard_0001/...
+
+Shards are plain uncompressed .npy files, so open_dataset() maps them with
+mmap_mode='r': training starts without decompressing anything, several
+trainers share the OS page cache, and datasets larger than RAM work.
+
+Shards may be written one at a time (gen_data converts each game batch as
+soon as it finishes), so the policy fields of different shards can have
+different widths K; reads pad the narrower ones (see PAD_VALUES).
+"""
+
+import json
+import os
+import shutil
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from makhos.encoding import PAD_VALUES
+
+MANIFEST = "manifest.json"
+STORE_VERSION = 1
+
+
+def is_sharded(path: str) -> bool:
+    """True if path is a sharded dataset directory"""
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def read_manifest(root: str) -> dict:
+    """Manifest of a store (an empty one if the store doesn't exist yet)"""
+    path = os.path.join(root, MANIFEST)
+    if not os.path.exists(path):
+        return {'version': STORE_VERSION, 'fields': {}, 'shards': []}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_manifest(root: str, manifest: dict):
+    """Atomically replace the manifest (readers never see a partial file)"""
+    tmp = os.path.join(root, MANIFEST + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(root, MANIFEST))
+
+
+def write_shard(root: str, name: str, dataset: Dict[str, np.ndarray], params: Optional[dict] = None) -> dict:
+    """
+    Write one shard and register it in the manifest
+
+    Field files are written into a temporary directory that is renamed into
+    place, and the manifest is only updated afterwards, so a crash mid-write
+    never leaves a half shard that readers would pick up. Writing a shard
+    that already exists replaces it.
+
+    params (e.g. the settings the shard was encoded with) are kept in its
+    manifest entry, so a later run can tell whether it is still up to date.
+
+    Returns:
+        the shard's manifest entry
+    """
+    rows = {len(array) for array in dataset.values()}
+    if len(rows) != 1:
+        raise ValueError(f"Shard {name}: fields have different row counts {sorted(rows)}")
+
+    os.makedirs(root, exist_ok=True)
+    shard_dir = os.path.join(root, name)
+    tmp_dir = shard_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for field, array in dataset.items():
+        np.save(os.path.join(tmp_dir, f"{field}.npy"), np.ascontiguousarray(array))
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    os.rename(tmp_dir, shard_dir)
+
+    entry = {'name': name, 'rows': rows.pop()}
+    if params:
+        entry['params'] = params
+    manifest = read_manifest(root)
+    for field, array in dataset.items():
+        shape = list(array.shape[1:])
+        known = manifest['fields'].get(field)
+        if known and len(known['shape']) == len(shape):
+            # shards can differ in policy width K; record the widest
+            shape = [max(a, b) for a, b in zip(known['shape'], shape)]
+        manifest['fields'][field] = {'dtype': np.dtype(array.dtype).str, 'shape': shape}
+    manifest['shards'] = [s for s in manifest['shards'] if s['name'] != name] + [entry]
+    manifest['shards'].sort(key=lambda s: s['name'])
+    write_manifest(root, manifest)
+    return entry
+
+
+def remove_shards(root: str, names: List[str]):
+    """Unregister shards from the manifest, then delete their directories"""
+    names = set(names)
+    manifest = read_manifest(root)
+    manifest['shards'] = [s for s in manifest['shards'] if s['name'] not in names]
+    write_manifest(root, manifest)
+    for name in names:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def save_sharded(dataset: Dict[str, np.ndarray], root: str, shard_size: int = 250_000) -> List[dict]:
+    """
+    Write a whole in-memory dataset as a fresh sharded store
+
+    Returns:
+        manifest entries of the written shards
+    """
+    os.makedirs(root, exist_ok=True)
+    write_manifest(root, {'version': STORE_VERSION, 'fields': {}, 'shards': []})
+    num_rows = len(next(iter(dataset.values())))
+    entries = []
+    for shard_idx, start in enumerate(range(0, max(num_rows, 1), shard_size)):
+        chunk = {field: array[start:start + shard_size] for field, array in dataset.items()}
+        entries.append(write_shard(root, f"shard_{shard_idx:04d}", chunk))
+    return entries
+
+
+class ShardedColumn:
+    """
+    One field across all shards, indexable by global row id
+
+    Supports len(), .shape / .dtype and indexing with an int, a slice or an
+    integer array; reads go straight to the memory-mapped shard files.
+    Parts narrower than the widest one (policy fields with a smaller K) are
+    padded with fill.
+    """
+
+    def __init__(self, parts: List[np.ndarray], fill=0):
+        self.parts = parts
+        self.fill = fill
+        self.offsets = np.cumsum([0] + [len(p) for p in parts])
+        self.dtype = parts[0].dtype
+        widest = max(parts, key=lambda p: p.shape[1:])
+        self.shape = (int(self.offsets[-1]),) + widest.shape[1:]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _fill_from(self, out: np.ndarray, sel, part: np.ndarray, rows):
+        if part.shape[1:] == self.shape[1:]:
+            out[sel] = part[rows]
+        else:
+            out[(sel, slice(0, part.shape[1]))] = part[rows]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            idx = np.arange(*idx.indices(len(self)))
+        scalar = np.ndim(idx) == 0
+        idx = np.atleast_1d(np.asarray(idx, dtype=np.int64))
+        idx = np.where(idx < 0, idx + len(self), idx)
+
+        out = np.full((len(idx),) + self.shape[1:], self.fill, dtype=self.dtype)
+        shard = np.searchsorted(self.offsets, idx, side='right') - 1
+        for s in np.unique(shard):
+            sel = shard == s
+            self._fill_from(out, sel, self.parts[s], idx[sel] - self.offsets[s])
+        return out[0] if scalar else out
+
+    def __array__(self, dtype=None, copy=None):
+        out = self[:] if self.parts else np.empty(self.shape, self.dtype)
+        return out.astype(dtype) if dtype is not None else out
+
+
+def open_dataset(root: str, fields: Optional[List[str]] = None,
+                 mmap_mode: Optional[str] = 'r') -> Dict[str, Union[np.ndarray, ShardedColumn]]:
+    """
+    Open a sharded store without reading it into memory
+
+    Args:
+        root: store directory
+        fields: fields to open (default: all)
+        mmap_mode: passed to np.load ('r' = read-only memory map, None = load into RAM)
+
+    Returns:
+        dict of field -> array-like (a plain memory map for single-shard
+        stores, a ShardedColumn otherwise)
+    """
+    manifest = read_manifest(root)
+    if not manifest['shards']:
+        raise FileNotFoundError(f"No shards in {root}")
+    fields = fields or list(manifest['fields'])
+
+    data = {}
+    for field in fields:
+        parts = [np.load(os.path.join(root, s['name'], f"{field}.npy"), mmap_mode=mmap_mode)
+                 for s in manifest['shards']]
+        data[field] = parts[0] if len(parts) == 1 else ShardedColumn(parts, PAD_VALUES.get(field, 0))
+    return data
@@ -0,0 +1,217 @@
+"""
+Transposition-aware deduplication of compact datasets
+
+Self-play from the initial position repeats the same openings in many games,
+so the same state shows up as many separate rows. dedup_dataset() keys every
+row on a 64-bit Zobrist hash of its full state (bitboards, side to move,
+halfmove clock) and merges each group of identical states into one row:
+
+  - values / search_scores / evaluations: averaged over the occurrences
+  - policy: the occurrences' (index, prob) pairs summed per move and
+    averaged, keeping the most probable MAX_POLICY_K moves (renormalized)
+  - weights: number of occurrences, used by train.py as a per-row loss
+    weight so a deduplicated epoch optimizes the same objective as the
+    original one with fewer rows
+
+Already-deduplicated data (with a weights field) can be merged again, e.g.
+after adding new batches; weights then add up.
+
+Usage:
+    python dedup.py --data training_data --output training_data_dedup
+"""
+
+import argparse
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+
+from dataset_store import is_sharded, open_dataset, save_sharded
+from material_index import write_material_index
+from makhos.encoding import MAX_POLICY_K, normalize_policy_probs, unpack_boards
+
+_rng = np.random.default_rng(0xC0FFEE)
+PIECE_KEYS = _rng.integers(0, 2**64, size=(4, 32), dtype=np.uint64, endpoint=False)
+SIDE_KEY = _rng.integers(0, 2**64, dtype=np.uint64, endpoint=False)  # xored in when P2 is to move
+HALFMOVE_KEYS = _rng.integers(0, 2**64, size=256, dtype=np.uint64, endpoint=False)
+del _rng
+
+# Fields averaged over the occurrences of a state (weighted by occurrence count)
+MEAN_FIELDS = ('values', 'search_scores', 'evaluations')
+
+
+def position_hashes(boards: np.ndarray, sides: np.ndarray, halfmoves: np.ndarray,
+                    chunk_size: int = 65536) -> np.ndarray:
+    """
+    64-bit Zobrist hash of each position
+
+    Args:
+        boards: (N, 4) uint32 bitboards
+        sides: (N,) side to move
+        halfmoves: (N,) halfmove clocks
+
+    Returns:
+        (N,) uint64 hashes
+    """
+    n = len(boards)
+    hashes = np.empty(n, dtype=np.uint64)
+    piece_keys = PIECE_KEYS.reshape(1, 128)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        bits = unpack_boards(np.asarray(boards[start:stop])).reshape(-1, 128).astype(bool)
+        h = np.bitwise_xor.reduce(np.where(bits, piece_keys, np.uint64(0)), axis=1)
+        h ^= np.where(np.asarray(sides[start:stop]) == -1, SIDE_KEY, np.uint64(0))
+        h ^= HALFMOVE_KEYS[np.asarray(halfmoves[start:stop], dtype=np.intp)]
+        hashes[start:stop] = h
+    return hashes
+
+
+def group_positions(boards: np.ndarray, sides: np.ndarray, halfmoves: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Group identical positions
+
+    Groups are numbered in order of first appearance. Hash collisions are
+    checked against the full state; if any are found, grouping falls back to
+    the exact state for that dataset.
+
+    Returns:
+        group: (N,) group id of each row
+        first: (G,) row of each group's first occurrence
+    """
+    hashes = position_hashes(boards, sides, halfmoves)
+    _, first, group = np.unique(hashes, return_index=True, return_inverse=True)
+
+    state = np.column_stack([boards, np.asarray(sides).astype(np.uint32), np.asarray(halfmoves).astype(np.uint32)])
+    collisions = (state != state[first][group]).any(axis=1)
+    if collisions.any():
+        print(f"  {collisions.sum()} hash collisions, grouping on exact states")
+        _, first, group = np.unique(state, axis=0, return_index=True, return_inverse=True)
+
+    group = group.reshape(-1)
+    order = np.argsort(first, kind='stable')   # renumber by first appearance
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[group], first[order]
+
+
+def merge_policies(policy_indices: np.ndarray, policy_probs: np.ndarray, group: np.ndarray,
+                   weights: np.ndarray, num_groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Weighted average of the sparse policies of each group
+
+    Returns:
+        policy_indices (G, K) int16, policy_probs (G, K) float16, with K the
+        widest merged policy capped at MAX_POLICY_K (renormalized when capped)
+    """
+    rows, cols = np.nonzero(policy_indices >= 0)
+    g = group[rows].astype(np.int64)
+    key = g * 1024 + policy_indices[rows, cols]
+    keys, inverse = np.unique(key, return_inverse=True)
+    mass = np.bincount(inverse.reshape(-1), weights=policy_probs[rows, cols].astype(np.float64) * weights[rows])
+    key_group = keys // 1024
+    mass /= np.bincount(group, weights=weights, minlength=num_groups)[key_group]
+
+    # Most probable moves first within each group, then keep the top K
+    order = np.lexsort((-mass, key_group))
+    key_group, keys, mass = key_group[order], keys[order], mass[order]
+    starts = np.searchsorted(key_group, np.arange(num_groups))
+    rank = np.arange(len(keys)) - starts[key_group]
+    k = int(min(max(rank.max() + 1 if len(rank) else 1, 1), MAX_POLICY_K))
+    keep = rank < k
+
+    indices = np.full((num_groups, k), -1, dtype=np.int16)
+    probs = np.zeros((num_groups, k), dtype=np.float64)
+    indices[key_group[keep], rank[keep]] = keys[keep] % 1024
+    probs[key_group[keep], rank[keep]] = mass[keep]
+    return indices, normalize_policy_probs(probs)
+
+
+def dedup_dataset(dataset: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Merge rows with identical states (see module docstring)
+
+    Args:
+        dataset: compact dataset (plain arrays or memory-mapped columns)
+
+    Returns:
+        deduplicated dataset with a float32 weights field; values become
+        float32 averages
+    """
+    boards = np.asarray(dataset['boards'])
+    sides = np.asarray(dataset['sides'])
+    halfmoves = np.asarray(dataset['halfmoves'])
+    group, first = group_positions(boards, sides, halfmoves)
+    num_groups = len(first)
+
+    weights = np.asarray(dataset['weights'], dtype=np.float64) if 'weights' in dataset else np.ones(len(group))
+    counts = np.bincount(group, weights=weights, minlength=num_groups)
+
+    out = {}
+    for name in dataset:
+        if name in MEAN_FIELDS:
+            totals = np.bincount(group, weights=np.asarray(dataset[name], dtype=np.float64) * weights,
+                                 minlength=num_groups)
+            out[name] = (totals / counts).astype(np.float32)
+        elif name == 'policy_indices':
+            out['policy_indices'], out['policy_probs'] = merge_policies(
+                np.asarray(dataset['policy_indices']), np.asarray(dataset['policy_probs']), group, weights,
+                num_groups)
+        elif name not in ('policy_probs', 'weights'):
+            out[name] = np.asarray(dataset[name])[first]
+    out['weights'] = counts.astype(np.float32)
+    return out
+
+
+def print_dedup_stats(num_rows: int, deduped: Dict[str, np.ndarray]):
+    weights = deduped['weights']
+    print(f"\n{'='*60}")
+    print(f"DEDUPLICATION")
+    print(f"{'='*60}")
+    print(f"  Rows: {num_rows:,} → {len(weights):,} ({len(weights) / max(num_rows, 1) * 100:.1f}%)")
+    print(f"  Repeated states: {(weights > 1).sum():,} (max {weights.max() if len(weights) else 0:.0f} occurrences)")
+    print(f"  Policy width K: {deduped['policy_indices'].shape[1]}")
+    print(f"{'='*60}")
+
+
+def dedup_path(data_path: str, output_path: str) -> Dict[str, np.ndarray]:
+    """Deduplicate a sharded store or .npz file into output_path (directory or .npz)"""
+    if is_sharded(data_path):
+        dataset = open_dataset(data_path)
+    else:
+        with np.load(data_path) as npz:
+            dataset = {name: npz[name] for name in npz.files}
+
+    num_rows = len(dataset['boards'])
+    deduped = dedup_dataset(dataset)
+    print_dedup_stats(num_rows, deduped)
+
+    if output_path.endswith('.npz'):
+        np.savez_compressed(output_path, **deduped)
+    else:
+        save_sharded(deduped, output_path)
+    write_material_index(output_path, deduped['boards'])
+    print(f"  Saved to: {output_path}")
+    return deduped
+
+
+def dedup_output_path(data_path: str) -> str:
+    """Default output of dedup_path(): training_data -> training_data_dedup"""
+    root, ext = os.path.splitext(data_path.rstrip('/'))
+    return f"{root}_dedup{ext}" if ext == '.npz' else f"{data_path.rstrip('/')}_dedup"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge duplicate positions of a training dataset")
+    parser.add_argument("--data", type=str, default="training_data", help="Input dataset directory or .npz file")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Output directory or .npz file (default: <data>_dedup)")
+    args = parser.parse_args()
+
+    output = args.output or dedup_output_path(args.data)
+    if os.path.abspath(output) == os.path.abspath(args.data):
+        parser.error("--output must differ from --data")
+    dedup_path(args.data, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,8 @@ import argparse
 import torch
 import torch.onnx
 from model import create_model
+from makhos import initial_position
+from makhos.encoding import encode_states
 
 def export_to_onnx(
     model_path: str,
@@ -47,8 +49,8 @@ def export_to_onnx(
     print(f"Model loaded on {device}")
     print(f"  Parameters: {sum(p.numel() for p in model.parameters()):,}")
 
-    # Create dummy input (batch_size=1, channels=6, squares=32)
-    dummy_input = torch.randn(1, 6, 32).to(device)
+    # Example input: the initial position (batch_size=1, channels=6, squares=32)
+    dummy_input = torch.from_numpy(encode_states([initial_position()])).to(device)
 
     # Export to ONNX
     print(f"\nExporting to ONNX...")
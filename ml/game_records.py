@@ -0,0 +1,278 @@
+"""
+Game record streams written by scripts/generate_games.ts
+
+The generator appends one compact JSON record per finished game:
+
+    games_batch_0000.ndjson       # one game per line
+    games_batch_0000.ndjson.gz    # same, each line its own gzip member
+
+A batch is written as <name>.partial while the generator runs and renamed
+to <name> when it finishes. Records can be read while the file is still
+growing (RecordReader.poll), and a truncated last record - a killed
+generator - is simply not returned.
+
+Older batches are a single pretty-printed JSON array (games_batch_0000.json);
+iter_game_records() reads those too.
+
+Crash safety: every record carries its game id, and the generator appends
+the id to completed_games.txt (next to the batches) only after the record
+is fsynced. Before a batch is resumed, repair_journal() cuts its .partial
+journal back to the records listed there, so a crash costs at most the
+game each worker had in flight.
+"""
+
+import gzip
+import json
+import math
+import os
+import zlib
+from typing import Iterable, Iterator, List, Optional, Set
+
+RECORD_EXTENSIONS = ('.ndjson.gz', '.ndjson', '.json')
+PARTIAL_SUFFIX = '.partial'
+COMPLETED_MANIFEST = 'completed_games.txt'
+# Softmax temperature (in search score units, a man is ~100) for multi-PV policy targets
+DEFAULT_POLICY_TEMPERATURE = 50.0
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class RecordReader:
+    """
+    Incremental reader over a (possibly still growing) record stream
+
+    poll() returns the records completed since the previous call. The file is
+    opened lazily, trying each path in order, so a reader can follow
+    <name>.partial and still find the batch after it was renamed to <name>.
+    """
+
+    def __init__(self, *paths: str, chunk_size: int = 1 << 20):
+        self.paths = paths
+        self.chunk_size = chunk_size
+        self.file = None
+        self.gzip = paths[0].endswith('.gz') or paths[0].endswith('.gz' + PARTIAL_SUFFIX)
+        self.decompressor = zlib.decompressobj(_GZIP_WBITS) if self.gzip else None
+        self.pending = b''
+        self.records_read = 0
+
+    def _open(self) -> bool:
+        for path in self.paths:
+            try:
+                self.file = open(path, 'rb')
+                return True
+            except FileNotFoundError:
+                continue
+        return False
+
+    def _decompress(self, data: bytes) -> bytes:
+        # Every record is its own gzip member, so restart the decompressor
+        # at each member boundary
+        out = []
+        while data:
+            out.append(self.decompressor.decompress(data))
+            if not self.decompressor.eof:
+                break
+            data = self.decompressor.unused_data
+            self.decompressor = zlib.decompressobj(_GZIP_WBITS)
+        return b''.join(out)
+
+    def skip_existing(self):
+        """Start following from the current end of the file (if it exists yet)"""
+        if self.file is None and self._open():
+            self.file.seek(0, os.SEEK_END)
+
+    def poll(self) -> List[dict]:
+        """Records completed since the last call (empty if nothing new)"""
+        if self.file is None and not self._open():
+            return []
+
+        records = []
+        while True:
+            data = self.file.read(self.chunk_size)
+            if not data:
+                break
+            if self.gzip:
+                data = self._decompress(data)
+            lines = (self.pending + data).split(b'\n')
+            self.pending = lines.pop()
+            records.extend(json.loads(line) for line in lines if line.strip())
+        self.records_read += len(records)
+        return records
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_game_records(path: str) -> Iterator[dict]:
+    """
+    Yield the games of one batch file, one record at a time
+
+    NDJSON batches are streamed chunk by chunk; legacy .json batches are a
+    single array and have to be loaded whole.
+    """
+    if path.endswith('.json'):
+        with open(path, 'r') as f:
+            yield from json.load(f)
+        return
+
+    with RecordReader(path) as reader:
+        while True:
+            records = reader.poll()
+            if not records:
+                break
+            yield from records
+
+
+def position_policy_pairs(pos_data: dict, temperature: Optional[float] = DEFAULT_POLICY_TEMPERATURE) -> List[List[float]]:
+    """
+    Sparse policy target of a recorded position as [[index, prob], ...]
+
+    Positions searched with multi-PV carry `rootScores`, the search scores of
+    the top-K root moves; with a temperature they become a softmax
+    distribution over those moves. Without (temperature None / 0) the
+    recorded one-hot policy is used.
+
+    Older batch files carry a dense 1024-float `policyTarget` instead of
+    `policy` pairs; those are converted here.
+    """
+    if temperature and len(pos_data.get('rootScores') or []) > 1:
+        return softmax_policy(pos_data['rootScores'], temperature)
+    if 'policy' in pos_data:
+        return pos_data['policy']
+    dense = pos_data['policyTarget']
+    return [[i, p] for i, p in enumerate(dense) if p > 0]
+
+
+def softmax_policy(root_scores: List[List[float]], temperature: float) -> List[List[float]]:
+    """[[index, score], ...] -> [[index, prob], ...] with prob ~ exp(score / temperature)"""
+    best = max(score for _, score in root_scores)
+    weights = [math.exp((score - best) / temperature) for _, score in root_scores]
+    total = sum(weights)
+    return [[index, weight / total] for (index, _), weight in zip(root_scores, weights) if weight > 0]
+
+
+def batch_name(batch_idx: int) -> str:
+    return f"games_batch_{batch_idx:04d}"
+
+
+def find_batch_file(output_dir: str, batch_idx: int) -> Optional[str]:
+    """Finished batch file for batch_idx in any supported format, or None"""
+    for ext in RECORD_EXTENSIONS:
+        path = os.path.join(output_dir, batch_name(batch_idx) + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def list_batch_files(output_dir: str) -> List[str]:
+    """All finished batch files in output_dir, sorted by name"""
+    if not os.path.isdir(output_dir):
+        return []
+    return sorted(
+        os.path.join(output_dir, name) for name in os.listdir(output_dir)
+        if name.startswith("games_batch_") and name.endswith(RECORD_EXTENSIONS)
+    )
+
+
+def read_completed_ids(manifest_path: str) -> Set[int]:
+    """Game ids in a completed-games manifest (a torn last line is ignored)"""
+    if not os.path.exists(manifest_path):
+        return set()
+    with open(manifest_path, 'r') as f:
+        text = f.read()
+    lines = text.split('\n')[:-1]  # only newline-terminated entries count
+    return {int(line) for line in lines if line.strip()}
+
+
+def repair_manifest(manifest_path: str) -> Set[int]:
+    """Rewrite the manifest without a torn last line; returns the completed ids"""
+    completed = read_completed_ids(manifest_path)
+    if os.path.exists(manifest_path):
+        write_manifest(manifest_path, completed)
+    return completed
+
+
+def write_manifest(manifest_path: str, completed: Iterable[int]):
+    """Atomically (re)write a completed-games manifest"""
+    _write_atomic(manifest_path, ''.join(f"{i}\n" for i in sorted(completed)).encode())
+
+
+def repair_journal(journal_path: str, completed: Set[int]) -> int:
+    """
+    Cut a .partial journal back to complete records whose id is in completed
+
+    Drops a truncated last record, records written after the last manifest
+    entry, and duplicates of a game id. The journal keeps its compression.
+
+    Returns:
+        number of records kept
+    """
+    if not os.path.exists(journal_path):
+        return 0
+    kept, seen = [], set()
+    for record in iter_game_records(journal_path):
+        if record.get('id') in completed and record['id'] not in seen:
+            seen.add(record['id'])
+            kept.append(record)
+    write_records(journal_path, kept)
+    return len(kept)
+
+
+class GameJournal:
+    """
+    Python-side writer of a batch journal, same format and crash-safety
+    order as openGameWriter() in generate_games.ts: the record is appended
+    to <batch>.partial and fsynced before its id goes into the manifest;
+    close() renames the journal to the finished batch file.
+    """
+
+    def __init__(self, output_file: str, manifest_file: str):
+        self.output_file = output_file
+        self.partial_file = output_file + PARTIAL_SUFFIX
+        self.manifest_file = manifest_file
+        self.gzip = output_file.endswith('.gz')
+        self.file = open(self.partial_file, 'ab')
+
+    def write(self, record: dict):
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+        self.file.write(gzip.compress(line) if self.gzip else line)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        mark_completed(self.manifest_file, record['id'])
+
+    def close(self, finished: bool = True):
+        """Close the journal; a finished batch is renamed to the batch file"""
+        self.file.close()
+        if finished:
+            os.replace(self.partial_file, self.output_file)
+
+
+def mark_completed(manifest_path: str, game_id: int):
+    """Append a game id to the completed-games manifest (fsynced)"""
+    with open(manifest_path, 'a') as f:
+        f.write(f"{game_id}\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_records(path: str, records: Iterable[dict]):
+    """Atomically write records in the generator's format (.gz: one gzip member per record)"""
+    compress = path.endswith('.gz') or path.endswith('.gz' + PARTIAL_SUFFIX)
+    lines = ((json.dumps(record, separators=(',', ':')) + '\n').encode() for record in records)
+    _write_atomic(path, b''.join(gzip.compress(line) if compress else line for line in lines))
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
@@ -0,0 +1,359 @@
+"""
+Optional SQLite game store
+
+Keeps every generated game and position in one indexed database instead of
+loose batch files, so questions like "all positions with <= 4 pieces" or
+"games P2 won" are SQL queries rather than a re-parse of every batch:
+
+    games(id, source, game, batch, result, num_positions)
+    positions(game_id, idx, ply, board, side, halfmove, p1_men, p1_kings,
+              p2_men, p2_kings, pieces, policy, search_depth, search_score,
+              search_nodes, evaluation)
+
+  - games.id is the store's own key; a generated game is identified by
+    (source, game): the batch directory it came from and its id there,
+    since every run numbers its games from 0
+  - idx: position of the row in the game record; ply: the game ply it was
+    recorded at (random, opening and playout-cap fast plies are played but
+    not recorded, so the two differ; NULL for records written before the
+    generator stored it)
+  - board: 16-byte blob, the four uint32 bitboards (little endian)
+  - policy: (int16 move index, float16 prob) pairs, most probable first;
+    multi-PV positions get softmax targets at the store's policy_temperature
+    (use the generation run's, as gen_data does)
+  - indexes on games.result, positions.ply, material (pieces + per-side
+    counts) and positions.search_depth
+
+The `samples` view joins both tables and adds value / search_score from the
+side to move's perspective, exactly like the training data; export() takes
+a WHERE clause over it and streams the selection into a sharded dataset.
+
+Usage:
+    python game_store.py import --db games.sqlite --batch_dir game_batches
+    python game_store.py stats  --db games.sqlite
+    python game_store.py export --db games.sqlite --where "pieces <= 4" --output endgame_data
+"""
+
+import argparse
+import os
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from dataset_store import STORE_VERSION, open_dataset, write_manifest, write_shard
+from game_records import DEFAULT_POLICY_TEMPERATURE, iter_game_records, list_batch_files, position_policy_pairs
+from makhos.encoding import COMPACT_FIELDS, MAX_POLICY_K, PAD_VALUES, normalize_policy_probs, unpack_boards
+from material_index import write_material_index
+
+POLICY_PAIR = np.dtype([('index', '<i2'), ('prob', '<f2')])
+SCHEMA_VERSION = 2  # PRAGMA user_version; 1 keyed games on the record id alone
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL DEFAULT '',
+    game INTEGER,
+    batch TEXT,
+    result INTEGER NOT NULL,
+    num_positions INTEGER NOT NULL,
+    UNIQUE (source, game)
+);
+CREATE TABLE IF NOT EXISTS positions (
+    game_id INTEGER NOT NULL REFERENCES games(id),
+    idx INTEGER NOT NULL,
+    ply INTEGER,
+    board BLOB NOT NULL,
+    side INTEGER NOT NULL,
+    halfmove INTEGER NOT NULL,
+    p1_men INTEGER NOT NULL,
+    p1_kings INTEGER NOT NULL,
+    p2_men INTEGER NOT NULL,
+    p2_kings INTEGER NOT NULL,
+    pieces INTEGER NOT NULL,
+    policy BLOB NOT NULL,
+    search_depth INTEGER,
+    search_score REAL,
+    search_nodes INTEGER,
+    evaluation REAL,
+    PRIMARY KEY (game_id, idx)
+);
+CREATE TABLE IF NOT EXISTS batches (
+    source TEXT NOT NULL,
+    name TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    games INTEGER NOT NULL,
+    PRIMARY KEY (source, name)
+);
+CREATE INDEX IF NOT EXISTS idx_games_result ON games(result);
+CREATE INDEX IF NOT EXISTS idx_games_batch ON games(source, batch);
+CREATE INDEX IF NOT EXISTS idx_positions_ply ON positions(ply);
+CREATE INDEX IF NOT EXISTS idx_positions_material ON positions(pieces, p1_men, p1_kings, p2_men, p2_kings);
+CREATE INDEX IF NOT EXISTS idx_positions_depth ON positions(search_depth);
+CREATE VIEW IF NOT EXISTS samples AS
+    SELECT p.*, g.source, g.game, g.result, g.batch,
+           g.result * p.side AS value,
+           p.search_score * p.side AS side_score
+    FROM positions p JOIN games g ON g.id = p.game_id;
+"""
+
+_SAMPLE_COLUMNS = "board, side, halfmove, policy, value, side_score, evaluation"
+
+
+def encode_policy(pairs: Sequence[Sequence[float]]) -> bytes:
+    """[[index, prob], ...] -> policy blob, most probable first"""
+    top = sorted(pairs, key=lambda pair: -pair[1])
+    return np.array([tuple(pair) for pair in top], dtype=POLICY_PAIR).tobytes()
+
+
+def decode_policies(blobs: Sequence[bytes], k: Optional[int] = None):
+    """
+    Policy blobs -> padded (N, K) policy_indices / policy_probs
+
+    K defaults to the widest policy in blobs, capped at MAX_POLICY_K;
+    policies cut to K moves are renormalized.
+    """
+    pairs = np.frombuffer(b''.join(blobs), dtype=POLICY_PAIR)
+    counts = np.fromiter((len(blob) // POLICY_PAIR.itemsize for blob in blobs), dtype=np.intp, count=len(blobs))
+    if k is None:
+        k = int(min(max(counts.max(initial=1), 1), MAX_POLICY_K))
+    rows = np.repeat(np.arange(len(blobs)), counts)
+    cols = np.arange(len(pairs)) - np.repeat(np.cumsum(counts) - counts, counts)
+    keep = cols < k
+
+    indices = np.full((len(blobs), k), -1, dtype=np.int16)
+    probs = np.zeros((len(blobs), k), dtype=np.float64)
+    indices[rows[keep], cols[keep]] = pairs['index'][keep]
+    probs[rows[keep], cols[keep]] = pairs['prob'][keep]
+    return indices, normalize_policy_probs(probs)
+
+
+def concatenate_samples(chunks: Sequence[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    Join iter_samples() chunks into one dataset; each chunk is only as wide
+    as its widest policy, so narrower policy fields are padded (PAD_VALUES)
+    """
+    width = max(chunk['policy_indices'].shape[1] for chunk in chunks)
+
+    def padded(name: str, column: np.ndarray) -> np.ndarray:
+        if name not in PAD_VALUES or column.shape[1] == width:
+            return column
+        return np.pad(column, ((0, 0), (0, width - column.shape[1])), constant_values=PAD_VALUES[name])
+
+    return {name: np.concatenate([padded(name, chunk[name]) for chunk in chunks]) for name in chunks[0]}
+
+
+class GameStore:
+    """
+    SQLite store of games and positions
+
+    policy_temperature is the softmax temperature of the policies of
+    multi-PV positions inserted through this store (see
+    game_records.position_policy_pairs).
+
+    Example:
+        store = GameStore("games.sqlite")
+        store.add_batch_file("game_batches/games_batch_0000.ndjson")   # source: abspath of game_batches
+        store.count("pieces <= 4 AND result = -1")
+        store.export("endgame_data", "pieces <= 4")
+    """
+
+    def __init__(self, path: str, policy_temperature: float = DEFAULT_POLICY_TEMPERATURE):
+        self.path = path
+        self.policy_temperature = policy_temperature
+        self.db = sqlite3.connect(path)
+        version, = self.db.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION and self.db.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]:
+            self.db.close()
+            raise ValueError(f"{path} uses game store schema {version}, not {SCHEMA_VERSION}; "
+                             f"import the batches into a new store")
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_games(self, games: Iterable[dict], batch: Optional[str] = None, source: str = "") -> int:
+        """
+        Insert game records (replacing the games of source with the same id)
+
+        Returns:
+            number of games inserted
+        """
+        num_games = 0
+        with self.db:
+            for game in games:
+                positions = game['positions']
+                if game.get('id') is not None:
+                    self._delete("source = ? AND game = ?", (source, game['id']))
+                cursor = self.db.execute(
+                    "INSERT INTO games (source, game, batch, result, num_positions) VALUES (?, ?, ?, ?, ?)",
+                    (source, game.get('id'), batch, game['result'], len(positions)))
+                if positions:
+                    self.db.executemany(
+                        "INSERT INTO positions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        self._position_rows(cursor.lastrowid, positions))
+                num_games += 1
+        return num_games
+
+    def _delete(self, where: str, params: Sequence):
+        """Delete the matching games and their positions"""
+        self.db.execute(f"DELETE FROM positions WHERE game_id IN (SELECT id FROM games WHERE {where})", params)
+        self.db.execute(f"DELETE FROM games WHERE {where}", params)
+
+    def _position_rows(self, game_id: int, positions: List[dict]):
+        states = np.array([pos['state'] for pos in positions], dtype=np.int64).reshape(-1, 6)
+        boards = states[:, :4].astype('<u4')
+        material = unpack_boards(boards).sum(axis=2)  # (N, 4) piece counts
+        for idx, pos in enumerate(positions):
+            yield (
+                game_id, idx, pos.get('ply'), boards[idx].tobytes(), int(states[idx, 4]), int(states[idx, 5]),
+                *(int(c) for c in material[idx]), int(material[idx].sum()),
+                encode_policy(position_policy_pairs(pos, self.policy_temperature)),
+                pos.get('searchDepth'), pos.get('searchScore'), pos.get('searchNodes'), pos.get('evaluation'),
+            )
+
+    def add_batch_file(self, batch_file: str, force: bool = False, source: Optional[str] = None) -> int:
+        """
+        Insert the games of a batch file unless this version of it is already in
+
+        Args:
+            source: Run the batch belongs to (default: absolute path of its directory)
+
+        Returns:
+            number of games inserted (0 if skipped)
+        """
+        name = os.path.basename(batch_file)
+        source = source or os.path.dirname(os.path.abspath(batch_file))
+        mtime = os.path.getmtime(batch_file)
+        row = self.db.execute("SELECT mtime FROM batches WHERE source = ? AND name = ?", (source, name)).fetchone()
+        if row and row[0] >= mtime and not force:
+            return 0
+        with self.db:
+            # a rewritten batch replaces its earlier version (records without ids included)
+            self._delete("source = ? AND batch = ?", (source, name))
+        num_games = self.add_games(iter_game_records(batch_file), batch=name, source=source)
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO batches VALUES (?, ?, ?, ?)", (source, name, mtime, num_games))
+        return num_games
+
+    def count(self, where: str = "", params: Sequence = ()) -> int:
+        """Number of positions matching a WHERE clause over the samples view"""
+        sql = "SELECT COUNT(*) FROM samples" + (f" WHERE {where}" if where else "")
+        return self.db.execute(sql, params).fetchone()[0]
+
+    def iter_samples(self, where: str = "", params: Sequence = (),
+                     chunk_size: int = 100_000) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Stream matching positions as compact dataset chunks
+        (see makhos.encoding.COMPACT_FIELDS), game by game in insertion order
+        """
+        sql = f"SELECT {_SAMPLE_COLUMNS} FROM samples" + (f" WHERE {where}" if where else "")
+        cursor = self.db.execute(sql + " ORDER BY game_id, idx", params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            board, side, halfmove, policy, value, score, evaluation = zip(*rows)
+            policy_indices, policy_probs = decode_policies(policy)
+            chunk = {
+                'boards': np.frombuffer(b''.join(board), dtype='<u4').reshape(-1, 4),
+                'sides': side,
+                'halfmoves': halfmove,
+                'policy_indices': policy_indices,
+                'policy_probs': policy_probs,
+                'values': value,
+                'search_scores': [s if s is not None else 0.0 for s in score],
+                'evaluations': [e if e is not None else 0.0 for e in evaluation],
+            }
+            yield {name: np.asarray(chunk[name]).astype(dtype) for name, dtype in COMPACT_FIELDS.items()}
+
+    def export(self, output_path: str, where: str = "", params: Sequence = (),
+               chunk_size: int = 250_000) -> int:
+        """
+        Export a selection as a training dataset
+
+        Directories are written shard by shard in one streaming pass; a .npz
+        output is assembled in memory.
+
+        Returns:
+            number of positions exported
+        """
+        chunks = self.iter_samples(where, params, chunk_size)
+        num_rows = 0
+        if output_path.endswith('.npz'):
+            parts = list(chunks)
+            if parts:
+                dataset = concatenate_samples(parts)
+                np.savez_compressed(output_path, **dataset)
+                write_material_index(output_path, dataset['boards'])
+            return sum(len(part['boards']) for part in parts)
+
+        os.makedirs(output_path, exist_ok=True)
+        write_manifest(output_path, {'version': STORE_VERSION, 'fields': {}, 'shards': []})
+        for shard_idx, chunk in enumerate(chunks):
+            num_rows += write_shard(output_path, f"shard_{shard_idx:04d}", chunk)['rows']
+        if num_rows:
+            write_material_index(output_path, open_dataset(output_path, fields=['boards'])['boards'])
+        return num_rows
+
+    def stats(self) -> Dict[str, int]:
+        games, = self.db.execute("SELECT COUNT(*) FROM games").fetchone()
+        positions, = self.db.execute("SELECT COUNT(*) FROM positions").fetchone()
+        results = dict(self.db.execute("SELECT result, COUNT(*) FROM games GROUP BY result").fetchall())
+        return {'games': games, 'positions': positions, 'p1_wins': results.get(1, 0),
+                'draws': results.get(0, 0), 'p2_wins': results.get(-1, 0)}
+
+
+def import_batches(db_path: str, batch_files: List[str],
+                   policy_temperature: float = DEFAULT_POLICY_TEMPERATURE) -> int:
+    """Add every batch file that isn't in the store yet; returns games inserted"""
+    with GameStore(db_path, policy_temperature) as store:
+        return sum(store.add_batch_file(batch_file) for batch_file in batch_files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite store of generated games")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import", help="Add batch files to the store")
+    p.add_argument("--db", type=str, default="games.sqlite")
+    p.add_argument("--batch_dir", type=str, default="game_batches")
+    p.add_argument("--policy_temperature", type=float, default=DEFAULT_POLICY_TEMPERATURE,
+                   help="Softmax temperature of multi-PV policy targets (use the generation run's)")
+
+    p = sub.add_parser("stats", help="Print game / position counts")
+    p.add_argument("--db", type=str, default="games.sqlite")
+
+    p = sub.add_parser("export", help="Export a selection of positions as a training dataset")
+    p.add_argument("--db", type=str, default="games.sqlite")
+    p.add_argument("--where", type=str, default="",
+                   help="SQL condition over the samples view, e.g. \"pieces <= 4 AND result = -1\"")
+    p.add_argument("--output", type=str, required=True, help="Output dataset directory or .npz file")
+
+    args = parser.parse_args()
+
+    if args.command == "import":
+        batch_files = list_batch_files(args.batch_dir)
+        print(f"Importing {len(batch_files)} batch files into {args.db}...")
+        print(f"  Added {import_batches(args.db, batch_files, args.policy_temperature)} games")
+    elif args.command == "stats":
+        with GameStore(args.db) as store:
+            for name, value in store.stats().items():
+                print(f"  {name}: {value:,}")
+    else:
+        with GameStore(args.db) as store:
+            print(f"Selecting {store.count(args.where):,} positions{' where ' + args.where if args.where else ''}...")
+            print(f"  Exported {store.export(args.output, args.where):,} positions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,70 +3,187 @@ Step 1: Generate training data from AI vs AI self-play games
 
 Workflow:
 1. Run this script on Colab to generate training data (10,000 games in batches)
-2. Download the training_data.npz file
+2. Download the training_data/ directory (sharded dataset)
 3. Use that file for training with train.py
 
 Example:
     python gen_data.py --total_games 10000 --batch_size 2000 --time_per_move 500
+    python gen_data.py --total_games 5000 --batch_size 50 --workers 8   # one generator per core
 """
 
-import json
 import numpy as np
 import subprocess
 import os
 import time
-import glob
-from typing import List, Tuple
+from concurrent.futures import as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from dedup import dedup_output_path, dedup_path
+from game_store import GameStore
+from generator_pool import GameRequest, GeneratorPool, GeneratorStartupError, tsx_command
+from material_index import index_path, print_index_summary, write_material_index
+from openings import load_or_prepare_openings, read_openings
+from scratch_sync import stage
+from validate_dataset import quarantine_path, validate_path
+from work_queue import DEFAULT_LEASE_TTL, WorkQueue
+from dataset_store import MANIFEST, open_dataset, read_manifest, remove_shards, save_sharded, write_shard
+from game_records import (
+    COMPLETED_MANIFEST, DEFAULT_POLICY_TEMPERATURE, PARTIAL_SUFFIX, GameJournal, RecordReader, batch_name,
+    find_batch_file, iter_game_records, list_batch_files, mark_completed, position_policy_pairs, read_completed_ids,
+    repair_journal, repair_manifest, write_manifest,
+)
+from makhos.encoding import (
+    COMPACT_FIELDS, MAX_POLICY_K, encode_states, build_legal_masks, flatten_move_lists, pad_policy_pairs,
+)
+
+BUDGET_MODES = ("time", "depth", "nodes", "adaptive")
+PARALLEL_RANDOM_PLIES = 2  # default random_plies with several workers / processes, so their games differ
+QUEUE_DIR = "queue"  # lease files of generate_from_queue(), inside batch_dir
+DATASET_DONE = "dataset.done"  # in QUEUE_DIR once a queue process has built the output; never rebuilt after
+BATCH_MANIFEST_SUFFIX = ".completed"  # per-batch completed-games manifests (spawn-per-batch and queue)
+
+def check_budget(budget: str) -> str:
+    """
+    Validate a search budget spec: "time" (time_per_move of wall clock),
+    "time:MS", "depth:D", "nodes:N" or "adaptive:N" (N nodes, 4N on
+    positions whose score or best move is still changing)
+    """
+    mode, _, value = budget.partition(":")
+    if (mode not in BUDGET_MODES or (mode != "time" and value == "") or (value and not value.isdigit())
+            or (value and int(value) < 1)):
+        raise ValueError(f"Invalid budget {budget!r}: use time, time:MS, depth:D, nodes:N or adaptive:N (values >= 1)")
+    return budget
+
+def check_multi_pv(multi_pv: int) -> int:
+    """Validate a multi-PV width: policy targets keep at most MAX_POLICY_K moves per position"""
+    if not 1 <= multi_pv <= MAX_POLICY_K:
+        raise ValueError(f"Invalid multi_pv {multi_pv}: use 1 to {MAX_POLICY_K} (MAX_POLICY_K)")
+    return multi_pv
+
+def describe_budget(budget: str, time_per_move: int) -> str:
+    mode, _, value = budget.partition(":")
+    if mode == "time":
+        return f"{value or time_per_move}ms per move"
+    if mode == "depth":
+        return f"depth {value} per move"
+    return f"{int(value):,} nodes per move" + (" (adaptive)" if mode == "adaptive" else "")
+
+def adjudication_spec(resign_plies: int = 0, resign_score: int = 600, draw_plies: int = 0, draw_score: int = 10,
+                      draw_from_ply: int = 60) -> str:
+    """
+    Adjudication rules for the generator ("" = play every game out)
 
-def run_game_generator_batch(batch_idx: int, num_games: int, time_per_move: int, output_dir: str = "."):
+    Args:
+        resign_plies: End the game once |search score| >= resign_score for this many plies
+                      in a row in favour of one player; that player wins (0 = off)
+        resign_score: Resign threshold in search score units (a man is about 100)
+        draw_plies: Declare a draw once |search score| <= draw_score for this many plies
+                    in a row (0 = off)
+        draw_score: Draw window around 0
+        draw_from_ply: Only count draw plies from this ply on (openings are level for a while)
+    """
+    if resign_plies <= 0 and draw_plies <= 0:
+        return ""
+    return f"{resign_score},{max(resign_plies, 0)},{draw_score},{max(draw_plies, 0)},{draw_from_ply}"
+
+def describe_adjudication(adjudication: str) -> str:
+    resign_score, resign_plies, draw_score, draw_plies, draw_from_ply = (int(v) for v in adjudication.split(","))
+    rules = []
+    if resign_plies:
+        rules.append(f"resign at ±{resign_score} for {resign_plies} plies")
+    if draw_plies:
+        rules.append(f"draw within ±{draw_score} for {draw_plies} plies (from ply {draw_from_ply})")
+    return ", ".join(rules)
+
+def playout_cap_spec(full_fraction: float = 1.0, fast_budget: str = "nodes:2000") -> str:
+    """
+    Playout cap randomization for the generator ("" = every ply full budget)
+
+    Args:
+        full_fraction: Share of plies searched with the full budget and recorded
+        fast_budget: Budget of the other plies, which only move the game on and don't count
+                     toward adjudication (see check_budget)
+    """
+    if full_fraction >= 1:
+        return ""
+    if not 0 < full_fraction < 1:
+        raise ValueError(f"full_fraction must be in (0, 1], not {full_fraction}")
+    return f"{full_fraction},{check_budget(fast_budget)}"
+
+def describe_playout_cap(playout_cap: str, time_per_move: int) -> str:
+    fraction, fast_budget = playout_cap.split(",")
+    return f"{float(fraction) * 100:.0f}% of plies full and recorded, rest {describe_budget(fast_budget, time_per_move)}"
+
+def run_game_generator_batch(batch_idx: int, num_games: int, time_per_move: int, output_dir: str = ".",
+                             seed: int = 0, random_plies: int = 0, quiet: bool = False, compress: bool = False,
+                             on_game: Optional[Callable[[dict], None]] = None, first_game_id: int = 0,
+                             manifest_file: Optional[str] = None, openings_file: Optional[str] = None,
+                             multi_pv: int = 1, budget: str = "time", adjudication: str = "",
+                             playout_cap: str = ""):
     """
     Run the TypeScript game generator for one batch
 
+    The generator appends one record per finished game (see game_records.py);
+    they are read back while it runs and handed to on_game, so callers can
+    consume games as they arrive instead of waiting for the whole batch.
+
+    With a manifest_file, games already listed there are skipped and the
+    batch's .partial journal is repaired and continued, so an interrupted
+    batch only replays the game that was in flight.
+
     Args:
         batch_idx: Batch number (for naming)
         num_games: Number of games in this batch
         time_per_move: Time in milliseconds for each AI move
         output_dir: Directory to save the raw game data
+        seed: Base seed; game i plays its random opening plies from a seed derived from (seed, i)
+        random_plies: Number of random (unsearched, unrecorded) opening plies per game
+        quiet: Prefix generator output with the batch number and skip the banners
+               (used when several batches run in parallel)
+        compress: Write a gzip-compressed record stream (.ndjson.gz)
+        on_game: Called with each game record as soon as the generator writes it
+        first_game_id: Id of the batch's first game (games are first_game_id .. first_game_id + num_games - 1)
+        manifest_file: Completed-games manifest shared by all batches (None = no resume)
+        openings_file: Start positions from openings.py; games listed there start from
+                       their sampled opening instead of random_plies random plies
+        multi_pv: Also record the search scores of the top multi_pv root moves (1 = best move only)
+        budget: Search budget per move (see check_budget); "time" uses time_per_move
+        adjudication: Early end rules from adjudication_spec() ("" = off)
+        playout_cap: Fast unrecorded plies from playout_cap_spec() ("" = off)
 
     Returns:
         output_file path if successful, None otherwise
     """
-    output_file = os.path.join(output_dir, f"games_batch_{batch_idx:04d}.json")
+    output_file = batch_file_path(output_dir, batch_idx, compress)
+    prefix = f"[batch {batch_idx:04d}] " if quiet else "  "
 
-    print(f"\n{'='*60}")
-    print(f"Batch {batch_idx}: Generating {num_games} games...")
-    print(f"{'='*60}")
-
-    # Find project root (parent of ml directory)
-    try:
-        script_dir = os.path.dirname(__file__)
-        project_root = os.path.dirname(script_dir)
-    except NameError:
-        # In notebook: go up from current directory
-        script_dir = os.getcwd()
-        project_root = os.path.dirname(script_dir) if os.path.basename(script_dir) == 'ml' else script_dir
-
-    script_path = os.path.join(project_root, "scripts", "generate_games.ts")
+    if not quiet:
+        print(f"\n{'='*60}")
+        print(f"Batch {batch_idx}: Generating {num_games} games...")
+        print(f"{'='*60}")
 
     # Make output_file absolute
     if not os.path.isabs(output_file):
         output_file = os.path.abspath(output_file)
-
-    print(f"  Script: {script_path}")
-    print(f"  Output: {output_file}")
-
-    # Run TypeScript using tsx
-    # For Colab: use full path to avoid /tools/node conflict
-    home = os.path.expanduser("~")
-    node_bin = f"{home}/.nvm/versions/node/v20.19.5/bin"
-    tsx_cmd = f"{node_bin}/npx tsx {script_path} {num_games} {time_per_move} {output_file}"
+    partial_file = output_file + PARTIAL_SUFFIX
+    if manifest_file:
+        manifest_file = os.path.abspath(manifest_file)
+        resumed = repair_journal(partial_file, read_completed_ids(manifest_file))
+        if resumed:
+            print(f"{prefix}Journal has {resumed} finished games, continuing")
+    elif os.path.exists(partial_file):
+        os.remove(partial_file)  # leftover of a killed run; the batch restarts
+
+    tsx_cmd, project_root, env = tsx_command(
+        "generate_games.ts", num_games, time_per_move, output_file, seed, random_plies, first_game_id,
+        manifest_file or "''", os.path.abspath(openings_file) if openings_file else "''", multi_pv, budget,
+        adjudication or "''", playout_cap or "''")
+    if not quiet:
+        print(f"  Script: {os.path.join(project_root, 'scripts', 'generate_games.ts')}")
+        print(f"  Output: {output_file}")
 
     start_time = time.time()
     try:
-        # Run from project root directory with modified PATH
-        env = os.environ.copy()
-        env["PATH"] = f"{node_bin}:{env.get('PATH', '')}"
-
         # Run with real-time output (no capture)
         process = subprocess.Popen(
             ["bash", "-c", tsx_cmd],
@@ -78,20 +195,30 @@ def run_game_generator_batch(batch_idx: int, num_games: int, time_per_move: int,
             env=env
         )
 
-        # Stream output in real-time
-        print(f"\n{'─'*60}")
-        for line in process.stdout:
-            print(f"  {line.rstrip()}")
-
-        # Wait for completion
-        process.wait()
+        # Stream output in real-time, picking up finished games after every line
+        if not quiet:
+            print(f"\n{'─'*60}")
+        with RecordReader(partial_file, output_file) as reader:
+            reader.skip_existing()  # games resumed from the journal were already reported
+            for line in process.stdout:
+                print(f"{prefix}{line.rstrip()}", flush=True)
+                if on_game:
+                    for game in reader.poll():
+                        on_game(game)
+
+            # Wait for completion
+            process.wait()
+            if on_game and process.returncode == 0:
+                for game in reader.poll():
+                    on_game(game)
 
         if process.returncode != 0:
             stderr = process.stderr.read()
             raise subprocess.CalledProcessError(process.returncode, tsx_cmd, stderr=stderr)
 
         elapsed = time.time() - start_time
-        print(f"{'─'*60}")
+        if not quiet:
+            print(f"{'─'*60}")
         print(f"✓ Batch {batch_idx} complete in {elapsed/60:.1f} minutes")
         print(f"  Saved to: {output_file}")
         return output_file
@@ -104,37 +231,133 @@ def run_game_generator_batch(batch_idx: int, num_games: int, time_per_move: int,
             print(f"  stderr: {e.stderr}")
         return None
 
-def generate_in_batches(total_games: int, batch_size: int, time_per_move: int, output_dir: str = "."):
+def batch_file_path(output_dir: str, batch_idx: int, compress: bool = False) -> str:
+    """Path the generator writes batch_idx to (NDJSON, optionally gzipped)"""
+    return os.path.join(output_dir, batch_name(batch_idx) + (".ndjson.gz" if compress else ".ndjson"))
+
+def batch_manifest_path(output_dir: str, batch_idx: int) -> str:
+    """Completed-games manifest of one batch run by its own generator process (persistent=False)"""
+    return os.path.join(output_dir, batch_name(batch_idx) + BATCH_MANIFEST_SUFFIX)
+
+def merge_batch_manifests(output_dir: str, manifest_file: str) -> Set[int]:
+    """
+    Fold the per-batch manifests in output_dir into the shared one
+
+    Returns:
+        every completed game id
+    """
+    completed = repair_manifest(manifest_file)
+    names = [name for name in os.listdir(output_dir)
+             if name.startswith("games_batch_") and name.endswith(BATCH_MANIFEST_SUFFIX)]
+    for name in names:
+        completed |= read_completed_ids(os.path.join(output_dir, name))
+    if names:
+        write_manifest(manifest_file, completed)  # before removing them, so no id is ever lost
+        for name in names:
+            os.remove(os.path.join(output_dir, name))
+    return completed
+
+def generate_in_batches(total_games: int, batch_size: int, time_per_move: int, output_dir: str = ".",
+                        workers: int = 1, seed: int = 0, random_plies: int = 0, compress: bool = False,
+                        on_batch: Optional[Callable[[str], None]] = None, resume: str = "auto",
+                        opening_plies: int = 0, opening_mode: str = "random", opening_book: Optional[str] = None,
+                        multi_pv: int = 1, persistent: bool = True, budget: str = "time",
+                        adjudication: str = "", playout_cap: str = ""):
     """
     Generate games in batches with progress tracking
 
+    Batches are independent, so with workers > 1 a process pool keeps that
+    many generator processes busy at once, pulling batch indices from a
+    shared queue. Game i of the run (batch i // batch_size) always gets the
+    same seed, derived from (seed, i), so results don't depend on which
+    worker ran it and resumed runs reproduce the same games.
+
+    With persistent=True the games are played by `workers` long-lived
+    generator processes (see generator_pool.py) fed game by game across all
+    batches, so the TypeScript startup cost is paid once per worker;
+    otherwise every batch spawns its own generator.
+
+    Every finished game is journaled and its id recorded in
+    completed_games.txt (see game_records.py), so resuming skips finished
+    batches and continues unfinished ones game by game. Per-batch
+    generators (persistent=False) each record into their own batch's
+    manifest instead, folded into completed_games.txt when they finish.
+
     Args:
         total_games: Total number of games to generate
         batch_size: Games per batch
         time_per_move: Time per move in milliseconds
         output_dir: Directory for output files
+        workers: Number of generator processes to run in parallel
+        seed: Base seed for the generators' random opening plies
+        random_plies: Random opening plies per game
+        compress: Gzip the batch record streams
+        on_batch: Called with each batch file as soon as that batch finishes
+                  (e.g. BatchConverter.submit, to convert it while the next one runs)
+        resume: What to do with games from an earlier run in output_dir:
+                "auto" continues from them, "fresh" discards them and regenerates
+                everything, "ask" prompts (interactive sessions only)
+        opening_plies: Start every game from a distinct sampled opening of this many plies
+                       (see openings.py) instead of random_plies random plies; 0 = off
+        opening_mode: "random" or "book" (book-weighted) openings
+        opening_book: Directory of batch files to build the opening book from
+                      (default: the batches already in output_dir)
+        multi_pv: Root moves whose search scores are recorded per position (soft policy targets)
+        persistent: Use persistent generator workers instead of one generator process per batch
+        budget: Search budget per move: "time" (time_per_move, wall clock) or a deterministic
+                "depth:D", "nodes:N" or "adaptive:N" (see check_budget)
+        adjudication: Resign / draw rules ending decided games early (see adjudication_spec; "" = off)
+        playout_cap: Only a random fraction of plies get the full budget and are recorded, the
+                     rest get a fast budget (see playout_cap_spec; "" = off)
 
     Returns:
         List of batch file paths
     """
     os.makedirs(output_dir, exist_ok=True)
-
-    # Check for existing batches (for resume)
-    existing_batches = sorted(glob.glob(os.path.join(output_dir, "games_batch_*.json")))
-    if existing_batches:
-        print(f"\nFound {len(existing_batches)} existing batch files.")
-        resume = input("Resume from checkpoint? (y/n): ").lower().strip() == 'y'
-        if resume:
-            print("Resuming from existing batches...")
-            start_batch = len(existing_batches)
-        else:
-            print("Starting fresh (existing batches will be kept)...")
-            start_batch = 0
-    else:
-        start_batch = 0
+    check_budget(budget)
+    check_multi_pv(multi_pv)
 
     num_batches = (total_games + batch_size - 1) // batch_size
-    batch_files = list(existing_batches) if start_batch > 0 else []
+
+    # Check for existing batches and journaled games (for resume). Batches
+    # can finish out of order in parallel mode, so resume skips whichever
+    # indices are done and continues the journals of the others.
+    manifest_file = os.path.join(output_dir, COMPLETED_MANIFEST)
+    existing = {b: find_batch_file(output_dir, b) for b in range(num_batches)}
+    existing = {b: path for b, path in existing.items() if path}
+    completed = merge_batch_manifests(output_dir, manifest_file)  # also those left by a killed spawn-per-batch run
+
+    if resume not in ("auto", "fresh", "ask"):
+        raise ValueError(f"resume must be 'auto', 'fresh' or 'ask', not {resume!r}")
+    if (existing or completed) and resume == "ask":
+        print(f"\nFound {len(existing)} existing batch files and {len(completed)} journaled games.")
+        resume = "auto" if input("Resume from checkpoint? (y/n): ").lower().strip() == 'y' else "fresh"
+    if resume == "fresh":
+        if existing or completed:
+            print("Starting fresh (existing batches are regenerated)...")
+        for name in os.listdir(output_dir):
+            if name.startswith("games_batch_") and name.endswith(PARTIAL_SUFFIX):
+                os.remove(os.path.join(output_dir, name))
+        if os.path.exists(manifest_file):
+            os.remove(manifest_file)
+        existing, completed = {}, set()
+    elif existing or completed:
+        print(f"\nResuming: {len(existing)} finished batches, {len(completed)} journaled games")
+
+    pending = [b for b in range(num_batches) if b not in existing]
+    batch_files = dict(existing)
+
+    openings_file = None
+    if opening_plies > 0 and pending:
+        openings_file = load_or_prepare_openings(output_dir, total_games, opening_plies, opening_mode, seed,
+                                                 list_batch_files(opening_book or output_dir), resume == "fresh")
+
+    def games_in(batch_idx: int) -> int:
+        return min(batch_size, total_games - batch_idx * batch_size)
+
+    def games_left(batch_idx: int) -> int:
+        first = batch_idx * batch_size
+        return sum(1 for i in range(first, first + games_in(batch_idx)) if i not in completed)
 
     print(f"\n{'='*60}")
     print(f"GENERATION PLAN")
@@ -142,38 +365,163 @@ def generate_in_batches(total_games: int, batch_size: int, time_per_move: int, o
     print(f"Total games: {total_games}")
     print(f"Batch size: {batch_size}")
     print(f"Total batches: {num_batches}")
-    print(f"Starting from batch: {start_batch}")
-    print(f"Time per move: {time_per_move}ms")
+    print(f"Batches to generate: {len(pending)} ({sum(games_left(b) for b in pending)} games left)")
+    print(f"Workers: {workers}")
+    print(f"Search budget: {describe_budget(budget, time_per_move)}")
+    if openings_file:
+        print(f"Openings: {opening_plies} plies ({opening_mode})")
+    if multi_pv > 1:
+        print(f"Multi-PV: top {multi_pv} root moves per position")
+    if adjudication:
+        print(f"Adjudication: {describe_adjudication(adjudication)}")
+    if playout_cap:
+        print(f"Playout cap: {describe_playout_cap(playout_cap, time_per_move)}")
     print(f"{'='*60}\n")
 
     overall_start = time.time()
+    games_target = sum(games_left(b) for b in pending)
+    games_run = 0
+    live = {'games': 0, 'positions': 0, 'adjudicated': 0}
+
+    def on_game(game: dict):
+        # Sequential mode reads each game as soon as it is written, so the
+        # running totals move per game rather than per batch
+        live['games'] += 1
+        live['positions'] += len(game['positions'])
+        live['adjudicated'] += bool(game.get('adjudicated'))
+        elapsed = time.time() - overall_start
+        eta_seconds = elapsed / live['games'] * (games_target - live['games'])
+        adjudicated = f", {live['adjudicated']} adjudicated" if adjudication else ""
+        print(f"  [{live['games']}/{games_target} games, {live['positions']:,} positions{adjudicated}, "
+              f"ETA {eta_seconds/60:.1f} min]", flush=True)
+
+    def report(batch_idx: int):
+        elapsed = time.time() - overall_start
+        games_done = sum(games_in(b) for b in batch_files)
+        progress = games_done / total_games * 100
+        remaining = games_target - games_run
+        eta_seconds = elapsed / games_run * remaining if games_run else 0
 
-    for batch_idx in range(start_batch, num_batches):
-        games_in_batch = min(batch_size, total_games - batch_idx * batch_size)
-
-        batch_file = run_game_generator_batch(batch_idx, games_in_batch, time_per_move, output_dir)
-
-        if batch_file:
-            batch_files.append(batch_file)
-
-            # Progress summary
-            games_done = (batch_idx + 1) * batch_size
-            games_done = min(games_done, total_games)
-            progress = games_done / total_games * 100
-            elapsed = time.time() - overall_start
-            avg_time_per_batch = elapsed / (batch_idx - start_batch + 1)
-            remaining_batches = num_batches - batch_idx - 1
-            eta_seconds = avg_time_per_batch * remaining_batches
-
-            print(f"\n{'─'*60}")
-            print(f"PROGRESS: {games_done}/{total_games} games ({progress:.1f}%)")
-            print(f"Elapsed: {elapsed/60:.1f} min")
-            if remaining_batches > 0:
-                print(f"ETA: {eta_seconds/60:.1f} min ({eta_seconds/3600:.1f} hours)")
-            print(f"{'─'*60}\n")
-        else:
-            print(f"\n✗ Batch {batch_idx} failed. Stopping.")
-            break
+        print(f"\n{'─'*60}")
+        print(f"PROGRESS: {games_done}/{total_games} games ({progress:.1f}%) - batch {batch_idx} done")
+        print(f"Elapsed: {elapsed/60:.1f} min ({games_run / elapsed * 3600:.0f} games/hour)")
+        if remaining > 0:
+            print(f"ETA: {eta_seconds/60:.1f} min ({eta_seconds/3600:.1f} hours)")
+        print(f"{'─'*60}\n")
+
+    if persistent:
+        openings = read_openings(openings_file) if openings_file else {'plies': 0, 'positions': {}}
+        journals, remaining, failed = {}, {}, set()
+
+        def finish(batch_idx: int):
+            nonlocal games_run
+            journals[batch_idx].close()
+            batch_files[batch_idx] = journals[batch_idx].output_file
+            print(f"✓ Batch {batch_idx} complete")
+            print(f"  Saved to: {batch_files[batch_idx]}")
+            if on_batch:
+                on_batch(batch_files[batch_idx])
+            games_run += games_left(batch_idx)
+            report(batch_idx)
+
+        with GeneratorPool(workers) as pool:
+            futures = {}
+            for batch_idx in pending:
+                output_file = os.path.abspath(batch_file_path(output_dir, batch_idx, compress))
+                resumed = repair_journal(output_file + PARTIAL_SUFFIX, completed)
+                if resumed:
+                    print(f"[batch {batch_idx:04d}] Journal has {resumed} finished games, continuing")
+                journals[batch_idx] = GameJournal(output_file, manifest_file)
+                first = batch_idx * batch_size
+                game_ids = [i for i in range(first, first + games_in(batch_idx)) if i not in completed]
+                remaining[batch_idx] = len(game_ids)
+                for game_id in game_ids:
+                    request = GameRequest(game_id, time_per_move, seed=seed, random_plies=random_plies,
+                                          opening=openings['positions'].get(str(game_id)),
+                                          opening_plies=openings['plies'], multi_pv=multi_pv, budget=budget,
+                                          adjudication=adjudication, playout_cap=playout_cap)
+                    futures[pool.submit(request)] = batch_idx
+
+            for batch_idx in pending:
+                if remaining[batch_idx] == 0:
+                    finish(batch_idx)
+            for future in as_completed(futures):
+                batch_idx = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    print(f"\n✗ Batch {batch_idx}: {e}")
+                    failed.add(batch_idx)
+                    continue
+                if record.get('failed'):
+                    mark_completed(manifest_file, record['id'])  # no move found; don't retry it forever
+                else:
+                    journals[batch_idx].write(record)
+                    on_game(record)
+                remaining[batch_idx] -= 1
+                if remaining[batch_idx] == 0 and batch_idx not in failed:
+                    finish(batch_idx)
+
+        for batch_idx in failed:
+            journals[batch_idx].close(finished=False)
+        if failed:
+            print(f"✗ Failed batches: {sorted(failed)} (rerun to retry them)")
+    elif workers <= 1:
+        for batch_idx in pending:
+            batch_file = run_game_generator_batch(batch_idx, games_in(batch_idx), time_per_move, output_dir,
+                                                  seed=seed, random_plies=random_plies, quiet=False,
+                                                  compress=compress, on_game=on_game,
+                                                  first_game_id=batch_idx * batch_size, manifest_file=manifest_file,
+                                                  openings_file=openings_file, multi_pv=multi_pv, budget=budget,
+                                                  adjudication=adjudication, playout_cap=playout_cap)
+            if not batch_file:
+                print(f"\n✗ Batch {batch_idx} failed. Stopping.")
+                break
+            batch_files[batch_idx] = batch_file
+            if on_batch:
+                on_batch(batch_file)
+            games_run += games_left(batch_idx)
+            report(batch_idx)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Every generator appends to its own batch's manifest, so no file is written by two
+        # processes; they are folded back into the shared one at the end (or on resume)
+        for b in pending:
+            first = b * batch_size
+            write_manifest(batch_manifest_path(output_dir, b),
+                           (i for i in range(first, first + games_in(b)) if i in completed))
+
+        failed = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(run_game_generator_batch, b, games_in(b), time_per_move, output_dir,
+                            seed=seed, random_plies=random_plies, quiet=True, compress=compress,
+                            first_game_id=b * batch_size, manifest_file=batch_manifest_path(output_dir, b),
+                            openings_file=openings_file, multi_pv=multi_pv, budget=budget,
+                            adjudication=adjudication, playout_cap=playout_cap): b
+                for b in pending
+            }
+            for future in as_completed(futures):
+                batch_idx = futures[future]
+                try:
+                    batch_file = future.result()
+                except Exception as e:
+                    print(f"\n✗ Batch {batch_idx}: {e}")
+                    batch_file = None
+                if not batch_file:
+                    # Keep the other workers going; the batch is retried on resume
+                    print(f"\n✗ Batch {batch_idx} failed.")
+                    failed.append(batch_idx)
+                    continue
+                batch_files[batch_idx] = batch_file
+                if on_batch:
+                    on_batch(batch_file)
+                games_run += games_left(batch_idx)
+                report(batch_idx)
+        merge_batch_manifests(output_dir, manifest_file)
+        if failed:
+            print(f"✗ Failed batches: {sorted(failed)} (rerun to retry them)")
 
     total_time = time.time() - overall_start
     print(f"\n{'='*60}")
@@ -183,71 +531,222 @@ def generate_in_batches(total_games: int, batch_size: int, time_per_move: int, o
     print(f"Batches completed: {len(batch_files)}/{num_batches}")
     print(f"{'='*60}\n")
 
-    return batch_files
+    return [batch_files[b] for b in sorted(batch_files)]
 
-def merge_batch_files(batch_files: List[str]) -> str:
+def generate_from_queue(total_games: int, batch_size: int, time_per_move: int, output_dir: str = ".",
+                        workers: int = 1, seed: int = 0, random_plies: int = 0, compress: bool = False,
+                        on_batch: Optional[Callable[[str], None]] = None, opening_plies: int = 0,
+                        opening_mode: str = "random", opening_book: Optional[str] = None, multi_pv: int = 1,
+                        budget: str = "time", adjudication: str = "", playout_cap: str = "",
+                        lease_ttl: float = DEFAULT_LEASE_TTL, wait: bool = True,
+                        queue: Optional[WorkQueue] = None) -> List[str]:
     """
-    Merge all batch JSON files into a single file
+    Generate batches pulled from a lease-based work queue in output_dir
+
+    Any number of processes, on this machine or on others sharing
+    output_dir, can run this with the same arguments: each claims one
+    unfinished batch at a time (see work_queue.py), plays its games on
+    `workers` persistent generators and releases it once the batch file is
+    written. A batch whose owner stops heartbeating for lease_ttl seconds
+    is reclaimed and continued from its journal.
+
+    Each batch keeps its own completed-games manifest next to its lease
+    (queue/<batch>.completed), so no file is written by two processes.
 
     Args:
-        batch_files: List of batch file paths
+        total_games ... playout_cap: As in generate_in_batches (every process must use the same values)
+        lease_ttl: Seconds without a heartbeat after which a lease is reclaimed
+        wait: Keep polling until every batch is finished (including those leased by other
+              processes); False returns as soon as there is nothing left to claim
+        queue: WorkQueue to use (default: a new one on <output_dir>/queue, closed on return)
 
     Returns:
-        Path to merged file
+        List of all finished batch file paths in output_dir
     """
+    os.makedirs(output_dir, exist_ok=True)
+    check_budget(budget)
+    check_multi_pv(multi_pv)
+    own_queue = queue is None
+    queue = queue or WorkQueue(os.path.join(output_dir, QUEUE_DIR), lease_ttl)
+    num_batches = (total_games + batch_size - 1) // batch_size
+    global_completed = read_completed_ids(os.path.join(output_dir, COMPLETED_MANIFEST))  # earlier non-queue runs
+    poll_seconds = min(queue.ttl / 4, 10.0)
+
     print(f"\n{'='*60}")
-    print(f"MERGING BATCHES")
+    print(f"GENERATION QUEUE")
     print(f"{'='*60}")
+    print(f"Queue: {queue.queue_dir} (worker {queue.owner})")
+    print(f"Total games: {total_games} in {num_batches} batches of {batch_size}")
+    print(f"Finished so far: {sum(1 for b in range(num_batches) if find_batch_file(output_dir, b))} batches")
+    print(f"Workers: {workers}, lease TTL: {queue.ttl:.0f}s")
+    print(f"Search budget: {describe_budget(budget, time_per_move)}")
+    if adjudication:
+        print(f"Adjudication: {describe_adjudication(adjudication)}")
+    if playout_cap:
+        print(f"Playout cap: {describe_playout_cap(playout_cap, time_per_move)}")
+    print(f"{'='*60}\n")
+
+    openings = {'plies': 0, 'positions': {}}
+    if opening_plies > 0:
+        # One process samples the openings; the others wait and reuse its file
+        while not queue.claim("openings"):
+            time.sleep(1.0)
+        try:
+            openings = read_openings(load_or_prepare_openings(
+                output_dir, total_games, opening_plies, opening_mode, seed,
+                list_batch_files(opening_book or output_dir)))
+        finally:
+            queue.release("openings")
+
+    def unfinished() -> List[int]:
+        return [b for b in range(num_batches) if not find_batch_file(output_dir, b)]
 
-    all_games = []
+    start_time = time.time()
+    games_played = 0
+    mine = []
+    failed = set()  # batches whose games crashed here; left to other processes or a rerun
+    with GeneratorPool(workers) as pool:
+        while True:
+            todo = [b for b in unfinished() if b not in failed]
+            if not todo:
+                break
+            batch_idx = next((b for b in todo if queue.claim(batch_name(b))), None)
+            if batch_idx is None:
+                if not wait:
+                    break
+                time.sleep(poll_seconds)
+                continue
+            name = batch_name(batch_idx)
+            if find_batch_file(output_dir, batch_idx):
+                queue.release(name)  # finished by another process between listing and claiming
+                continue
+
+            manifest_file = os.path.join(queue.queue_dir, name + BATCH_MANIFEST_SUFFIX)
+            completed = repair_manifest(manifest_file) | global_completed
+            output_file = os.path.abspath(batch_file_path(output_dir, batch_idx, compress))
+            resumed = repair_journal(output_file + PARTIAL_SUFFIX, completed)
+            first = batch_idx * batch_size
+            game_ids = [i for i in range(first, min(first + batch_size, total_games)) if i not in completed]
+            print(f"[{name}] Claimed: {len(game_ids)} games to play"
+                  + (f" ({resumed} already in its journal)" if resumed else ""))
+
+            journal = GameJournal(output_file, manifest_file)
+            futures = [pool.submit(GameRequest(game_id, time_per_move, seed=seed, random_plies=random_plies,
+                                               opening=openings['positions'].get(str(game_id)),
+                                               opening_plies=openings['plies'], multi_pv=multi_pv, budget=budget,
+                                               adjudication=adjudication, playout_cap=playout_cap))
+                       for game_id in game_ids]
+            ok, fatal = True, False
+            for future in as_completed(futures):
+                try:
+                    record = future.result()
+                except GeneratorStartupError as e:
+                    # No generator process starts at all; every batch would fail the same way
+                    print(f"\n✗ {name}: {e}")
+                    ok, fatal = False, True
+                    break
+                except Exception as e:
+                    # The pool replaces the crashed worker; give the batch up and go on with the next
+                    print(f"\n✗ {name}: {e}")
+                    failed.add(batch_idx)
+                    ok = False
+                    break
+                # Checked on disk before every write: once the lease is reclaimed the
+                # journal and manifest belong to the new owner
+                if not queue.confirm(name):
+                    ok = False
+                    break
+                if record.get('failed'):
+                    mark_completed(manifest_file, record['id'])  # no move found; don't retry it forever
+                else:
+                    journal.write(record)
+                    games_played += 1
+            if not ok:
+                # Lost lease: another process continues this batch; failed: released for another
+                # process (or a rerun) to continue from the journal
+                for future in futures:
+                    future.cancel()
+                journal.close(finished=False)
+                queue.release(name)
+                if fatal:
+                    break
+                continue
+
+            if not queue.confirm(name):
+                journal.close(finished=False)
+                continue  # reclaimed while the last game was written; the new owner finishes it
+            journal.close()
+            os.remove(manifest_file)
+            queue.release(name)
+            mine.append(journal.output_file)
+            elapsed = time.time() - start_time
+            print(f"✓ {name} complete ({len(mine)} batches by this worker, "
+                  f"{games_played / max(elapsed, 1e-9) * 3600:.0f} games/hour)")
+            print(f"  Saved to: {journal.output_file}")
+            if on_batch:
+                on_batch(journal.output_file)
+
+    if own_queue:
+        queue.close()
+    batch_files = [find_batch_file(output_dir, b) for b in range(num_batches)]
+    batch_files = [path for path in batch_files if path]
+    print(f"\n{'='*60}")
+    print(f"QUEUE {'DRAINED' if len(batch_files) == num_batches else 'LEFT'}")
+    print(f"{'='*60}")
+    print(f"This worker: {len(mine)} batches, {games_played} games in {(time.time() - start_time)/60:.1f} min")
+    print(f"Batches finished: {len(batch_files)}/{num_batches}")
+    if failed:
+        print(f"✗ Failed here: {sorted(failed)} (released for other workers or a rerun)")
+    print(f"{'='*60}\n")
+    return batch_files
+
+def load_batch_games(batch_file: str) -> List[dict]:
+    """Load the games of a single batch file (.ndjson, .ndjson.gz or legacy .json)"""
+    return list(iter_game_records(batch_file))
+
+def iter_batch_games(batch_files: List[str]) -> Iterator[Tuple[str, List[dict]]]:
+    """
+    Yield (batch_file, games) one batch at a time
+
+    Only one batch is ever held in memory, so peak RAM is bounded by the
+    largest batch rather than the whole corpus.
+    """
     for batch_file in batch_files:
-        with open(batch_file, 'r') as f:
-            games = json.load(f)
-            all_games.extend(games)
-            print(f"  Loaded {len(games)} games from {os.path.basename(batch_file)}")
+        yield batch_file, load_batch_games(batch_file)
 
-    merged_file = "games_data_merged.json"
-    with open(merged_file, 'w') as f:
-        json.dump(all_games, f)
+def count_positions(batch_files: List[str],
+                    policy_temperature: Optional[float] = DEFAULT_POLICY_TEMPERATURE) -> Tuple[int, int, int]:
+    """
+    First streaming pass: count games and positions (and the widest policy
+    target) so the output arrays can be allocated once at their final size
 
-    print(f"✓ Merged {len(all_games)} total games into {merged_file}")
-    print(f"{'='*60}")
-    return merged_file
+    Returns:
+        (num_games, num_positions, policy_k)
+    """
+    num_games = 0
+    num_positions = 0
+    policy_k = 1
+    for _, games in iter_batch_games(batch_files):
+        num_games += len(games)
+        for game in games:
+            num_positions += len(game['positions'])
+            for pos_data in game['positions']:
+                policy_k = max(policy_k, len(position_policy_pairs(pos_data, policy_temperature)))
+    return num_games, num_positions, min(policy_k, MAX_POLICY_K)
 
 def position_to_planes(state_array: List[int]) -> np.ndarray:
     """
     Convert position array to neural network input planes
 
     Input format: [p1Men, p1Kings, p2Men, p2Kings, side, halfmoveClock]
-    Output: 6 planes of 32 bits each:
-      - plane 0: p1Men
-      - plane 1: p1Kings
-      - plane 2: p2Men
-      - plane 3: p2Kings
-      - plane 4: side to move (all 1s for P1, all 0s for P2)
-      - plane 5: halfmove clock (normalized 0-1)
+    Output: 6 planes of 32 bits each (see makhos.encoding)
+
+    Single-position convenience wrapper; batches should call
+    encode_states() directly.
 
     Returns: shape (6, 32) binary array
     """
-    p1_men = state_array[0]
-    p1_kings = state_array[1]
-    p2_men = state_array[2]
-    p2_kings = state_array[3]
-    side = state_array[4]
-    halfmove = state_array[5]
-
-    planes = np.zeros((6, 32), dtype=np.float32)
-
-    # Convert bitboards to binary arrays
-    for i in range(32):
-        planes[0, i] = (p1_men >> i) & 1
-        planes[1, i] = (p1_kings >> i) & 1
-        planes[2, i] = (p2_men >> i) & 1
-        planes[3, i] = (p2_kings >> i) & 1
-        planes[4, i] = 1.0 if side == 1 else 0.0
-        planes[5, i] = min(halfmove / 20.0, 1.0)  # normalize by draw threshold
-
-    return planes
+    return encode_states(np.asarray([state_array]))[0]
 
 def legal_moves_to_mask(legal_moves: List[List[int]]) -> np.ndarray:
     """
@@ -259,148 +758,236 @@ def legal_moves_to_mask(legal_moves: List[List[int]]) -> np.ndarray:
     Returns:
         (32, 32) binary mask where mask[from][to] = 1 for legal moves
     """
-    mask = np.zeros((32, 32), dtype=np.float32)
-    for move in legal_moves:
-        from_sq = move[0]
-        to_sq = move[1]
-        mask[from_sq, to_sq] = 1.0
-    return mask
+    rows, from_sq, to_sq = flatten_move_lists([legal_moves])
+    return build_legal_masks(1, rows, from_sq, to_sq)[0]
 
-def process_games(games_file: str = "games_data.json") -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+def encode_games(games: List[dict], policy_k: Optional[int] = None,
+                 policy_temperature: Optional[float] = DEFAULT_POLICY_TEMPERATURE) -> Dict[str, np.ndarray]:
     """
-    Process raw game data into training dataset
+    Encode the positions of a list of games into compact arrays
+    (see makhos.encoding.COMPACT_FIELDS)
+
+    Args:
+        games: game records
+        policy_k: policy width K (default: widest target in these games, capped at MAX_POLICY_K)
+        policy_temperature: softmax temperature for multi-PV root scores (None / 0 = one-hot best move)
+    """
+    positions = [pos_data for game in games for pos_data in game['positions']]
+    n = len(positions)
+    policy_pairs = [position_policy_pairs(pos_data, policy_temperature) for pos_data in positions]
+    if policy_k is None:
+        policy_k = min(max((len(pairs) for pairs in policy_pairs), default=1), MAX_POLICY_K)
+
+    state_arrays = np.array([pos_data['state'] for pos_data in positions], dtype=np.int64).reshape(n, 6)
+    sides = state_arrays[:, 4]
+    # 1 = P1 wins, -1 = P2 wins, 0 = draw
+    results = np.repeat([game['result'] for game in games], [len(game['positions']) for game in games])
+
+    policy_indices, policy_probs = pad_policy_pairs(policy_pairs, policy_k)
+    arrays = {
+        'boards': state_arrays[:, :4],
+        'sides': sides,
+        'halfmoves': state_arrays[:, 5],
+        # Sparse policy targets
+        'policy_indices': policy_indices,
+        'policy_probs': policy_probs,
+        # Game outcome from current player's perspective
+        'values': results * sides,  # Flip result based on whose turn it is
+        'search_scores': np.array([pos_data['searchScore'] for pos_data in positions]) * sides,  # Flip score too
+        'evaluations': [pos_data['evaluation'] for pos_data in positions],
+    }
+    return {name: np.asarray(arrays[name]).astype(dtype) for name, dtype in COMPACT_FIELDS.items()}
+
+def print_dataset_summary(dataset: Dict[str, np.ndarray]):
+    """Field shapes and value distribution of a compact dataset"""
+    values = np.asarray(dataset['values'])
+    total = max(len(values), 1)
+    print(f"\n{'='*60}")
+    print(f"DATASET CREATED")
+    print(f"{'='*60}")
+    for name, array in dataset.items():
+        print(f"  {name}: {array.shape} {array.dtype}")
+    print(f"\nValue distribution:")
+    print(f"  P1 wins (+1): {(values == 1).sum():,} ({(values == 1).sum()/total*100:.1f}%)")
+    print(f"  Draws (0):    {(values == 0).sum():,} ({(values == 0).sum()/total*100:.1f}%)")
+    print(f"  P2 wins (-1): {(values == -1).sum():,} ({(values == -1).sum()/total*100:.1f}%)")
+    print(f"{'='*60}")
+
+def process_games(batch_files: Union[str, List[str]] = "games_data.ndjson",
+                  policy_temperature: Optional[float] = DEFAULT_POLICY_TEMPERATURE) -> Dict[str, np.ndarray]:
+    """
+    Process raw game data into a compact training dataset
+
+    Batch files are streamed: a first pass counts positions, then each batch
+    is read again and written straight into preallocated output arrays, so
+    nothing but the output and one batch is ever in memory.
+
+    Positions are stored compactly (see makhos.encoding.COMPACT_FIELDS):
+    bitboards, side, halfmove clock and a sparse (index, prob) policy
+    target, about 20 bytes per position. Input planes and legal masks are
+    rebuilt per batch by MakhosDataset in train.py.
+
+    Positions generated with multi-PV get a soft policy target,
+    softmax(root move scores / policy_temperature) over the recorded top-K
+    moves, instead of the one-hot best move.
+
+    Args:
+        batch_files: A batch file (.ndjson, .ndjson.gz or legacy .json) or a list of them
+        policy_temperature: Softmax temperature in search score units (None / 0 = one-hot)
 
     Returns:
-        states: (N, 6, 32) array of board states
-        policy_targets: (N, 32, 32) array of policy targets (from search)
-        legal_masks: (N, 32, 32) array of legal move masks
-        values: (N,) array of game outcomes from current player's perspective
-        search_scores: (N,) array of search evaluation scores
-        evaluations: (N,) array of static evaluation scores
+        dict of arrays:
+            boards: (N, 4) uint32 bitboards [p1Men, p1Kings, p2Men, p2Kings]
+            sides: (N,) side to move
+            halfmoves: (N,) halfmove clock
+            policy_indices: (N, K) policy target move indices (from * 32 + to, -1 = padding)
+            policy_probs: (N, K) policy target probabilities
+            values: (N,) game outcomes from current player's perspective
+            search_scores: (N,) search evaluation scores
+            evaluations: (N,) static evaluation scores
     """
-    print(f"\nLoading games from {games_file}...")
+    if isinstance(batch_files, str):
+        batch_files = [batch_files]
 
-    with open(games_file, 'r') as f:
-        games = json.load(f)
+    print(f"\nCounting positions in {len(batch_files)} batch file(s)...")
+    num_games, num_positions, policy_k = count_positions(batch_files, policy_temperature)
 
     print(f"\n{'='*60}")
     print(f"PROCESSING GAMES")
     print(f"{'='*60}")
-    print(f"Total games: {len(games)}")
+    print(f"Total games: {num_games}")
+    print(f"Total positions: {num_positions}")
     print(f"{'='*60}\n")
 
-    states_list = []
-    policy_targets_list = []
-    legal_masks_list = []
-    values_list = []
-    search_scores_list = []
-    evaluations_list = []
-
-    total_positions = 0
-    for game_idx, game in enumerate(games):
-        positions = game['positions']
-        result = game['result']  # 1 = P1 wins, -1 = P2 wins, 0 = draw
-
-        for pos_data in positions:
-            state_array = pos_data['state']
-            legal_moves = pos_data['legalMoves']
-            policy_target = pos_data['policyTarget']
-            search_score = pos_data['searchScore']
-            evaluation = pos_data['evaluation']
-
-            # Convert position to input planes
-            state = position_to_planes(state_array)
-
-            # Convert policy target to 32x32 array
-            policy_array = np.array(policy_target, dtype=np.float32).reshape(32, 32)
-
-            # Create legal moves mask
-            legal_mask = legal_moves_to_mask(legal_moves)
-
-            # Game outcome from current player's perspective
-            side = state_array[4]
-            value = result * side  # Flip result based on whose turn it is
-
-            states_list.append(state)
-            policy_targets_list.append(policy_array)
-            legal_masks_list.append(legal_mask)
-            values_list.append(value)
-            search_scores_list.append(search_score * side)  # Flip score too
-            evaluations_list.append(evaluation)
-
-            total_positions += 1
-
-        if (game_idx + 1) % 100 == 0:
-            print(f"  Processed {game_idx + 1}/{len(games)} games, {total_positions} positions...")
-
-    states = np.array(states_list, dtype=np.float32)
-    policy_targets = np.array(policy_targets_list, dtype=np.float32)
-    legal_masks = np.array(legal_masks_list, dtype=np.float32)
-    values = np.array(values_list, dtype=np.float32)
-    search_scores = np.array(search_scores_list, dtype=np.float32)
-    evaluations = np.array(evaluations_list, dtype=np.float32)
+    widths = {'boards': 4, 'policy_indices': policy_k, 'policy_probs': policy_k}
+    dataset = {
+        name: np.zeros((num_positions, widths[name]) if name in widths else num_positions, dtype=dtype)
+        for name, dtype in COMPACT_FIELDS.items()
+    }
+
+    row = 0
+    games_done = 0
+    for batch_file, games in iter_batch_games(batch_files):
+        batch = encode_games(games, policy_k, policy_temperature)
+        n = len(batch['boards'])
+        for name, array in batch.items():
+            dataset[name][row:row + n] = array
+        row += n
+        games_done += len(games)
+        print(f"  Processed {games_done}/{num_games} games, {row} positions ({os.path.basename(batch_file)})")
+
+    print_dataset_summary(dataset)
+    return dataset
+
+def shard_name(batch_file: str) -> str:
+    """Shard a batch file is converted into: games_batch_0003.ndjson -> batch_0003"""
+    return os.path.basename(batch_file).split('.')[0].replace("games_", "", 1)
+
+def conversion_params(policy_temperature: Optional[float] = DEFAULT_POLICY_TEMPERATURE) -> dict:
+    """Settings a shard's targets depend on besides its batch file (kept in its manifest entry)"""
+    return {'policy_temperature': float(policy_temperature or 0)}
+
+def convert_batch(batch_file: str, output_dir: str,
+                  policy_temperature: Optional[float] = DEFAULT_POLICY_TEMPERATURE) -> Tuple[str, int]:
+    """
+    Encode one finished batch file and write it as a shard of output_dir
 
-    print(f"\n{'='*60}")
-    print(f"DATASET CREATED")
-    print(f"{'='*60}")
-    print(f"  States: {states.shape}")
-    print(f"  Policy targets: {policy_targets.shape}")
-    print(f"  Legal masks: {legal_masks.shape}")
-    print(f"  Values: {values.shape}")
-    print(f"  Search scores: {search_scores.shape}")
-    print(f"  Evaluations: {evaluations.shape}")
-    print(f"\nValue distribution:")
-    print(f"  P1 wins (+1): {(values == 1).sum():,} ({(values == 1).sum()/len(values)*100:.1f}%)")
-    print(f"  Draws (0):    {(values == 0).sum():,} ({(values == 0).sum()/len(values)*100:.1f}%)")
-    print(f"  P2 wins (-1): {(values == -1).sum():,} ({(values == -1).sum()/len(values)*100:.1f}%)")
-    print(f"\nAverage legal moves per position: {legal_masks.sum(axis=(1,2)).mean():.1f}")
-    print(f"{'='*60}")
+    The shard's manifest entry records conversion_params() and the batch's
+    multi-PV width (the most root scores of any position).
 
-    return states, policy_targets, legal_masks, values, search_scores, evaluations
-
-def save_dataset(
-    states: np.ndarray,
-    policy_targets: np.ndarray,
-    legal_masks: np.ndarray,
-    values: np.ndarray,
-    search_scores: np.ndarray,
-    evaluations: np.ndarray,
-    output_path: str = "training_data.npz"
-):
-    """Save processed dataset to npz file"""
-    np.savez_compressed(
-        output_path,
-        states=states,
-        policy_targets=policy_targets,
-        legal_masks=legal_masks,
-        values=values,
-        search_scores=search_scores,
-        evaluations=evaluations
-    )
-
-    file_size_mb = os.path.getsize(output_path) / 1024 / 1024
-
-    # Calculate data statistics
-    total_size = (
-        states.nbytes +
-        policy_targets.nbytes +
-        legal_masks.nbytes +
-        values.nbytes +
-        search_scores.nbytes +
-        evaluations.nbytes
-    )
-    uncompressed_mb = total_size / 1024 / 1024
-    compression_ratio = total_size / os.path.getsize(output_path)
+    Returns:
+        (shard name, positions written)
+    """
+    name = shard_name(batch_file)
+    games = load_batch_games(batch_file)
+    multi_pv = max((len(pos_data.get('rootScores') or ()) for game in games for pos_data in game['positions']),
+                   default=1)
+    params = dict(conversion_params(policy_temperature), multi_pv=max(multi_pv, 1))
+    entry = write_shard(output_dir, name, encode_games(games, None, policy_temperature), params)
+    return name, entry['rows']
+
+def batches_to_convert(batch_files: List[str], output_dir: str,
+                       policy_temperature: Optional[float] = DEFAULT_POLICY_TEMPERATURE) -> List[str]:
+    """
+    Batch files that have no shard yet, were rewritten after their shard,
+    or whose shard was encoded with other conversion_params()
+    """
+    wanted = conversion_params(policy_temperature)
+    shards = {entry['name']: entry.get('params', {}) for entry in read_manifest(output_dir)['shards']}
+    return [
+        batch_file for batch_file in batch_files
+        if shard_name(batch_file) not in shards
+        or any(shards[shard_name(batch_file)].get(key) != value for key, value in wanted.items())
+        or os.path.getmtime(batch_file) > os.path.getmtime(os.path.join(output_dir, shard_name(batch_file)))
+    ]
+
+class BatchConverter:
+    """
+    Converts finished batches into shards in a background process
+
+    generate_in_batches() calls submit() as each batch completes, so encoding
+    batch i overlaps with generating batch i + 1 and the dataset is ready
+    soon after the last game. One worker keeps manifest updates serialized.
+    """
+
+    def __init__(self, output_dir: str, policy_temperature: Optional[float] = DEFAULT_POLICY_TEMPERATURE):
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.output_dir = output_dir
+        self.policy_temperature = policy_temperature
+        self.pool = ProcessPoolExecutor(max_workers=1)
+        self.futures = {}
+
+    def submit(self, batch_file: str):
+        if batch_file not in self.futures:
+            self.futures[batch_file] = self.pool.submit(convert_batch, batch_file, self.output_dir,
+                                                        self.policy_temperature)
+
+    def finish(self) -> int:
+        """Wait for all conversions; returns the number of shards written"""
+        written = 0
+        for batch_file, future in self.futures.items():
+            try:
+                name, rows = future.result()
+                print(f"  ✓ {os.path.basename(batch_file)} → {name} ({rows:,} positions)")
+                written += 1
+            except Exception as e:
+                print(f"  ✗ {os.path.basename(batch_file)}: {e} (rerun with --skip_generation to retry)")
+        self.pool.shutdown()
+        return written
+
+def save_dataset(dataset: Dict[str, np.ndarray], output_path: str = "training_data"):
+    """
+    Save processed (compact) dataset
+
+    A path ending in .npz is written as a single compressed archive; any
+    other path becomes a sharded store of raw .npy files (see
+    dataset_store.py) that train.py memory-maps instead of decompressing.
+    """
+    total_size = sum(array.nbytes for array in dataset.values())
+    num_positions = len(dataset['boards'])
+
+    if output_path.endswith('.npz'):
+        np.savez_compressed(output_path, **dataset)
+        disk_size = os.path.getsize(output_path)
+    else:
+        entries = save_sharded(dataset, output_path)
+        disk_size = sum(
+            os.path.getsize(os.path.join(output_path, entry['name'], name))
+            for entry in entries for name in os.listdir(os.path.join(output_path, entry['name']))
+        )
 
     print(f"\n{'='*60}")
     print(f"DATASET SAVED")
     print(f"{'='*60}")
-    print(f"  File: {output_path}")
-    print(f"  Compressed size: {file_size_mb:.2f} MB")
-    print(f"  Uncompressed size: {uncompressed_mb:.2f} MB")
-    print(f"  Compression ratio: {compression_ratio:.2f}x")
+    print(f"  {'File' if output_path.endswith('.npz') else 'Directory'}: {output_path}")
+    print(f"  Positions: {num_positions:,} ({total_size / max(num_positions, 1):.0f} bytes each)")
+    print(f"  Size on disk: {disk_size / 1024 / 1024:.2f} MB")
+    print(f"  Uncompressed size: {total_size / 1024 / 1024:.2f} MB")
     print(f"{'='*60}")
 
+    print_index_summary(write_material_index(output_path, dataset['boards']))
+
 def main():
     """Main data generation pipeline"""
     import argparse
@@ -414,86 +1001,319 @@ def main():
     parser.add_argument("--total_games", type=int, default=5000, help="Total number of games to generate")
     parser.add_argument("--batch_size", type=int, default=1000, help="Games per batch")
     parser.add_argument("--time_per_move", type=int, default=1000, help="Time per move in milliseconds (1000-1200 recommended for quality)")
-    parser.add_argument("--output", type=str, default="training_data.npz", help="Output dataset file")
+    parser.add_argument("--output", type=str, default="training_data", help="Output dataset directory (sharded, memory-mappable) or .npz file")
     parser.add_argument("--skip_generation", action="store_true", help="Skip game generation (process existing batches)")
     parser.add_argument("--batch_dir", type=str, default="game_batches", help="Directory for batch files")
+    parser.add_argument("--workers", type=int, default=1, help="Number of generator processes to run in parallel")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed (each game's seed is derived from it and the game id)")
+    parser.add_argument("--random_plies", type=int, default=None,
+                        help=f"Random opening plies per game (default: 0, or {PARALLEL_RANDOM_PLIES} with --workers > 1 "
+                             f"or --queue to keep parallel games distinct)")
+    parser.add_argument("--compress", action="store_true", help="Gzip the per-game record streams (.ndjson.gz)")
+    parser.add_argument("--resume", type=str, default="auto", choices=["auto", "fresh", "ask"],
+                        help="Games from an earlier run in --batch_dir: continue (auto), regenerate (fresh) or prompt (ask)")
+    parser.add_argument("--game_store", type=str, default=None,
+                        help="Also keep every game in this SQLite database (see game_store.py)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Also write a deduplicated copy (<output>_dedup) with per-row occurrence weights")
+    parser.add_argument("--opening_plies", type=int, default=0,
+                        help="Start each game from a distinct sampled opening of this many plies (0 = use --random_plies)")
+    parser.add_argument("--opening_mode", type=str, default="random", choices=["random", "book"],
+                        help="Opening sampler: uniform random moves or weighted by an opening book of earlier games")
+    parser.add_argument("--opening_book", type=str, default=None,
+                        help="Directory of batch files to build the opening book from (default: --batch_dir)")
+    parser.add_argument("--multi_pv", type=int, default=1, choices=range(1, MAX_POLICY_K + 1), metavar="K",
+                        help=f"Record the search scores of the top-K root moves per position (soft policy targets, K <= {MAX_POLICY_K})")
+    parser.add_argument("--policy_temperature", type=float, default=DEFAULT_POLICY_TEMPERATURE,
+                        help="Softmax temperature turning multi-PV scores into policy targets (0 = one-hot best move)")
+    parser.add_argument("--budget", type=str, default="time",
+                        help="Search budget per move: time (--time_per_move, wall clock) or deterministic "
+                             "depth:D, nodes:N, adaptive:N (N nodes, 4N on volatile positions)")
+    parser.add_argument("--resign_plies", type=int, default=0,
+                        help="Adjudicate a win once |search score| >= --resign_score for this many plies in a row (0 = off)")
+    parser.add_argument("--resign_score", type=int, default=600, help="Resign threshold (a man is about 100)")
+    parser.add_argument("--draw_plies", type=int, default=0,
+                        help="Adjudicate a draw once |search score| <= --draw_score for this many plies in a row (0 = off)")
+    parser.add_argument("--draw_score", type=int, default=10, help="Draw window around 0")
+    parser.add_argument("--draw_from_ply", type=int, default=60, help="Only count draw plies from this ply on")
+    parser.add_argument("--full_search_fraction", type=float, default=1.0,
+                        help="Playout cap: share of plies searched with the full budget and recorded (1 = all)")
+    parser.add_argument("--fast_budget", type=str, default="nodes:2000",
+                        help="Budget of the other, unrecorded plies (same format as --budget)")
+    parser.add_argument("--queue", action="store_true",
+                        help="Pull batches from a lease-based work queue in --batch_dir, so several processes or "
+                             "machines sharing it can run the same command")
+    parser.add_argument("--lease_ttl", type=float, default=DEFAULT_LEASE_TTL,
+                        help="Seconds without a heartbeat before a worker's batch is reclaimed (--queue)")
+    parser.add_argument("--quarantine", action="store_true",
+                        help="Move rows that fail validation into <output>_quarantine")
+    parser.add_argument("--spawn_per_batch", action="store_true",
+                        help="Start a new generator process per batch instead of keeping persistent workers")
+    parser.add_argument("--scratch_dir", type=str, default=None,
+                        help="Fast local directory to work in; --batch_dir and --output are synced back in the background")
+    parser.add_argument("--sync_interval", type=float, default=30.0,
+                        help="Seconds between background syncs from --scratch_dir")
 
     args = parser.parse_args()
 
+    generate_data(total_games=args.total_games, batch_size=args.batch_size, time_per_move=args.time_per_move,
+                  output=args.output, skip_generation=args.skip_generation, batch_dir=args.batch_dir,
+                  workers=args.workers, seed=args.seed, random_plies=args.random_plies, compress=args.compress,
+                  dedup=args.dedup, resume=args.resume, game_store=args.game_store,
+                  opening_plies=args.opening_plies, opening_mode=args.opening_mode,
+                  opening_book=args.opening_book, multi_pv=args.multi_pv,
+                  policy_temperature=args.policy_temperature, persistent=not args.spawn_per_batch,
+                  budget=args.budget, queue=args.queue, lease_ttl=args.lease_ttl, quarantine=args.quarantine,
+                  adjudication=adjudication_spec(args.resign_plies, args.resign_score, args.draw_plies,
+                                                 args.draw_score, args.draw_from_ply),
+                  playout_cap=playout_cap_spec(args.full_search_fraction, args.fast_budget),
+                  scratch_dir=args.scratch_dir, sync_interval=args.sync_interval)
+
+def build_sharded_dataset(batch_files: List[str], output_dir: str, converter: BatchConverter):
+    """
+    Make output_dir hold exactly one shard per batch file
+
+    Batches already converted in the background (or by an earlier run) are
+    kept; only batches without an up-to-date shard are encoded, and shards
+    of batches that are no longer in batch_files are dropped.
+    """
+    todo = batches_to_convert(batch_files, output_dir, converter.policy_temperature)
     print(f"\n{'='*60}")
-    print(f"MAKHOS DATA GENERATION PIPELINE")
-    print(f"{'='*60}\n")
+    print(f"CONVERTING BATCHES")
+    print(f"{'='*60}")
+    print(f"Batch files: {len(batch_files)} ({len(todo)} without an up-to-date shard)")
+    for batch_file in todo:
+        converter.submit(batch_file)
+    converter.finish()
+
+    wanted = {shard_name(batch_file) for batch_file in batch_files}
+    stale = [entry['name'] for entry in read_manifest(output_dir)['shards'] if entry['name'] not in wanted]
+    if stale:
+        remove_shards(output_dir, stale)
+        print(f"  Removed {len(stale)} shard(s) with no matching batch file")
+    widths = sorted({entry.get('params', {}).get('multi_pv', 1) for entry in read_manifest(output_dir)['shards']})
+    if len(widths) > 1:
+        print(f"  ⚠ Batches were generated with different multi-PV widths {widths}: their policy targets "
+              f"differ in kind (regenerate with resume='fresh' for uniform targets)")
+
+    dataset = open_dataset(output_dir)
+    print_dataset_summary(dataset)
+    print_index_summary(write_material_index(output_dir, dataset['boards']))
+
+    disk_size = sum(os.path.getsize(os.path.join(dirpath, name))
+                    for dirpath, _, names in os.walk(output_dir) for name in names)
+    print(f"\n{'='*60}")
+    print(f"DATASET SAVED")
+    print(f"{'='*60}")
+    print(f"  Directory: {output_dir}")
+    print(f"  Positions: {len(dataset['boards']):,}")
+    print(f"  Size on disk: {disk_size / 1024 / 1024:.2f} MB")
+    print(f"{'='*60}")
 
-    # Step 1: Generate games in batches
-    if not args.skip_generation:
-        batch_files = generate_in_batches(args.total_games, args.batch_size, args.time_per_move, args.batch_dir)
-        if not batch_files:
-            print("\n✗ No games were generated. Exiting.")
-            return
-    else:
-        print("Skipping generation, loading existing batches...")
-        batch_files = sorted(glob.glob(os.path.join(args.batch_dir, "games_batch_*.json")))
-        if not batch_files:
-            print(f"✗ No batch files found in {args.batch_dir}. Exiting.")
-            return
-        print(f"Found {len(batch_files)} batch files.")
+def output_siblings(output: str) -> List[str]:
+    """Paths next to output that the pipeline also writes (dedup copy, quarantine, .npz material indexes)"""
+    paths = [dedup_output_path(output), quarantine_path(output)]
+    return paths + [index_path(path) for path in (output, paths[0]) if path.endswith('.npz')]
+
+def generate_data(total_games=5000, batch_size=1000, time_per_move=1000, output="training_data", skip_generation=False, batch_dir="game_batches",
+                  workers=1, seed=0, random_plies=None, compress=False, dedup=False,
+                  resume="auto", game_store=None, opening_plies=0, opening_mode="random", opening_book=None,
+                  multi_pv=1, policy_temperature=DEFAULT_POLICY_TEMPERATURE, persistent=True, budget="time",
+                  queue=False, lease_ttl=DEFAULT_LEASE_TTL, quarantine=False, adjudication="",
+                  playout_cap="", scratch_dir=None, sync_interval=30.0):
+    """
+    Helper function for Jupyter/Colab - call directly without argparse
 
-    # Step 2: Merge batches
-    merged_file = merge_batch_files(batch_files)
+    With a directory output (the default) every finished batch is converted
+    to its own shard in a background process while the next batch is being
+    generated; skip_generation=True only converts batches that have no shard
+    yet. A .npz output is built in one go after generation.
 
-    # Step 3: Process games into training data
-    states, policy_targets, legal_masks, values, search_scores, evaluations = process_games(merged_file)
+    dedup=True additionally merges repeated positions into <output>_dedup
+    (see dedup.py), which is then the dataset to train on.
 
-    # Step 4: Save dataset
-    save_dataset(states, policy_targets, legal_masks, values, search_scores, evaluations, args.output)
+    resume="auto" (the default) continues an interrupted run without
+    prompting, so unattended Colab / cron runs never block; "fresh"
+    regenerates everything and "ask" restores the interactive prompt.
 
-    print(f"\n{'='*60}")
-    print(f"ALL DONE!")
-    print(f"{'='*60}")
-    print(f"Dataset ready: {args.output}")
-    print(f"Use in training with: python train.py --data {args.output}")
-    print(f"{'='*60}\n")
+    game_store="games.sqlite" also inserts every finished batch into an
+    indexed SQLite store (see game_store.py) for SQL queries and exports.
 
-def generate_data(total_games=5000, batch_size=1000, time_per_move=1000, output="training_data.npz", skip_generation=False, batch_dir="game_batches"):
-    """
-    Helper function for Jupyter/Colab - call directly without argparse
+    opening_plies=6 starts every game from a distinct 6-ply opening (see
+    openings.py) instead of random_plies random plies; opening_mode="book"
+    weights the opening moves by how often earlier games played them.
+
+    multi_pv=4 records the scores of the 4 best root moves of every search;
+    they become softmax(score / policy_temperature) policy targets.
+
+    Games are played by `workers` persistent generator processes (see
+    generator_pool.py); persistent=False spawns one generator per batch.
+
+    budget="nodes:200000" (or "depth:8", "adaptive:200000") replaces the
+    wall-clock time_per_move with a deterministic search budget, so labels
+    don't depend on machine load or the number of workers.
+
+    queue=True pulls batches from a lease-based work queue in batch_dir
+    (see generate_from_queue), so several processes or machines sharing
+    batch_dir can run the same call at once. Every process waits for the
+    last batch; the one that then claims the "dataset" lease builds the
+    output and marks it built (queue/dataset.done), and the others, also
+    those finishing later, return without building it. Batches whose games
+    crashed in one process are released for the others; if any are still
+    unfinished, no process builds the output (rerun to finish them).
+
+    adjudication=adjudication_spec(resign_plies=10, draw_plies=40) ends
+    decided games early (the adjudicated result becomes the game outcome),
+    so the same CPU time plays more distinct games.
+
+    playout_cap=playout_cap_spec(0.25, "nodes:2000") gives only a random
+    quarter of the plies the full budget and records just those; the rest
+    are played at 2000 nodes, so every game costs far less per kept row.
+    Only the full-budget plies count toward adjudication.
+
+    The finished dataset is always checked for inconsistent rows (see
+    validate_dataset.py); quarantine=True moves the failing rows of a
+    sharded output into <output>_quarantine.
+
+    scratch_dir="/content/scratch" runs everything against a local copy of
+    batch_dir and output (see scratch_sync.py): the durable copies, e.g. on
+    Google Drive, are pulled in first and a background thread copies new
+    files back every sync_interval seconds, checksummed, with a final pass
+    before returning.
+
+    random_plies=None plays games from the initial position with one
+    worker, as the single-process generator always did, and starts them
+    with PARALLEL_RANDOM_PLIES random plies when several workers or queue
+    processes play at once.
 
     Example:
         generate_data(total_games=1000, batch_size=500, time_per_move=1000)
+        generate_data(total_games=5000, batch_size=50, time_per_move=1000, workers=8)
     """
     print(f"\n{'='*60}")
     print(f"MAKHOS DATA GENERATION PIPELINE")
     print(f"{'='*60}\n")
 
-    # Step 1: Generate games in batches
-    if not skip_generation:
-        batch_files = generate_in_batches(total_games, batch_size, time_per_move, batch_dir)
-        if not batch_files:
-            print("\n✗ No games were generated. Exiting.")
-            return
-    else:
-        print("Skipping generation, loading existing batches...")
-        batch_files = sorted(glob.glob(os.path.join(batch_dir, "games_batch_*.json")))
-        if not batch_files:
-            print(f"✗ No batch files found in {batch_dir}. Exiting.")
-            return
-        print(f"Found {len(batch_files)} batch files.")
-
-    # Step 2: Merge batches
-    merged_file = merge_batch_files(batch_files)
+    if random_plies is None:
+        random_plies = PARALLEL_RANDOM_PLIES if workers > 1 or queue else 0
+
+    if queue and resume == "fresh":
+        raise ValueError("resume='fresh' would discard other workers' games; clear batch_dir by hand instead")
+    if queue and scratch_dir:
+        raise ValueError("queue=True needs batch_dir itself shared between workers; don't stage it in scratch_dir")
+
+    mirrors = []
+    durable_output = output
+    games_source = os.path.abspath(batch_dir)  # game store key of this run's games, scratch or not
+    if scratch_dir:
+        # Completed-games manifest first, so a durable copy never vouches for games it doesn't have
+        batch_dir, batch_mirror = stage(batch_dir, scratch_dir, sync_interval, first=(COMPLETED_MANIFEST,))
+        output, output_mirror = stage(output, scratch_dir, sync_interval, last=(MANIFEST,),
+                                      siblings=output_siblings(output))
+        mirrors = [batch_mirror, output_mirror]
+        for mirror in mirrors:
+            mirror.pull()
+            mirror.start()
+        print(f"Working in scratch {scratch_dir}, synced back every {sync_interval:g}s")
 
-    # Step 3: Process games into training data
-    states, policy_targets, legal_masks, values, search_scores, evaluations = process_games(merged_file)
-
-    # Step 4: Save dataset
-    save_dataset(states, policy_targets, legal_masks, values, search_scores, evaluations, output)
+    try:
+        work_queue = WorkQueue(os.path.join(batch_dir, QUEUE_DIR), lease_ttl) if queue else None
+
+        converter = None if output.endswith('.npz') else BatchConverter(output, policy_temperature)
+        store = GameStore(game_store, policy_temperature) if game_store and not queue else None
+
+        def on_batch(batch_file: str):
+            if converter:
+                converter.submit(batch_file)
+            if store:
+                print(f"  + {store.add_batch_file(batch_file, source=games_source)} games → {game_store}")
+            for mirror in mirrors:
+                mirror.request()
+
+        # Step 1: Generate games in batches
+        if work_queue:
+            # Outputs are built once, by a single process, after the last batch
+            batch_files = generate_from_queue(total_games, batch_size, time_per_move, batch_dir, workers=workers,
+                                              seed=seed, random_plies=random_plies, compress=compress,
+                                              opening_plies=opening_plies, opening_mode=opening_mode,
+                                              opening_book=opening_book, multi_pv=multi_pv, budget=budget,
+                                              adjudication=adjudication, playout_cap=playout_cap,
+                                              queue=work_queue)
+            num_batches = (total_games + batch_size - 1) // batch_size
+            done_marker = os.path.join(work_queue.queue_dir, DATASET_DONE)
+            # The marker is checked again once the lease is held: the builder may have finished in between
+            if (len(batch_files) < num_batches or os.path.exists(done_marker)
+                    or not work_queue.claim("dataset") or os.path.exists(done_marker)):
+                if len(batch_files) < num_batches:
+                    print(f"✗ {num_batches - len(batch_files)} batches unfinished; rerun to finish them. Exiting.")
+                elif os.path.exists(done_marker):
+                    print(f"Dataset already built by another worker (remove {done_marker} to rebuild). Exiting.")
+                else:
+                    print("Leaving the dataset to another worker. Exiting.")
+                if converter:
+                    converter.finish()
+                work_queue.close()
+                return
+            store = GameStore(game_store, policy_temperature) if game_store else None
+        elif not skip_generation:
+            batch_files = generate_in_batches(total_games, batch_size, time_per_move, batch_dir, workers=workers,
+                                              seed=seed, random_plies=random_plies, compress=compress,
+                                              on_batch=on_batch, resume=resume, opening_plies=opening_plies,
+                                              opening_mode=opening_mode, opening_book=opening_book,
+                                              multi_pv=multi_pv, persistent=persistent, budget=budget,
+                                              adjudication=adjudication, playout_cap=playout_cap)
+            if not batch_files:
+                print("\n✗ No games were generated. Exiting.")
+                return
+        else:
+            print("Skipping generation, loading existing batches...")
+            batch_files = list_batch_files(batch_dir)
+            if not batch_files:
+                print(f"✗ No batch files found in {batch_dir}. Exiting.")
+                return
+            print(f"Found {len(batch_files)} batch files.")
+
+        if store:
+            # Batches finished by earlier runs (or found by skip_generation)
+            added = sum(store.add_batch_file(batch_file, source=games_source) for batch_file in batch_files)
+            print(f"\nGame store {game_store}: {store.stats()['games']:,} games ({added:,} added now)")
+            store.close()
+
+        if converter:
+            # Step 2+3: Finish converting batches into shards
+            build_sharded_dataset(batch_files, output, converter)
+        else:
+            # Step 2: Stream batches into training data
+            dataset = process_games(batch_files, policy_temperature)
+
+            # Step 3: Save dataset
+            save_dataset(dataset, output)
+
+        # Step 4: Check rows (illegal policy targets, overlapping bitboards, ...)
+        validate_path(output, quarantine)
+
+        if dedup:
+            # Step 5: Merge repeated positions
+            source, output = output, dedup_output_path(output)
+            dedup_path(source, output)
+
+        if work_queue:
+            with open(done_marker, 'w') as f:
+                f.write(f"{output}\n")
+            work_queue.close()
+    finally:
+        # Also on errors / KeyboardInterrupt: whatever was finished becomes durable
+        for mirror in mirrors:
+            mirror.close()
+    if dedup:
+        durable_output = dedup_output_path(durable_output)
 
     print(f"\n{'='*60}")
     print(f"ALL DONE!")
     print(f"{'='*60}")
-    print(f"Dataset ready: {output}")
-    print(f"Use in training with: python train.py --data {output}")
+    print(f"Dataset ready: {durable_output}")
+    print(f"Use in training with: python train.py --data {durable_output}")
     print(f"{'='*60}\n")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
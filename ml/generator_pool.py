@@ -0,0 +1,206 @@
+"""
+Persistent game generator workers
+
+Spawning `npx tsx scripts/generate_games.ts` per batch pays the TypeScript
+transpile, module load and JIT warm-up every time, which adds up with the
+small batches resumability wants. GeneratorPool starts each generator once
+(`generate_games.ts --serve`) and keeps it for the whole run: game requests
+go in on its stdin, one JSON line each, and the finished game records come
+back on stdout.
+
+Games are deterministic in (seed, game id, opening), so a game played by a
+persistent worker is the same game a per-batch generator would have played.
+
+Example:
+    with GeneratorPool(workers=8) as pool:
+        for game in pool.play([GameRequest(i, 1000, seed=0, random_plies=2) for i in range(100)]):
+            ...
+"""
+
+import json
+import os
+import queue
+import signal
+import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+
+def tsx_command(script_name: str, *args) -> Tuple[str, str, dict]:
+    """
+    Shell command running scripts/<script_name> with tsx
+
+    Returns:
+        (command, project root to run it from, environment with node on PATH)
+    """
+    # Find project root (parent of ml directory)
+    try:
+        script_dir = os.path.dirname(__file__)
+        project_root = os.path.dirname(script_dir)
+    except NameError:
+        # In notebook: go up from current directory
+        script_dir = os.getcwd()
+        project_root = os.path.dirname(script_dir) if os.path.basename(script_dir) == 'ml' else script_dir
+
+    script_path = os.path.join(project_root, "scripts", script_name)
+
+    # For Colab: use full path to avoid /tools/node conflict
+    home = os.path.expanduser("~")
+    node_bin = f"{home}/.nvm/versions/node/v20.19.5/bin"
+    env = os.environ.copy()
+    env["PATH"] = f"{node_bin}:{env.get('PATH', '')}"
+    return f"{node_bin}/npx tsx {script_path} {' '.join(str(arg) for arg in args)}", project_root, env
+
+
+class GeneratorStartupError(RuntimeError):
+    """A generator process exited before it was ready (node / tsx missing or the script failed to load)"""
+
+
+class GameRequest(NamedTuple):
+    """One game for a worker (see GameRequest in generate_games.ts)"""
+    id: int
+    time_per_move: int
+    seed: int = 0
+    random_plies: int = 0
+    opening: Optional[List[int]] = None  # start state; replaces the random plies
+    opening_plies: int = 0
+    multi_pv: int = 1
+    budget: str = "time"  # search budget per move, see parseBudget() in generate_games.ts
+    adjudication: str = ""  # early end rules, see parseAdjudication() in generate_games.ts
+    playout_cap: str = ""  # fast unrecorded plies, see parsePlayoutCap() in generate_games.ts
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'id': self.id, 'timePerMove': self.time_per_move, 'seed': self.seed, 'randomPlies': self.random_plies,
+            'opening': self.opening, 'openingPlies': self.opening_plies, 'multiPv': self.multi_pv,
+            'budget': self.budget, 'adjudication': self.adjudication, 'playoutCap': self.playout_cap,
+        })
+
+
+class GeneratorWorker:
+    """
+    One long-lived generate_games.ts --serve process
+
+    The script writes {"ready": true} once it has loaded; a process that
+    exits before that raises GeneratorStartupError instead of failing the
+    game it was given, since every other worker would fail the same way.
+    """
+
+    def __init__(self):
+        cmd, project_root, env = tsx_command("generate_games.ts", "--serve")
+        self.process = subprocess.Popen(
+            ["bash", "-c", cmd],
+            cwd=project_root,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            env=env,
+            start_new_session=True
+        )
+        self.ready = False
+
+    def play(self, request: GameRequest) -> dict:
+        """Play one game; returns its record, or {"id", "failed": True} if the search found no move"""
+        if not self.ready:
+            if not self.process.stdout.readline():
+                raise GeneratorStartupError(f"Generator worker exited (code {self.process.wait()}) before it "
+                                            f"was ready; check that node and tsx are installed")
+            self.ready = True
+        self.process.stdin.write(request.to_json() + '\n')
+        self.process.stdin.flush()
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Generator worker exited (code {self.process.poll()}) during game {request.id}")
+        return json.loads(line)
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.kill()
+
+    def kill(self):
+        """Stop the generator now, game in progress or not"""
+        if self.process.poll() is None:
+            # The whole process group: bash, npx and the node process running the script
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            self.process.wait()
+
+
+class GeneratorPool:
+    """
+    A fixed set of persistent generator workers
+
+    submit() hands a game to the next idle worker and returns a Future of its
+    record. Workers are started lazily; one that dies is replaced for the
+    next game (the game it was playing fails with RuntimeError). Leaving the
+    `with` block on an exception cancels the games not started yet.
+    """
+
+    def __init__(self, workers: int = 1):
+        self.workers = max(workers, 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.idle = queue.Queue()
+        self.all = []
+        self.lock = threading.Lock()
+
+    def _acquire(self) -> GeneratorWorker:
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            worker = GeneratorWorker()
+            with self.lock:
+                self.all.append(worker)
+            return worker
+
+    def _play(self, request: GameRequest) -> dict:
+        worker = self._acquire()
+        try:
+            record = worker.play(request)
+        except Exception:
+            worker.kill()
+            with self.lock:
+                self.all.remove(worker)
+            raise
+        self.idle.put(worker)
+        return record
+
+    def submit(self, request: GameRequest) -> Future:
+        return self.executor.submit(self._play, request)
+
+    def play(self, requests: List[GameRequest]) -> Iterator[dict]:
+        """Records of all requests, in completion order"""
+        from concurrent.futures import as_completed
+        for future in as_completed([self.submit(request) for request in requests]):
+            yield future.result()
+
+    def close(self):
+        """Wait for every submitted game, then stop the workers"""
+        self.executor.shutdown(wait=True)
+        for worker in self.all:
+            worker.close()
+
+    def abort(self):
+        """Drop the games not started yet and kill the workers (their games in progress are lost)"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self.lock:
+            workers = list(self.all)
+        for worker in workers:
+            worker.kill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # On Ctrl-C / errors don't play out everything still queued
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
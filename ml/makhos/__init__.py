@@ -0,0 +1,35 @@
+"""
+Native Python Makhos (Thai checkers) engine core
+
+Bitboard position, move generation and rules that match src/core exactly,
+so encoding, legal masks, dataset checks and analysis run in-process
+without shelling out to Node. Games are still played by
+scripts/generate_games.ts: the search only exists in src/core/search, and
+keeping it there keeps the labels identical to the app's AI.
+
+Example:
+    from makhos import initial_position, generate_moves, apply_move
+    pos = initial_position()
+    pos = apply_move(pos, generate_moves(pos)[0])
+"""
+
+from .bitboards import STEPS, JUMPS, RAYS, bit_count, bits, to_rc, to_index
+from .position import (
+    Position,
+    EMPTY,
+    initial_position,
+    occupied,
+    is_draw_by_inactivity,
+    is_terminal,
+)
+from .movegen import Move, generate_moves, apply_move
+from .perft import perft
+from .batch import batch_legal_masks, legal_masks_from_states
+
+__all__ = [
+    "STEPS", "JUMPS", "RAYS", "bit_count", "bits", "to_rc", "to_index",
+    "Position", "EMPTY", "initial_position", "occupied", "is_draw_by_inactivity", "is_terminal",
+    "Move", "generate_moves", "apply_move",
+    "perft",
+    "batch_legal_masks", "legal_masks_from_states",
+]
@@ -0,0 +1,207 @@
+"""
+Vectorized legal-move generation over NumPy batches of positions
+
+Same rules as movegen.py, but evaluated for a whole (N, 4) array of
+bitboards at once with shift-and-mask operations instead of a Python loop
+per position. Only (from, to) pairs are produced, which is all the policy
+head needs: the result is an (N, 32, 32) legal mask plus a per-position
+"capture is forced" flag.
+
+Example:
+    masks, is_capture = batch_legal_masks(boards, sides)   # boards: (N, 4) uint32
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+from .bitboards import DIRS, NEXT, RAYS, UL, UR, DL, DR, FORWARD_DIRS
+
+_SQ = np.arange(32, dtype=np.uint32)
+_NEXT = np.array(NEXT, dtype=np.int8)  # (4, 32)
+
+# Shift groups per direction: sources with the same index delta share one
+# (mask, delta) pair, e.g. UL is ">> 4" on even rows and ">> 5" on odd rows
+_SHIFTS = []
+for _d in DIRS:
+    _groups = {}
+    for _s in range(32):
+        if NEXT[_d][_s] >= 0:
+            _delta = NEXT[_d][_s] - _s
+            _groups[_delta] = _groups.get(_delta, 0) | (1 << _s)
+    _SHIFTS.append(tuple((np.uint32(_m), _delta) for _delta, _m in sorted(_groups.items())))
+
+# Bitboard of every square strictly beyond s in direction d (king rays) and
+# of the single adjacent square (man "rays"); used to find the first blocker
+_RAY_BB = np.array([[sum(1 << q for q in RAYS[_d][_s]) for _s in range(32)] for _d in DIRS], dtype=np.uint32)
+_STEP_BB = np.array([[(1 << NEXT[_d][_s]) if NEXT[_d][_s] >= 0 else 0 for _s in range(32)] for _d in DIRS],
+                    dtype=np.uint32)
+# Rays towards lower indices (UL, UR) meet their nearest blocker at the highest set bit
+_TOWARDS_LOW = {UL: True, UR: True, DL: False, DR: False}
+
+# For each direction and distance k: source square k steps back from each target
+_BACK = np.full((4, 8, 32), -1, dtype=np.int8)
+for _d in DIRS:
+    for _s in range(32):
+        for _k, _q in enumerate(RAYS[_d][_s], start=1):
+            _BACK[_d, _k, _q] = _s
+
+_P1_MAN_DIRS = np.array([d in FORWARD_DIRS[1] for d in DIRS])
+_P2_MAN_DIRS = np.array([d in FORWARD_DIRS[-1] for d in DIRS])
+
+del _d, _s, _groups, _delta, _k, _q
+
+
+def shift(bb: np.ndarray, d: int) -> np.ndarray:
+    """Move every set square of a uint32 bitboard array one step in direction d"""
+    out = np.zeros_like(bb)
+    for mask, delta in _SHIFTS[d]:
+        if delta > 0:
+            out |= (bb & mask) << np.uint32(delta)
+        else:
+            out |= (bb & mask) >> np.uint32(-delta)
+    return out
+
+
+def unpack_bits(bb: np.ndarray) -> np.ndarray:
+    """(...,) uint32 bitboards -> (..., 32) bool, square i in column i"""
+    return ((bb[..., None] >> _SQ) & np.uint32(1)).astype(bool)
+
+
+def _bit_index(x: np.ndarray) -> np.ndarray:
+    """Index of the (single) highest set bit of each nonzero uint32"""
+    return (np.frexp(x.astype(np.float64))[1] - 1).astype(np.int8)
+
+
+def _lowest_bit(x: np.ndarray) -> np.ndarray:
+    return x & (~x + np.uint32(1))
+
+
+def _side_boards(boards: np.ndarray, sides: np.ndarray):
+    p1 = sides == 1
+    my_men = np.where(p1, boards[:, 0], boards[:, 2])
+    my_kings = np.where(p1, boards[:, 1], boards[:, 3])
+    opp = np.where(p1, boards[:, 2] | boards[:, 3], boards[:, 0] | boards[:, 1])
+    return my_men, my_kings, opp
+
+
+def _captures(boards: np.ndarray, sides: np.ndarray, masks: np.ndarray) -> np.ndarray:
+    """
+    Mark every capture chain's (from, final landing) in masks
+
+    Chains are expanded breadth-first as flat arrays of partial captures
+    (one row per position x moving piece x path so far), so each step is a
+    handful of vectorized operations over every open chain in the batch.
+    """
+    n = len(boards)
+    my_men, my_kings, opp = _side_boards(boards, sides)
+    occ = boards[:, 0] | boards[:, 1] | boards[:, 2] | boards[:, 3]
+
+    mover_bits = unpack_bits(my_men | my_kings)
+    row, origin = np.nonzero(mover_bits)
+    origin = origin.astype(np.int8)
+    king = ((my_kings[row] >> origin.astype(np.uint32)) & np.uint32(1)).astype(bool)
+    cur = origin.copy()
+    s_opp = opp[row]
+    s_occ = occ[row]
+    side_p1 = sides[row] == 1
+    captured_any = np.zeros(len(row), dtype=bool)
+
+    has_capture = np.zeros(n, dtype=bool)
+
+    while len(row):
+        nxt = []
+        extended = np.zeros(len(row), dtype=bool)
+        cur_u = cur.astype(np.intp)
+
+        for d in DIRS:
+            allowed = king | np.where(side_p1, _P1_MAN_DIRS[d], _P2_MAN_DIRS[d])
+            ray = np.where(king, _RAY_BB[d, cur_u], _STEP_BB[d, cur_u])
+            blockers = s_occ & ray
+            if _TOWARDS_LOW[d]:
+                nearest = _bit_index(blockers)
+            else:
+                nearest = _bit_index(_lowest_bit(blockers))
+            nearest_bit = np.where(blockers != 0, np.uint32(1) << nearest.clip(0).astype(np.uint32), np.uint32(0))
+            enemy = allowed & ((s_opp & nearest_bit) != 0)
+
+            landing = np.where(enemy, _NEXT[d, nearest.clip(0).astype(np.intp)], -1)
+            landing_bit = np.uint32(1) << landing.clip(0).astype(np.uint32)
+            ok = enemy & (landing >= 0) & ((s_occ & landing_bit) == 0)
+            if not ok.any():
+                continue
+
+            extended |= ok
+            cur_bit = np.uint32(1) << cur.astype(np.uint32)
+            nxt.append((
+                row[ok], origin[ok], landing[ok].astype(np.int8), king[ok], side_p1[ok],
+                s_opp[ok] & ~nearest_bit[ok],
+                (s_occ[ok] & ~nearest_bit[ok] & ~cur_bit[ok]) | landing_bit[ok],
+            ))
+
+        done = captured_any & ~extended
+        masks[row[done], origin[done], cur[done]] = True
+        has_capture[row[done]] = True
+
+        if not nxt:
+            break
+        row, origin, cur, king, side_p1, s_opp, s_occ = (np.concatenate(f) for f in zip(*nxt))
+        captured_any = np.ones(len(row), dtype=bool)
+
+    return has_capture
+
+
+def _quiet(boards: np.ndarray, sides: np.ndarray, masks: np.ndarray, rows: np.ndarray):
+    """Mark quiet men steps and flying king moves for the positions in rows"""
+    my_men, my_kings, _ = _side_boards(boards[rows], sides[rows])
+    occ = boards[rows, 0] | boards[rows, 1] | boards[rows, 2] | boards[rows, 3]
+    empty = ~occ
+    p1 = sides[rows] == 1
+
+    for d in DIRS:
+        # men: forward single steps
+        men = np.where(p1 if d in FORWARD_DIRS[1] else ~p1, my_men, np.uint32(0))
+        _mark_back(masks, rows, shift(men, d) & empty, d, 1)
+
+        # kings: slide until blocked; a square reached at distance k has a
+        # unique origin k steps back along the same ray
+        reach = my_kings
+        for k in range(1, 8):
+            reach = shift(reach, d) & empty
+            if not reach.any():
+                break
+            _mark_back(masks, rows, reach, d, k)
+
+
+def _mark_back(masks: np.ndarray, rows: np.ndarray, targets: np.ndarray, d: int, k: int):
+    hit_rows, to_sq = np.nonzero(unpack_bits(targets))
+    masks[rows[hit_rows], _BACK[d, k, to_sq], to_sq] = True
+
+
+def batch_legal_masks(boards: np.ndarray, sides: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Legal move masks for a batch of positions
+
+    Args:
+        boards: (N, 4) uint32 bitboards [p1Men, p1Kings, p2Men, p2Kings]
+        sides: (N,) side to move (1 = P1, -1 = P2)
+
+    Returns:
+        masks: (N, 32, 32) bool, masks[n, from, to] = True for legal moves
+        is_capture: (N,) bool, True where a capture is available (and forced)
+
+    Memory is 1 KB per position, so chunk very large inputs.
+    """
+    boards = np.ascontiguousarray(boards, dtype=np.uint32).reshape(-1, 4)
+    sides = np.asarray(sides).reshape(-1).astype(np.int8)
+    masks = np.zeros((len(boards), 32, 32), dtype=bool)
+
+    is_capture = _captures(boards, sides, masks)
+    _quiet(boards, sides, masks, np.nonzero(~is_capture)[0])
+    return masks, is_capture
+
+
+def legal_masks_from_states(states: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Same as batch_legal_masks() for (N, 6) state arrays as stored by the generator"""
+    states = np.asarray(states, dtype=np.int64).reshape(-1, 6)
+    return batch_legal_masks(states[:, :4].astype(np.uint32), states[:, 4])
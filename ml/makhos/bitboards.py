@@ -0,0 +1,107 @@
+"""
+32-square dark-tile indexing for Makhos (mirror of src/core/bitboards.ts)
+
+Index map (8x8): rows 0..7 from top; dark squares only -> 0..31.
+All adjacency tables are precomputed once at import time so the move
+generator only does table lookups and integer bit operations.
+"""
+
+from typing import List, Tuple
+
+# Direction ids, in the same order the TypeScript engine iterates them
+UL, UR, DL, DR = 0, 1, 2, 3
+DIRS = (UL, UR, DL, DR)
+DIR_NAMES = ('UL', 'UR', 'DL', 'DR')
+_DIR_DELTAS = ((-1, -1), (-1, +1), (+1, -1), (+1, +1))
+
+FULL = 0xFFFFFFFF
+
+SQUARE_TO_RC: List[Tuple[int, int]] = []
+RC_TO_INDEX: List[int] = [-1] * 64
+
+for _r in range(8):
+    for _c in range(8):
+        if (_r + _c) & 1:
+            RC_TO_INDEX[_r * 8 + _c] = len(SQUARE_TO_RC)
+            SQUARE_TO_RC.append((_r, _c))
+
+
+def to_rc(i: int) -> Tuple[int, int]:
+    """(row, col) of dark-square index i"""
+    return SQUARE_TO_RC[i]
+
+
+def to_index(r: int, c: int) -> int:
+    """Dark-square index of (r, c), or -1 for off-board / light squares"""
+    if r < 0 or r > 7 or c < 0 or c > 7:
+        return -1
+    return RC_TO_INDEX[r * 8 + c]
+
+
+# NEXT[d][i]: neighbour of square i in direction d (-1 if off board)
+NEXT: List[List[int]] = [[-1] * 32 for _ in DIRS]
+# STEPS[i] / JUMPS[i]: same contents and order as STEPS / JUMPS in bitboards.ts
+STEPS: List[List[Tuple[int, int]]] = [[] for _ in range(32)]      # (to, dir)
+JUMPS: List[List[Tuple[int, int, int]]] = [[] for _ in range(32)]  # (over, to, dir)
+# RAYS[d][i]: squares walked outward from i in direction d, nearest first
+RAYS: List[List[Tuple[int, ...]]] = [[()] * 32 for _ in DIRS]
+
+for _i in range(32):
+    _r, _c = SQUARE_TO_RC[_i]
+    for _d, (_dr, _dc) in zip(DIRS, _DIR_DELTAS):
+        _step = to_index(_r + _dr, _c + _dc)
+        _jump = to_index(_r + 2 * _dr, _c + 2 * _dc)
+        NEXT[_d][_i] = _step
+        if _step >= 0:
+            STEPS[_i].append((_step, _d))
+            if _jump >= 0:
+                JUMPS[_i].append((_step, _jump, _d))
+
+for _d in DIRS:
+    for _i in range(32):
+        _ray = []
+        _cur = NEXT[_d][_i]
+        while _cur >= 0:
+            _ray.append(_cur)
+            _cur = NEXT[_d][_cur]
+        RAYS[_d][_i] = tuple(_ray)
+
+# Men move/capture forward only: P1 (side 1) goes up, P2 (side -1) goes down
+FORWARD_DIRS = {1: (UL, UR), -1: (DL, DR)}
+
+# MAN_STEPS[side][i] = (to, ...) and MAN_JUMPS[side][i] = ((over, to), ...),
+# filtered to forward directions but kept in STEPS / JUMPS order
+MAN_STEPS = {
+    side: [tuple(to for to, d in STEPS[i] if d in dirs) for i in range(32)]
+    for side, dirs in FORWARD_DIRS.items()
+}
+MAN_JUMPS = {
+    side: [tuple((over, to) for over, to, d in JUMPS[i] if d in dirs) for i in range(32)]
+    for side, dirs in FORWARD_DIRS.items()
+}
+
+# Promotion rows: P1 promotes on 0..3, P2 on 28..31
+LAST_RANK = {1: 0x0000000F, -1: 0xF0000000}
+
+del _r, _c, _i, _d, _dr, _dc, _step, _jump, _ray, _cur
+
+
+def B1(i: int) -> int:
+    """Single-bit bitboard for square i"""
+    return 1 << i
+
+
+def bit_count(x: int) -> int:
+    """Population count of a 32-bit bitboard"""
+    return bin(x & FULL).count('1')
+
+
+def bits(bb: int) -> List[int]:
+    """Square indices set in bb, lowest first (same order as bits() in TS)"""
+    out = []
+    x = bb & FULL
+    while x:
+        lsb = x & -x
+        out.append(lsb.bit_length() - 1)
+        x ^= lsb
+    return out
@@ -0,0 +1,187 @@
+"""
+Neural network input / target encoding shared by gen_data, train and export
+
+Input planes, shape (6, 32) per position:
+  - plane 0: p1Men
+  - plane 1: p1Kings
+  - plane 2: p2Men
+  - plane 3: p2Kings
+  - plane 4: side to move (all 1s for P1, all 0s for P2)
+  - plane 5: halfmove clock (normalized 0-1)
+
+Everything works on whole batches: bitboards are expanded with
+np.unpackbits and masks are built with a single scatter.
+"""
+
+from typing import Sequence
+
+import numpy as np
+
+from .position import DRAW_HALFMOVES
+
+
+def unpack_boards(boards: np.ndarray) -> np.ndarray:
+    """(N, 4) uint32 bitboards -> (N, 4, 32) uint8, square i in column i"""
+    boards = np.ascontiguousarray(boards, dtype='<u4').reshape(-1, 4)
+    bits = np.unpackbits(boards.view(np.uint8), axis=1, bitorder='little')
+    return bits.reshape(-1, 4, 32)
+
+
+def encode_planes(boards: np.ndarray, sides: np.ndarray, halfmoves: np.ndarray) -> np.ndarray:
+    """
+    Encode positions as network input planes
+
+    Args:
+        boards: (N, 4) uint32 bitboards [p1Men, p1Kings, p2Men, p2Kings]
+        sides: (N,) side to move (1 = P1, -1 = P2)
+        halfmoves: (N,) halfmove clocks
+
+    Returns:
+        (N, 6, 32) float32 planes
+    """
+    boards = np.asarray(boards).reshape(-1, 4)
+    planes = np.empty((len(boards), 6, 32), dtype=np.float32)
+    planes[:, :4] = unpack_boards(boards)
+    planes[:, 4] = (np.asarray(sides).reshape(-1, 1) == 1)
+    planes[:, 5] = np.minimum(np.asarray(halfmoves, dtype=np.float32).reshape(-1, 1) / DRAW_HALFMOVES, 1.0)
+    return planes
+
+
+def encode_states(states: np.ndarray) -> np.ndarray:
+    """
+    Encode (N, 6) state arrays [p1Men, p1Kings, p2Men, p2Kings, side, halfmoveClock]
+
+    Returns:
+        (N, 6, 32) float32 planes
+    """
+    states = np.asarray(states, dtype=np.int64).reshape(-1, 6)
+    return encode_planes(states[:, :4].astype(np.uint32), states[:, 4], states[:, 5])
+
+
+def build_legal_masks(num_positions: int, rows: np.ndarray, from_sq: np.ndarray, to_sq: np.ndarray) -> np.ndarray:
+    """
+    Scatter flat move index arrays into legal move masks
+
+    Args:
+        num_positions: N
+        rows: (M,) position row of each move
+        from_sq: (M,) origin square of each move
+        to_sq: (M,) destination square of each move
+
+    Returns:
+        (N, 32, 32) float32 mask where mask[row, from, to] = 1 for legal moves
+    """
+    masks = np.zeros((num_positions, 32, 32), dtype=np.float32)
+    masks[np.asarray(rows, dtype=np.intp), np.asarray(from_sq, dtype=np.intp), np.asarray(to_sq, dtype=np.intp)] = 1.0
+    return masks
+
+
+def flatten_move_lists(move_lists: Sequence[Sequence[Sequence[int]]]):
+    """
+    Flatten per-position move lists ([from, to, ...] entries) into the flat
+    (rows, from_sq, to_sq) arrays expected by build_legal_masks()
+    """
+    counts = np.fromiter((len(moves) for moves in move_lists), dtype=np.intp, count=len(move_lists))
+    rows = np.repeat(np.arange(len(move_lists), dtype=np.intp), counts)
+    if len(rows) == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return rows, empty, empty
+    flat = np.array([move[:2] for moves in move_lists for move in moves], dtype=np.intp)
+    return rows, flat[:, 0], flat[:, 1]
+
+
+# Compact on-disk dataset layout: one row per position, ~20 bytes of
+# position + policy plus the scalar labels. Planes and legal masks are
+# rebuilt per batch at training time.
+#
+# Policy targets are sparse (index, prob) pairs, index = from * 32 + to,
+# sorted by probability and padded with (-1, 0) up to the dataset's K.
+COMPACT_FIELDS = {
+    'boards': np.uint32,          # (N, 4) [p1Men, p1Kings, p2Men, p2Kings]
+    'sides': np.int8,             # (N,) side to move, 1 / -1
+    'halfmoves': np.uint8,        # (N,) halfmove clock
+    'policy_indices': np.int16,   # (N, K) move indices, -1 = padding
+    'policy_probs': np.float16,   # (N, K) target probabilities, 0 for padding
+    'values': np.int8,            # (N,) game result from side-to-move's perspective
+    'search_scores': np.float32,
+    'evaluations': np.float32,
+}
+POLICY_FIELDS = ('policy_indices', 'policy_probs')
+MAX_POLICY_K = 8
+# Fill value for the padding columns of each policy field
+PAD_VALUES = {'policy_indices': -1, 'policy_probs': 0}
+
+
+def normalize_policy_probs(probs: np.ndarray) -> np.ndarray:
+    """
+    Rescale each row of (N, K) policy probabilities to sum to 1, so the
+    mass of moves cut off beyond K goes to the kept ones (all-zero rows
+    stay zero)
+
+    Returns:
+        (N, K) float16
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    total = probs.sum(axis=1, keepdims=True)
+    return np.divide(probs, total, out=np.zeros_like(probs), where=total > 0).astype(np.float16)
+
+
+def pad_policy_pairs(pair_lists: Sequence[Sequence[Sequence[float]]], k: int):
+    """
+    Pack per-position [[index, prob], ...] lists into (N, k) arrays,
+    keeping the k most probable moves of each position (renormalized)
+
+    Returns:
+        policy_indices (N, k) int16, policy_probs (N, k) float16
+    """
+    indices = np.full((len(pair_lists), k), -1, dtype=np.int16)
+    probs = np.zeros((len(pair_lists), k), dtype=np.float64)
+    for row, pairs in enumerate(pair_lists):
+        top = sorted(pairs, key=lambda pair: -pair[1])[:k]
+        for col, (index, prob) in enumerate(top):
+            indices[row, col] = index
+            probs[row, col] = prob
+    return indices, normalize_policy_probs(probs)
+
+
+def sparse_from_dense(policy: np.ndarray, k: int = 1):
+    """
+    Top-k (index, prob) pairs of dense (N, 32, 32) / (N, 1024) policies,
+    renormalized over the kept moves
+
+    Returns:
+        policy_indices (N, k) int16, policy_probs (N, k) float16
+    """
+    policy = np.asarray(policy, dtype=np.float32).reshape(len(policy), -1)
+    order = np.argsort(-policy, axis=1, kind='stable')[:, :k]
+    probs = np.take_along_axis(policy, order, axis=1)
+    indices = np.where(probs > 0, order, -1)
+    return indices.astype(np.int16), normalize_policy_probs(probs)
+
+
+def dense_policy(policy_indices: np.ndarray, policy_probs: np.ndarray) -> np.ndarray:
+    """(N, K) sparse pairs -> (N, 32, 32) float32 dense policy (for analysis tools)"""
+    n = len(policy_indices)
+    policy = np.zeros((n, 32 * 32 + 1), dtype=np.float32)  # column 1024 absorbs padding
+    cols = np.where(policy_indices >= 0, policy_indices, 32 * 32).astype(np.intp)
+    np.add.at(policy, (np.arange(n)[:, None], cols), np.asarray(policy_probs, dtype=np.float32))
+    return policy[:, :32 * 32].reshape(n, 32, 32)
+
+
+def compact_from_planes(states: np.ndarray):
+    """
+    Inverse of encode_planes() for legacy dense datasets
+
+    Halfmove clocks above the normalization cap (20) come back as 20, which
+    encodes to the same plane.
+
+    Returns:
+        boards (N, 4) uint32, sides (N,) int8, halfmoves (N,) uint8
+    """
+    states = np.asarray(states)
+    n = len(states)
+    bits = (states[:, :4] > 0.5).astype(np.uint8)
+    boards = np.packbits(bits, axis=2, bitorder='little').reshape(n, 16).view('<u4').astype(np.uint32)
+    sides = np.where(states[:, 4, 0] > 0.5, 1, -1).astype(np.int8)
+    halfmoves = np.rint(states[:, 5, 0] * DRAW_HALFMOVES).astype(np.uint8)
+    return boards, sides, halfmoves
@@ -0,0 +1,159 @@
+"""
+Makhos move generation (mirror of src/core/movegen.ts)
+
+- Men: step 1 forward diag; capture forward; forced capture; multi-capture chains
+- Kings: fly any distance; capture a single enemy on a ray and land on the
+  square immediately behind it; forced capture; multi-capture chains
+
+Moves are produced in exactly the same order as generateMoves() in TS, so
+indices into the move list (and therefore recorded games) line up between
+the two engines.
+"""
+
+from typing import List, NamedTuple, Tuple
+
+from .bitboards import DIRS, RAYS, MAN_STEPS, MAN_JUMPS, LAST_RANK, bits
+from .position import Position, occupied
+
+
+class Move(NamedTuple):
+    from_sq: int
+    to_sq: int
+    captured: Tuple[int, ...]  # dark-square indices of captured pieces, in capture order
+    promote: bool              # men only; kings never promote
+
+    @property
+    def index(self) -> int:
+        """Flat policy index (from * 32 + to), as used by moveToPolicyArray()"""
+        return self.from_sq * 32 + self.to_sq
+
+    def to_array(self) -> List[int]:
+        """Same layout as moveToArray() in generate_games.ts: [from, to, num_captured, promote]"""
+        return [self.from_sq, self.to_sq, len(self.captured), 1 if self.promote else 0]
+
+
+def apply_move(p: Position, m: Move) -> Position:
+    """Return the position after m (p is left untouched)"""
+    from_bit = 1 << m.from_sq
+    to_bit = 1 << m.to_sq
+
+    if p.side == 1:
+        my_men, my_kings, op_men, op_kings = p.p1_men, p.p1_kings, p.p2_men, p.p2_kings
+    else:
+        my_men, my_kings, op_men, op_kings = p.p2_men, p.p2_kings, p.p1_men, p.p1_kings
+
+    if my_kings & from_bit:
+        my_kings = (my_kings & ~from_bit) | to_bit
+    else:
+        my_men = my_men & ~from_bit
+        if m.promote:
+            my_kings |= to_bit
+        else:
+            my_men |= to_bit
+
+    for c in m.captured:
+        cb = 1 << c
+        if op_men & cb:
+            op_men &= ~cb
+        else:
+            op_kings &= ~cb
+
+    halfmove = 0 if m.captured else p.halfmove_clock + 1
+    if p.side == 1:
+        return Position(my_men, my_kings, op_men, op_kings, -1, halfmove)
+    return Position(op_men, op_kings, my_men, my_kings, 1, halfmove)
+
+
+def generate_moves(p: Position) -> List[Move]:
+    """All legal moves; captures are forced, so quiet moves only appear when no capture exists"""
+    side = p.side
+    if side == 1:
+        my_men, my_kings = p.p1_men, p.p1_kings
+        opp = p.p2_men | p.p2_kings
+    else:
+        my_men, my_kings = p.p2_men, p.p2_kings
+        opp = p.p1_men | p.p1_kings
+    occ = occupied(p)
+
+    # 1) forced captures - men first, then kings (flying)
+    captures: List[Move] = []
+    for frm in bits(my_men):
+        _men_captures_from(side, frm, opp, occ, captures)
+    for frm in bits(my_kings):
+        _king_captures_from(frm, opp, occ, captures)
+    if captures:
+        return captures
+
+    # 2) quiet moves - men (forward one step)
+    quiet: List[Move] = []
+    last_rank = LAST_RANK[side]
+    steps = MAN_STEPS[side]
+    for frm in bits(my_men):
+        for to in steps[frm]:
+            if not (occ >> to) & 1:
+                quiet.append(Move(frm, to, (), bool((last_rank >> to) & 1)))
+
+    # 2) quiet moves - kings (fly any distance until blocked)
+    for frm in bits(my_kings):
+        for d in DIRS:
+            for sq in RAYS[d][frm]:
+                if (occ >> sq) & 1:
+                    break
+                quiet.append(Move(frm, sq, (), False))
+
+    return quiet
+
+
+def _men_captures_from(side: int, frm: int, opp: int, occ: int, out: List[Move]):
+    """Append every maximal forward capture chain for the man on frm"""
+    jumps = MAN_JUMPS[side]
+    last_rank = LAST_RANK[side]
+    caps: List[int] = []
+
+    def dfs(cur: int, opp: int, occ: int):
+        extended = False
+        for over, landing in jumps[cur]:
+            if not (opp >> over) & 1 or (occ >> landing) & 1:
+                continue
+            over_bit = 1 << over
+            caps.append(over)
+            dfs(landing, opp & ~over_bit, (occ & ~over_bit & ~(1 << cur)) | (1 << landing))
+            caps.pop()
+            extended = True
+
+        if not extended and caps:
+            out.append(Move(frm, cur, tuple(caps), bool((last_rank >> cur) & 1)))
+
+    dfs(frm, opp, occ)
+
+
+def _king_captures_from(frm: int, opp: int, occ: int, out: List[Move]):
+    """Append every maximal flying capture chain for the king on frm"""
+    caps: List[int] = []
+
+    def dfs(cur: int, opp: int, occ: int):
+        extended = False
+        for d in DIRS:
+            enemy = -1
+            for sq in RAYS[d][cur]:
+                if enemy < 0:
+                    if not (occ >> sq) & 1:
+                        continue            # empty square before the enemy
+                    if not (opp >> sq) & 1:
+                        break               # blocked by own piece
+                    enemy = sq
+                    continue
+                # landing must be the first square behind the captured piece
+                if (occ >> sq) & 1:
+                    break
+                enemy_bit = 1 << enemy
+                caps.append(enemy)
+                dfs(sq, opp & ~enemy_bit, (occ & ~enemy_bit & ~(1 << cur)) | (1 << sq))
+                caps.pop()
+                extended = True
+                break
+
+        if not extended and caps:
+            out.append(Move(frm, cur, tuple(caps), False))
+
+    dfs(frm, opp, occ)
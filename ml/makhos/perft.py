@@ -0,0 +1,23 @@
+"""
+Perft node counter (mirror of src/core/perft.ts), handy for checking that
+the Python and TypeScript move generators agree
+"""
+
+from typing import Optional
+
+from .movegen import generate_moves, apply_move
+from .position import Position, initial_position
+
+
+def perft(depth: int, pos: Optional[Position] = None) -> int:
+    """Count leaf nodes of the full move tree `depth` plies deep"""
+    return _perft_rec(pos if pos is not None else initial_position(), depth)
+
+
+def _perft_rec(pos: Position, d: int) -> int:
+    if d == 0:
+        return 1
+    nodes = 0
+    for m in generate_moves(pos):
+        nodes += _perft_rec(apply_move(pos, m), d - 1)
+    return nodes
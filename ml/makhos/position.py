@@ -0,0 +1,73 @@
+"""
+Makhos position (mirror of src/core/position.ts)
+
+Field order matches positionToArray() in scripts/generate_games.ts, so
+tuple(pos) is exactly the `state` array stored with every training row
+and Position(*state) rebuilds it.
+"""
+
+from typing import NamedTuple, Sequence
+
+from .bitboards import bit_count
+
+DRAW_PIECE_THRESHOLD = 2  # inactivity window opens only when each side has <=2 pieces left
+DRAW_HALFMOVES = 20
+
+
+class Position(NamedTuple):
+    p1_men: int
+    p1_kings: int
+    p2_men: int
+    p2_kings: int
+    side: int            # 1 = P1 (bottom, moves up), -1 = P2 (top, moves down)
+    halfmove_clock: int  # plies since last capture
+
+    @classmethod
+    def from_array(cls, state: Sequence[int]) -> "Position":
+        """Build from [p1Men, p1Kings, p2Men, p2Kings, side, halfmoveClock]"""
+        return cls(int(state[0]), int(state[1]), int(state[2]), int(state[3]), int(state[4]), int(state[5]))
+
+    def to_array(self) -> list:
+        """Same layout as positionToArray() in generate_games.ts"""
+        return list(self)
+
+
+EMPTY = Position(0, 0, 0, 0, 1, 0)
+
+
+def initial_position() -> Position:
+    """8 men per side: P2 on the top two rows (0..7), P1 on the bottom two rows (24..31)"""
+    return Position(p1_men=0xFF000000, p1_kings=0, p2_men=0x000000FF, p2_kings=0, side=1, halfmove_clock=0)
+
+
+def occupied(p: Position) -> int:
+    return p.p1_men | p.p1_kings | p.p2_men | p.p2_kings
+
+
+def is_draw_by_inactivity(p: Position) -> bool:
+    p1_count = bit_count(p.p1_men | p.p1_kings)
+    p2_count = bit_count(p.p2_men | p.p2_kings)
+    few_pieces = p1_count <= DRAW_PIECE_THRESHOLD and p2_count <= DRAW_PIECE_THRESHOLD
+    return few_pieces and p.halfmove_clock >= DRAW_HALFMOVES
+
+
+def side_men(p: Position) -> int:
+    return p.p1_men if p.side == 1 else p.p2_men
+
+
+def side_kings(p: Position) -> int:
+    return p.p1_kings if p.side == 1 else p.p2_kings
+
+
+def opp_men(p: Position) -> int:
+    return p.p2_men if p.side == 1 else p.p1_men
+
+
+def opp_kings(p: Position) -> int:
+    return p.p2_kings if p.side == 1 else p.p1_kings
+
+
+def is_terminal(p: Position) -> bool:
+    my_count = bit_count(side_men(p) | side_kings(p))
+    op_count = bit_count(opp_men(p) | opp_kings(p))
+    return my_count == 0 or op_count == 0
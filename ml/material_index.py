@@ -0,0 +1,258 @@
+"""
+Material-signature index over a compact dataset
+
+Groups row ids by material signature (p1 men, p1 kings, p2 men, p2 kings
+counts), stored next to the dataset:
+
+    training_data/material_index.npz      # for a sharded store
+    training_data.material.npz            # for a .npz dataset
+
+The index is a CSR layout: signatures (G, 4), offsets (G + 1,) and rows (N,)
+with the row ids of group g in rows[offsets[g]:offsets[g + 1]], plus a
+digest of the boards it was built from, so an index left over from a
+rebuilt or relabelled dataset is never reused. Selecting a
+slice (e.g. all positions with <= 6 pieces) only touches the matching
+groups, and MaterialSampler draws phase-balanced or endgame-weighted
+batches in O(batch) with no scan over the data.
+
+Usage:
+    python material_index.py --data training_data            # build + summary
+    python material_index.py --data training_data --max_pieces 4
+"""
+
+import argparse
+import hashlib
+import os
+from typing import Callable, Dict, Iterator, Optional
+
+import numpy as np
+
+from dataset_store import is_sharded, open_dataset
+from makhos.encoding import unpack_boards
+
+# Phases by total piece count (16 at the start)
+PHASES = {
+    'opening': (13, 16),
+    'middlegame': (7, 12),
+    'endgame': (0, 6),
+}
+
+
+def material_counts(boards: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    """(N, 4) bitboards -> (N, 4) uint8 piece counts [p1Men, p1Kings, p2Men, p2Kings]"""
+    counts = np.empty((len(boards), 4), dtype=np.uint8)
+    for start in range(0, len(boards), chunk_size):
+        counts[start:start + chunk_size] = unpack_boards(np.asarray(boards[start:start + chunk_size])).sum(axis=2)
+    return counts
+
+
+def boards_digest(boards: np.ndarray, chunk_size: int = 1 << 20) -> str:
+    """Hex digest of the (N, 4) bitboards, read in chunks"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(tuple(boards.shape)).encode())
+    for start in range(0, len(boards), chunk_size):
+        digest.update(np.ascontiguousarray(boards[start:start + chunk_size]).tobytes())
+    return digest.hexdigest()
+
+
+def index_path(data_path: str) -> str:
+    """Where the index of a dataset lives"""
+    if data_path.endswith('.npz'):
+        return data_path[:-len('.npz')] + '.material.npz'
+    return os.path.join(data_path, 'material_index.npz')
+
+
+class MaterialIndex:
+    """Row ids grouped by material signature"""
+
+    def __init__(self, signatures: np.ndarray, offsets: np.ndarray, rows: np.ndarray, digest: str = ""):
+        self.signatures = signatures  # (G, 4) uint8
+        self.offsets = offsets        # (G + 1,) int64
+        self.rows = rows              # (N,) row ids, grouped
+        self.digest = digest          # boards_digest() of the indexed boards ("" = unknown)
+        self.sizes = np.diff(offsets)
+        self.pieces = signatures.astype(np.int64).sum(axis=1)
+
+    @classmethod
+    def build(cls, boards: np.ndarray) -> 'MaterialIndex':
+        counts = material_counts(boards)
+        code = counts.astype(np.int64) @ np.array([1, 9, 81, 729])  # counts are <= 8
+        rows = np.argsort(code, kind='stable')
+        _, starts = np.unique(code[rows], return_index=True)
+        offsets = np.append(starts, len(rows)).astype(np.int64)
+        return cls(counts[rows[starts]], offsets, rows.astype(np.int64), boards_digest(boards))
+
+    @classmethod
+    def load(cls, path: str) -> 'MaterialIndex':
+        with np.load(path) as f:
+            return cls(f['signatures'], f['offsets'], f['rows'], str(f['digest']) if 'digest' in f.files else "")
+
+    def save(self, path: str):
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, signatures=self.signatures, offsets=self.offsets, rows=self.rows, digest=np.array(self.digest))
+        os.replace(tmp, path)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def group_mask(self, pieces: Optional[int] = None, min_pieces: Optional[int] = None,
+                   max_pieces: Optional[int] = None, kings: Optional[bool] = None,
+                   where: Optional[Callable[[np.ndarray], np.ndarray]] = None) -> np.ndarray:
+        """
+        Boolean mask over signature groups
+
+        Args:
+            pieces / min_pieces / max_pieces: total piece count filters
+            kings: True = at least one king on the board, False = none
+            where: extra predicate on the (G, 4) signature array
+        """
+        mask = np.ones(len(self.signatures), dtype=bool)
+        if pieces is not None:
+            mask &= self.pieces == pieces
+        if min_pieces is not None:
+            mask &= self.pieces >= min_pieces
+        if max_pieces is not None:
+            mask &= self.pieces <= max_pieces
+        if kings is not None:
+            has_kings = (self.signatures[:, 1].astype(int) + self.signatures[:, 3]) > 0
+            mask &= has_kings if kings else ~has_kings
+        if where is not None:
+            mask &= where(self.signatures)
+        return mask
+
+    def select(self, **filters) -> np.ndarray:
+        """Row ids of every position matching group_mask(**filters), sorted"""
+        groups = np.nonzero(self.group_mask(**filters))[0]
+        if len(groups) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate([self.rows[self.offsets[g]:self.offsets[g + 1]] for g in groups]))
+
+    def phase_of_groups(self) -> np.ndarray:
+        """Phase name of every group (see PHASES)"""
+        phase = np.empty(len(self.signatures), dtype=object)
+        for name, (lo, hi) in PHASES.items():
+            phase[(self.pieces >= lo) & (self.pieces <= hi)] = name
+        return phase
+
+    def restrict(self, rows: np.ndarray) -> 'MaterialIndex':
+        """Index over a subset of rows (e.g. the training split); O(N) once"""
+        keep = np.zeros(int(self.rows.max(initial=-1)) + 1, dtype=bool)
+        keep[np.asarray(rows, dtype=np.int64)] = True
+        kept = keep[self.rows]
+        sizes = np.add.reduceat(kept.astype(np.int64), self.offsets[:-1]) if len(self.rows) else np.zeros(0, np.int64)
+        nonempty = sizes > 0
+        offsets = np.append(0, np.cumsum(sizes[nonempty])).astype(np.int64)
+        return MaterialIndex(self.signatures[nonempty], offsets, self.rows[kept])
+
+    def summary(self) -> Dict[str, int]:
+        """Row count per phase"""
+        phase = self.phase_of_groups()
+        return {name: int(self.sizes[phase == name].sum()) for name in PHASES}
+
+
+class MaterialSampler:
+    """
+    Draws row ids by material group, O(batch) per batch
+
+    Modes:
+        balanced: every phase (see PHASES) gets the same share of samples
+        endgame:  endgame rows are endgame_weight times as likely as others
+        uniform:  plain uniform sampling over the indexed rows
+
+    Usable as a DataLoader sampler (items of MakhosDataset are row ids).
+    """
+
+    def __init__(self, index: MaterialIndex, mode: str = 'balanced', num_samples: Optional[int] = None,
+                 endgame_weight: float = 4.0, seed: Optional[int] = None, chunk_size: int = 4096):
+        if mode not in ('balanced', 'endgame', 'uniform'):
+            raise ValueError(f"Unknown sampling mode {mode!r}")
+        self.index = index
+        self.num_samples = num_samples or len(index)
+        self.rng = np.random.default_rng(seed)
+        self.chunk_size = chunk_size
+
+        sizes = index.sizes.astype(np.float64)
+        phase = index.phase_of_groups()
+        if mode == 'balanced':
+            phase_sizes = {name: sizes[phase == name].sum() for name in PHASES}
+            weight = sizes / np.array([phase_sizes[name] for name in phase], dtype=np.float64)
+        elif mode == 'endgame':
+            weight = sizes * np.where(phase == 'endgame', endgame_weight, 1.0)
+        else:
+            weight = sizes
+        self.group_probs = weight / weight.sum()
+
+    def __len__(self):
+        return self.num_samples
+
+    def sample(self, n: int) -> np.ndarray:
+        """n row ids: pick groups by probability, then a uniform row within each"""
+        groups = self.rng.choice(len(self.group_probs), size=n, p=self.group_probs)
+        within = (self.rng.random(n) * self.index.sizes[groups]).astype(np.int64)
+        return self.index.rows[self.index.offsets[groups] + within]
+
+    def __iter__(self) -> Iterator[int]:
+        remaining = self.num_samples
+        while remaining > 0:
+            n = min(self.chunk_size, remaining)
+            yield from self.sample(n).tolist()
+            remaining -= n
+
+
+def write_material_index(data_path: str, boards: np.ndarray) -> MaterialIndex:
+    """Build the index of a dataset and save it next to it"""
+    index = MaterialIndex.build(boards)
+    index.save(index_path(data_path))
+    return index
+
+
+def load_material_index(data_path: str, boards: np.ndarray) -> MaterialIndex:
+    """Load the saved index, rebuilding it if missing or built from other boards"""
+    path = index_path(data_path)
+    if os.path.exists(path):
+        index = MaterialIndex.load(path)
+        if len(index) == len(boards) and index.digest == boards_digest(boards):
+            return index
+        print("  Material index is out of date (built from other boards), rebuilding...")
+    return write_material_index(data_path, boards)
+
+
+def print_index_summary(index: MaterialIndex):
+    total = max(len(index), 1)
+    print(f"\n{'='*60}")
+    print(f"MATERIAL INDEX")
+    print(f"{'='*60}")
+    print(f"  Signatures: {len(index.signatures)}")
+    for name, rows in index.summary().items():
+        lo, hi = PHASES[name]
+        print(f"  {name:<11} ({lo:2d}-{hi:2d} pieces): {rows:,} ({rows / total * 100:.1f}%)")
+    print(f"{'='*60}")
+
+
+def _load_boards(data_path: str) -> np.ndarray:
+    if is_sharded(data_path):
+        return open_dataset(data_path, fields=['boards'])['boards']
+    with np.load(data_path) as npz:
+        return npz['boards']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build / inspect the material-signature index of a dataset")
+    parser.add_argument("--data", type=str, default="training_data", help="Dataset directory or .npz file")
+    parser.add_argument("--max_pieces", type=int, default=None, help="Count positions with at most this many pieces")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild even if an up-to-date index exists")
+    args = parser.parse_args()
+
+    boards = _load_boards(args.data)
+    if args.rebuild:
+        index = write_material_index(args.data, boards)
+    else:
+        index = load_material_index(args.data, boards)
+    print_index_summary(index)
+    if args.max_pieces is not None:
+        rows = index.select(max_pieces=args.max_pieces)
+        print(f"  Positions with <= {args.max_pieces} pieces: {len(rows):,}")
+
+
+if __name__ == "__main__":
+    main()
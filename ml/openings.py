@@ -0,0 +1,167 @@
+"""
+Opening sampler: distinct start positions for self-play games
+
+playOneGame() starts every game from the initial position and the search is
+nearly deterministic, so without help most games replay openings we already
+have. OpeningSampler plays the first N plies with the Python engine, either
+uniformly at random or weighted by an opening book, and rejects openings
+already handed out (a seen-set keyed on the resulting position, so
+transpositions count as duplicates). The generator then searches from the
+sampled position.
+
+Openings depend only on (seed, game id, earlier openings), so a resumed run
+hands every game the same start position again.
+
+The book is built from existing batches: how often the search chose each
+move in each early position. Book mode samples move m with probability
+proportional to count(m) + smoothing, so popular lines are explored more
+while every legal move keeps a chance.
+"""
+
+import json
+import os
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from game_records import iter_game_records, position_policy_pairs
+from makhos import Position, apply_move, generate_moves, initial_position, is_terminal
+
+OPENINGS_FILE = "openings.json"
+
+Book = Dict[Tuple[int, ...], Counter]
+
+
+def build_book(batch_files: Iterable[str], max_plies: int) -> Book:
+    """
+    Count the moves chosen by the search in the first max_plies recorded
+    positions of every game
+
+    Returns:
+        dict of position tuple -> Counter of move index (from * 32 + to)
+    """
+    book: Book = defaultdict(Counter)
+    for batch_file in batch_files:
+        for game in iter_game_records(batch_file):
+            for pos_data in game['positions'][:max_plies]:
+                pairs = position_policy_pairs(pos_data)
+                if pairs:
+                    best = max(pairs, key=lambda pair: pair[1])[0]
+                    book[tuple(pos_data['state'])][int(best)] += 1
+    return dict(book)
+
+
+class OpeningSampler:
+    """
+    Samples distinct N-ply openings
+
+    Args:
+        plies: number of opening plies to play
+        mode: "random" (uniform over legal moves) or "book" (book-weighted)
+        seed: base seed
+        book: move counts from build_book() (book mode)
+        smoothing: pseudo-count added to every legal move in book mode
+        max_attempts: tries per game before a duplicate opening is accepted
+    """
+
+    def __init__(self, plies: int, mode: str = "random", seed: int = 0, book: Optional[Book] = None,
+                 smoothing: float = 1.0, max_attempts: int = 100):
+        if mode not in ("random", "book"):
+            raise ValueError(f"Unknown opening mode {mode!r}")
+        self.plies = plies
+        self.mode = mode
+        self.seed = seed
+        self.book = book or {}
+        self.smoothing = smoothing
+        self.max_attempts = max_attempts
+        self.seen = set()
+        self.duplicates = 0
+
+    def _play(self, rng: np.random.Generator) -> Position:
+        pos = initial_position()
+        for _ in range(self.plies):
+            moves = generate_moves(pos)
+            if not moves or is_terminal(pos):
+                break
+            counts = self.book.get(tuple(pos.to_array())) if self.mode == "book" else None
+            if counts:
+                weights = np.array([counts.get(m.index, 0) + self.smoothing for m in moves], dtype=np.float64)
+                choice = rng.choice(len(moves), p=weights / weights.sum())
+            else:
+                choice = rng.integers(len(moves))
+            pos = apply_move(pos, moves[choice])
+        return pos
+
+    def sample(self, game_id: int) -> Position:
+        """Start position for game_id, rejecting openings already handed out"""
+        for attempt in range(self.max_attempts):
+            pos = self._play(np.random.default_rng([self.seed, game_id, attempt]))
+            if pos not in self.seen:
+                self.seen.add(pos)
+                return pos
+        self.duplicates += 1
+        return pos
+
+    def sample_range(self, num_games: int) -> Dict[int, Position]:
+        """Openings for game ids 0 .. num_games - 1, in order (so results are reproducible)"""
+        return {game_id: self.sample(game_id) for game_id in range(num_games)}
+
+
+def write_openings(path: str, sampler: OpeningSampler, openings: Dict[int, Position]):
+    """Openings file read by generate_games.ts: {"plies": N, "positions": {id: state}, ...}"""
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump({
+            'plies': sampler.plies,
+            'mode': sampler.mode,
+            'seed': sampler.seed,
+            'positions': {str(i): pos.to_array() for i, pos in openings.items()},
+        }, f)
+    os.replace(tmp, path)
+
+
+def read_openings(path: str) -> Optional[dict]:
+    """Contents of an openings file, or None if there is none"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def prepare_openings(output_dir: str, num_games: int, plies: int, mode: str = "random", seed: int = 0,
+                     book_batches: Optional[List[str]] = None) -> str:
+    """
+    Sample openings for every game of a run and write them to output_dir
+
+    Returns:
+        path of the openings file
+    """
+    book = build_book(book_batches, plies) if mode == "book" and book_batches else None
+    sampler = OpeningSampler(plies, mode, seed, book)
+    openings = sampler.sample_range(num_games)
+    path = os.path.join(output_dir, OPENINGS_FILE)
+    write_openings(path, sampler, openings)
+
+    print(f"Openings: {len(sampler.seen)} distinct {plies}-ply openings for {num_games} games ({mode}"
+          f"{f', book of {len(book)} positions' if book else ''})")
+    if sampler.duplicates:
+        print(f"  ⚠ {sampler.duplicates} games reuse an opening (too few distinct {plies}-ply lines; "
+              f"raise opening_plies)")
+    return path
+
+
+def load_or_prepare_openings(output_dir: str, num_games: int, plies: int, mode: str = "random", seed: int = 0,
+                             book_batches: Optional[List[str]] = None, fresh: bool = False) -> str:
+    """
+    Reuse the openings of an earlier run in output_dir when they match
+    (same plies, mode and seed, enough games), so resumed games keep their
+    start positions; otherwise sample new ones
+    """
+    path = os.path.join(output_dir, OPENINGS_FILE)
+    existing = None if fresh else read_openings(path)
+    if (existing and existing['plies'] == plies and existing.get('mode') == mode
+            and existing.get('seed') == seed and len(existing['positions']) >= num_games):
+        print(f"Openings: reusing {len(existing['positions'])} openings from {path}")
+        return path
+    return prepare_openings(output_dir, num_games, plies, mode, seed, book_batches)
@@ -0,0 +1,249 @@
+"""
+Reanalyze: re-search stored positions at a bigger budget
+
+Improving labels used to mean regenerating whole games. reanalyze() takes the
+positions of an existing dataset (sharded store or .npz) or game store
+(SQLite, see game_store.py) and sends them to the search as batches of
+positions (scripts/analyze_positions.ts), several generator processes in
+parallel, at a higher time and/or depth budget, or a deterministic one
+(budget="nodes:N" etc., see gen_data.check_budget). With multi_pv > 1 the
+re-searched rows get softmax policy targets over the top root moves, as in
+generation (see game_records.position_policy_pairs).
+
+The output is a sharded dataset with the same rows in the same order;
+policy_indices / policy_probs / search_scores of the re-searched rows are
+replaced by the new search result, all other fields are copied. Work is
+done in chunks of rows, one output shard per chunk, so an interrupted run
+picks up at the first chunk without a shard.
+
+Usage:
+    python reanalyze.py --data training_data --output training_data_reanalyzed --time_per_move 3000 --workers 8
+    python reanalyze.py --data games.sqlite --where "pieces <= 6" --output endgames_deep --max_depth 16
+    python reanalyze.py --data training_data --budget nodes:1000000 --multi_pv 4 --workers 8
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from dataset_store import is_sharded, open_dataset, read_manifest, write_shard
+from game_records import DEFAULT_POLICY_TEMPERATURE, position_policy_pairs
+from game_store import GameStore, concatenate_samples
+from gen_data import check_budget, check_multi_pv, describe_budget
+from generator_pool import tsx_command
+from material_index import write_material_index
+from makhos.encoding import MAX_POLICY_K, PAD_VALUES, pad_policy_pairs
+
+STORE_EXTENSIONS = ('.sqlite', '.sqlite3', '.db')
+
+
+def load_source(path: str, where: str = "") -> Dict[str, np.ndarray]:
+    """Positions of a sharded store, .npz file or game store (optionally filtered by where)"""
+    if path.endswith(STORE_EXTENSIONS):
+        with GameStore(path) as store:
+            chunks = list(store.iter_samples(where))
+        if not chunks:
+            raise ValueError(f"No positions in {path}" + (f" matching {where!r}" if where else ""))
+        return concatenate_samples(chunks)
+    if where:
+        raise ValueError("where filters only apply to a game store")
+    if is_sharded(path):
+        return open_dataset(path)
+    with np.load(path) as npz:
+        return {name: npz[name] for name in npz.files}
+
+
+def search_positions(states: np.ndarray, time_per_move: int, max_depth: int = 22, workers: int = 1,
+                     work_dir: str = ".", multi_pv: int = 1, budget: str = "time") -> List[dict]:
+    """
+    Search every (N, 6) state with scripts/analyze_positions.ts
+
+    The states are split into `workers` contiguous slices, each searched by
+    its own generator process.
+
+    Returns:
+        one result per state, in order: {"policy", "rootScores" (multi-PV), "searchDepth", "searchScore",
+        "searchNodes"}
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    slices = [part for part in np.array_split(np.arange(len(states)), max(workers, 1)) if len(part)]
+
+    def run(slice_idx: int) -> List[dict]:
+        input_file = os.path.abspath(os.path.join(work_dir, f"positions_{slice_idx:03d}.ndjson"))
+        output_file = os.path.abspath(os.path.join(work_dir, f"results_{slice_idx:03d}.ndjson"))
+        with open(input_file, 'w') as f:
+            f.writelines(json.dumps(states[row].tolist()) + '\n' for row in slices[slice_idx])
+        cmd, project_root, env = tsx_command("analyze_positions.ts", input_file, output_file, time_per_move,
+                                             max_depth, multi_pv, budget)
+        try:
+            subprocess.run(["bash", "-c", cmd], cwd=project_root, env=env, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Search of slice {slice_idx} failed (exit code {e.returncode}):\n"
+                               f"{(e.stderr or '').strip()}") from e
+        with open(output_file, 'r') as f:
+            results = [json.loads(line) for line in f if line.strip()]
+        os.remove(input_file)
+        os.remove(output_file)
+        if len(results) != len(slices[slice_idx]):
+            raise RuntimeError(f"Search returned {len(results)} results for {len(slices[slice_idx])} positions")
+        return results
+
+    with ThreadPoolExecutor(max_workers=max(len(slices), 1)) as pool:
+        parts = list(pool.map(run, range(len(slices))))
+    return [result for part in parts for result in part]
+
+
+def reanalyze_chunk(chunk: Dict[str, np.ndarray], selected: np.ndarray, time_per_move: int, max_depth: int,
+                    workers: int, work_dir: str, multi_pv: int = 1, budget: str = "time",
+                    policy_temperature: float = DEFAULT_POLICY_TEMPERATURE) -> Dict[str, np.ndarray]:
+    """
+    Copy of a chunk with fresh search labels for the rows in selected
+    (chunk-relative row ids)
+
+    Rows whose position has no legal move keep their old labels. The policy
+    fields are widened to multi_pv columns if they are narrower.
+    """
+    out = {name: np.array(column) for name, column in chunk.items()}
+    if len(selected) == 0:
+        return out
+
+    states = np.concatenate([
+        out['boards'][selected].astype(np.int64),
+        out['sides'][selected, None].astype(np.int64),
+        out['halfmoves'][selected, None].astype(np.int64),
+    ], axis=1)
+    results = search_positions(states, time_per_move, max_depth, workers, work_dir, multi_pv, budget)
+
+    found = np.array([bool(result['policy']) for result in results], dtype=bool)
+    rows = selected[found]
+    results = [result for result in results if result['policy']]
+    if len(rows) == 0:
+        return out
+
+    k = max(out['policy_indices'].shape[1], multi_pv)
+    for name in PAD_VALUES:
+        width = out[name].shape[1]
+        if width < k:
+            out[name] = np.pad(out[name], ((0, 0), (0, k - width)), constant_values=PAD_VALUES[name])
+    indices, probs = pad_policy_pairs([position_policy_pairs(result, policy_temperature) for result in results], k)
+    out['policy_indices'][rows] = indices
+    out['policy_probs'][rows] = probs
+    scores = np.array([result['searchScore'] for result in results], dtype=np.float32)
+    out['search_scores'][rows] = scores * out['sides'][rows]  # same flip as process_games()
+    return out
+
+
+def reanalyze(source: str, output: str, time_per_move: int = 3000, max_depth: int = 22, workers: int = 1,
+              rows: Optional[np.ndarray] = None, chunk_size: int = 20_000, where: str = "", multi_pv: int = 1,
+              budget: str = "time", policy_temperature: float = DEFAULT_POLICY_TEMPERATURE) -> int:
+    """
+    Re-search positions of a dataset or game store into a new sharded dataset
+
+    Args:
+        source: Dataset directory, .npz file or game store (.sqlite / .db)
+        output: Output dataset directory (same rows as the source, in order)
+        time_per_move: Search time per position in milliseconds
+        max_depth: Search depth limit (search stops at whichever budget is hit first)
+        workers: Number of search processes to run in parallel
+        rows: Row ids to re-search (default: all); the other rows are copied unchanged
+        chunk_size: Rows per output shard (keep it fixed when resuming)
+        where: SQL filter on the samples view when source is a game store
+        multi_pv: Root moves scored per search; > 1 gives softmax policy targets
+        budget: Search budget spec (see gen_data.check_budget); "time" uses time_per_move
+        policy_temperature: Softmax temperature of multi-PV policy targets, in score units
+
+    Returns:
+        number of positions re-searched
+    """
+    check_budget(budget)
+    check_multi_pv(multi_pv)
+    dataset = load_source(source, where)
+    num_rows = len(dataset['boards'])
+    selected = np.ones(num_rows, dtype=bool)
+    if rows is not None:
+        selected[:] = False
+        selected[np.asarray(rows, dtype=np.int64)] = True
+
+    os.makedirs(output, exist_ok=True)
+    done = {entry['name'] for entry in read_manifest(output)['shards']}
+    work_dir = os.path.join(output, ".reanalyze_tmp")
+    num_chunks = (num_rows + chunk_size - 1) // chunk_size
+
+    print(f"\n{'='*60}")
+    print(f"REANALYZE")
+    print(f"{'='*60}")
+    print(f"  Source: {source} ({num_rows:,} positions)")
+    print(f"  Re-search: {int(selected.sum()):,} positions at {describe_budget(budget, time_per_move)}, "
+          f"max depth {max_depth}" + (f", multi-PV {multi_pv}" if multi_pv > 1 else ""))
+    print(f"  Workers: {workers}")
+    print(f"  Chunks: {num_chunks} ({len(done)} already done)")
+    print(f"{'='*60}")
+
+    start_time = time.time()
+    searched = 0
+    for chunk_idx in range(num_chunks):
+        name = f"reanalyzed_{chunk_idx:04d}"
+        if name in done:
+            continue
+        start, end = chunk_idx * chunk_size, min((chunk_idx + 1) * chunk_size, num_rows)
+        chunk = {field: column[start:end] for field, column in dataset.items()}
+        chunk_rows = np.nonzero(selected[start:end])[0]
+        old_best = np.array(chunk['policy_indices'])[:, 0]
+        refreshed = reanalyze_chunk(chunk, chunk_rows, time_per_move, max_depth, workers, work_dir, multi_pv,
+                                    budget, policy_temperature)
+        write_shard(output, name, refreshed)
+
+        searched += len(chunk_rows)
+        changed = (refreshed['policy_indices'][chunk_rows, 0] != old_best[chunk_rows]).mean() if len(chunk_rows) else 0
+        elapsed = time.time() - start_time
+        print(f"  ✓ {name}: rows {start:,}-{end - 1:,}, {len(chunk_rows):,} re-searched, "
+              f"best move changed in {changed * 100:.1f}% ({searched / max(elapsed, 1e-9):.1f} positions/s)")
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    write_material_index(output, open_dataset(output, fields=['boards'])['boards'])
+
+    print(f"\n{'='*60}")
+    print(f"REANALYZE COMPLETE")
+    print(f"{'='*60}")
+    print(f"  Re-searched: {searched:,} positions in {(time.time() - start_time) / 60:.1f} min")
+    print(f"  Saved to: {output}")
+    print(f"{'='*60}")
+    return searched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-search stored positions at a bigger budget")
+    parser.add_argument("--data", type=str, default="training_data",
+                        help="Dataset directory, .npz file or game store (.sqlite / .db)")
+    parser.add_argument("--output", type=str, default=None, help="Output dataset directory (default: <data>_reanalyzed)")
+    parser.add_argument("--time_per_move", type=int, default=3000, help="Search time per position in milliseconds")
+    parser.add_argument("--max_depth", type=int, default=22, help="Search depth limit")
+    parser.add_argument("--workers", type=int, default=1, help="Number of search processes to run in parallel")
+    parser.add_argument("--chunk_size", type=int, default=20_000, help="Rows per output shard")
+    parser.add_argument("--where", type=str, default="", help="SQL filter on the samples view (game store only)")
+    parser.add_argument("--multi_pv", type=int, default=1, choices=range(1, MAX_POLICY_K + 1), metavar="K",
+                        help=f"Score the top K root moves; K > 1 gives softmax policy targets (K <= {MAX_POLICY_K})")
+    parser.add_argument("--budget", type=str, default="time",
+                        help="Search budget: time, time:MS, depth:D, nodes:N or adaptive:N")
+    parser.add_argument("--policy_temperature", type=float, default=DEFAULT_POLICY_TEMPERATURE,
+                        help="Softmax temperature of multi-PV policy targets, in score units")
+    args = parser.parse_args()
+
+    output = args.output or f"{os.path.splitext(args.data.rstrip('/'))[0]}_reanalyzed"
+    if os.path.abspath(output) == os.path.abspath(args.data):
+        parser.error("--output must differ from --data")
+    reanalyze(args.data, output, args.time_per_move, args.max_depth, args.workers,
+              chunk_size=args.chunk_size, where=args.where, multi_pv=args.multi_pv, budget=args.budget,
+              policy_temperature=args.policy_temperature)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Uncertainty-targeted relabelling
+
+Most positions are easy and every one of them got the same search budget.
+score_positions() runs the current network (MakhosNet / SimpleMakhosNet)
+over every stored position in large batches and measures how unsure or
+wrong it is:
+
+    entropy:       entropy of the policy over the legal moves
+    value_error:   |predicted value - values| (game outcome, side to move)
+    disagreement:  1 - network probability of the target's best move
+                   (policy_indices[:, 0])
+
+relabel() ranks the positions by one of these, sends only the top fraction
+back to a deep search (reanalyze.py), and writes the whole dataset with the
+selected rows relabelled. The scores are saved next to it as
+uncertainty.npz.
+
+Usage:
+    python relabel.py --data training_data --model checkpoints/best_model.pt --criterion disagreement \\
+        --fraction 0.1 --time_per_move 3000 --workers 8
+
+Pass the --multi_pv, --budget and --policy_temperature the data was
+generated with, or the relabelled rows get different kinds of targets than
+the rest (one-hot instead of soft, wall-clock instead of deterministic).
+"""
+
+import argparse
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+
+from game_records import DEFAULT_POLICY_TEMPERATURE
+from model import create_model
+from makhos import batch_legal_masks
+from makhos.encoding import MAX_POLICY_K, encode_planes
+from reanalyze import load_source, reanalyze
+
+CRITERIA = ('entropy', 'value_error', 'disagreement')
+
+
+def load_model(model_path: str, model_type: str = "simple", device: Optional[torch.device] = None,
+               **kwargs) -> torch.nn.Module:
+    """Model from a checkpoint written by train.py (kwargs: architecture sizes)"""
+    device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = create_model(model_type, **kwargs)
+    checkpoint = torch.load(model_path, map_location=device)
+    model.load_state_dict(checkpoint['model_state_dict'])
+    return model.to(device).eval()
+
+
+def score_positions(model: torch.nn.Module, data: Dict[str, np.ndarray],
+                    batch_size: int = 4096) -> Dict[str, np.ndarray]:
+    """
+    Uncertainty scores of every row (see module docstring), one array per criterion
+
+    Returns:
+        dict of criterion -> (N,) float32
+    """
+    device = next(model.parameters()).device
+    num_rows = len(data['boards'])
+    scores = {name: np.zeros(num_rows, dtype=np.float32) for name in CRITERIA}
+
+    with torch.no_grad():
+        for start in range(0, num_rows, batch_size):
+            end = min(start + batch_size, num_rows)
+            boards = np.asarray(data['boards'][start:end])
+            sides = np.asarray(data['sides'][start:end])
+            legal_masks, _ = batch_legal_masks(boards, sides)
+
+            planes = torch.from_numpy(encode_planes(boards, sides, np.asarray(data['halfmoves'][start:end])))
+            policy_logits, value = model(planes.to(device))
+
+            legal = torch.from_numpy(legal_masks.reshape(end - start, -1)).to(device)
+            logits = policy_logits.reshape(end - start, -1).float().masked_fill(~legal, -1e9)
+            log_probs = torch.log_softmax(logits, dim=1)
+            probs = log_probs.exp()
+            entropy = -(probs * log_probs).sum(dim=1)
+
+            targets = torch.from_numpy(np.asarray(data['policy_indices'][start:end])[:, 0].astype(np.int64)).to(device)
+            target_probs = probs.gather(1, targets.clamp(min=0).unsqueeze(1)).squeeze(1)
+            disagreement = torch.where(targets >= 0, 1 - target_probs, torch.zeros_like(target_probs))
+
+            values = torch.from_numpy(np.asarray(data['values'][start:end]).astype(np.float32)).to(device)
+            value_error = (value.squeeze(1).float() - values).abs()
+
+            scores['entropy'][start:end] = entropy.cpu().numpy()
+            scores['value_error'][start:end] = value_error.cpu().numpy()
+            scores['disagreement'][start:end] = disagreement.cpu().numpy()
+
+    return scores
+
+
+def select_uncertain(scores: np.ndarray, fraction: float) -> np.ndarray:
+    """Row ids of the top fraction by score, sorted"""
+    count = int(round(len(scores) * fraction))
+    if count <= 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.sort(np.argpartition(-scores, count - 1)[:count]).astype(np.int64)
+
+
+def print_score_summary(scores: Dict[str, np.ndarray], criterion: str, rows: np.ndarray):
+    print(f"\n{'='*60}")
+    print(f"UNCERTAINTY SCORES")
+    print(f"{'='*60}")
+    for name, values in scores.items():
+        marker = " ← ranking" if name == criterion else ""
+        print(f"  {name:<13} mean {values.mean():.3f}, p90 {np.percentile(values, 90):.3f}, "
+              f"max {values.max():.3f}{marker}")
+    selected = scores[criterion][rows]
+    print(f"  Selected: {len(rows):,} / {len(scores[criterion]):,} positions "
+          f"({criterion} >= {selected.min() if len(rows) else 0:.3f})")
+    print(f"{'='*60}")
+
+
+def relabel(data_path: str, model_path: str, output: str, criterion: str = "disagreement", fraction: float = 0.1,
+            time_per_move: int = 3000, max_depth: int = 22, workers: int = 1, model_type: str = "simple",
+            batch_size: int = 4096, where: str = "", multi_pv: int = 1, budget: str = "time",
+            policy_temperature: float = DEFAULT_POLICY_TEMPERATURE, **model_kwargs) -> np.ndarray:
+    """
+    Score every position, deep-search the most uncertain fraction and write
+    the relabelled dataset to output
+
+    Args:
+        data_path: Dataset directory, .npz file or game store
+        model_path: Checkpoint written by train.py
+        output: Output dataset directory (all rows, selected ones relabelled)
+        criterion: "entropy", "value_error" or "disagreement"
+        fraction: Share of positions to relabel
+        time_per_move / max_depth / workers: Search budget, see reanalyze()
+        model_type: "simple" or "resnet" (model_kwargs: hidden_size, num_channels, num_res_blocks)
+        batch_size: Positions per network batch
+        where: SQL filter when data_path is a game store
+        multi_pv / budget / policy_temperature: Root moves scored, search budget spec and softmax
+            temperature of the new targets, see reanalyze() (use the values the data was generated with)
+
+    Returns:
+        row ids that were relabelled
+    """
+    if criterion not in CRITERIA:
+        raise ValueError(f"criterion must be one of {CRITERIA}, not {criterion!r}")
+
+    data = load_source(data_path, where)
+    model = load_model(model_path, model_type, **model_kwargs)
+    print(f"Scoring {len(data['boards']):,} positions with {model_path}...")
+    scores = score_positions(model, data, batch_size)
+    rows = select_uncertain(scores[criterion], fraction)
+    print_score_summary(scores, criterion, rows)
+
+    os.makedirs(output, exist_ok=True)
+    np.savez(os.path.join(output, "uncertainty.npz"), rows=rows, **scores)
+    reanalyze(data_path, output, time_per_move, max_depth, workers, rows=rows, where=where, multi_pv=multi_pv,
+              budget=budget, policy_temperature=policy_temperature)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deep-search the positions the network is least sure about")
+    parser.add_argument("--data", type=str, default="training_data",
+                        help="Dataset directory, .npz file or game store (.sqlite / .db)")
+    parser.add_argument("--model", type=str, required=True, help="Path to .pt checkpoint")
+    parser.add_argument("--output", type=str, default=None, help="Output dataset directory (default: <data>_relabelled)")
+    parser.add_argument("--criterion", type=str, default="disagreement", choices=CRITERIA, help="Uncertainty ranking")
+    parser.add_argument("--fraction", type=float, default=0.1, help="Share of positions to relabel")
+    parser.add_argument("--time_per_move", type=int, default=3000, help="Search time per position in milliseconds")
+    parser.add_argument("--max_depth", type=int, default=22, help="Search depth limit")
+    parser.add_argument("--workers", type=int, default=1, help="Number of search processes to run in parallel")
+    parser.add_argument("--batch_size", type=int, default=4096, help="Positions per network batch")
+    parser.add_argument("--where", type=str, default="", help="SQL filter on the samples view (game store only)")
+    parser.add_argument("--multi_pv", type=int, default=1, choices=range(1, MAX_POLICY_K + 1), metavar="K",
+                        help=f"Score the top K root moves; K > 1 gives softmax policy targets (K <= {MAX_POLICY_K})")
+    parser.add_argument("--budget", type=str, default="time",
+                        help="Search budget: time, time:MS, depth:D, nodes:N or adaptive:N")
+    parser.add_argument("--policy_temperature", type=float, default=DEFAULT_POLICY_TEMPERATURE,
+                        help="Softmax temperature of multi-PV policy targets, in score units")
+    parser.add_argument("--model_type", type=str, default="simple", choices=["simple", "resnet"],
+                        help="Model architecture (same as train.py --model_type)")
+    parser.add_argument("--hidden_size", type=int, default=512, help="Hidden size (for simple model)")
+    parser.add_argument("--num_channels", type=int, default=128, help="Number of channels (for resnet model)")
+    parser.add_argument("--num_res_blocks", type=int, default=6, help="Number of residual blocks (for resnet model)")
+    args = parser.parse_args()
+
+    if args.model_type == "simple":
+        model_kwargs = {'hidden_size': args.hidden_size}
+    else:
+        model_kwargs = {'num_channels': args.num_channels, 'num_res_blocks': args.num_res_blocks}
+
+    output = args.output or f"{os.path.splitext(args.data.rstrip('/'))[0]}_relabelled"
+    if os.path.abspath(output) == os.path.abspath(args.data):
+        parser.error("--output must differ from --data")
+    relabel(args.data, args.model, output, args.criterion, args.fraction, args.time_per_move, args.max_depth,
+            args.workers, args.model_type, args.batch_size, args.where, multi_pv=args.multi_pv,
+            budget=args.budget, policy_temperature=args.policy_temperature, **model_kwargs)
+
+
+if __name__ == "__main__":
+    main()
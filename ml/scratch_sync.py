@@ -0,0 +1,279 @@
+"""
+Local scratch staging with background sync to slow storage
+
+On Colab batch_dir / output / checkpoints live on Google Drive, where every
+write and every read on resume blocks on FUSE I/O. stage() gives the
+pipeline a twin of such a path on fast local disk (scratch_dir), and a
+ScratchMirror copies what lands there to the durable location from a
+background thread:
+
+  - pull() first brings the durable copy into scratch (resume), once
+  - a pass every `interval` seconds (or on request()) copies every file
+    whose size or mtime changed; files deleted locally are deleted
+    remotely if this mirror copied them
+  - every copy goes to a temporary name, is checksummed (sha256) against
+    the bytes read from scratch, then renamed into place; checksums are
+    kept in <remote>/.sync_<name>.json and verified again by pull()
+
+The hot path only writes to scratch; close() at the end waits for the last
+pass. `first` / `last` order a pass so that a durable copy is consistent at
+any time: the completed-games manifest goes before the journals it vouches
+for, a dataset manifest.json after the shards it lists.
+
+Example:
+    local_dir, mirror = stage("/content/drive/MyDrive/game_batches", "/content/scratch")
+    mirror.pull()
+    mirror.start()
+    ...                      # write into local_dir; mirror.request() after big artifacts
+    mirror.close()           # final pass
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+SYNC_TMP_SUFFIX = '.sync_tmp'
+SKIP_SUFFIXES = ('.tmp', SYNC_TMP_SUFFIX)  # files still being written atomically
+COPY_ATTEMPTS = 3
+_CHUNK = 1 << 20
+
+
+def file_checksum(path: str) -> str:
+    """sha256 of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_verified(src: str, dst: str, expected: Optional[str] = None) -> str:
+    """
+    Copy src to dst through a temporary file whose checksum must match the
+    bytes read from src (and expected, if given) before it replaces dst;
+    src's mtime is kept
+
+    Returns:
+        sha256 of the copied file
+    """
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    tmp = dst + SYNC_TMP_SUFFIX
+    for attempt in range(COPY_ATTEMPTS):
+        digest = hashlib.sha256()
+        stat = os.stat(src)
+        with open(src, 'rb') as fin, open(tmp, 'wb') as fout:
+            for chunk in iter(lambda: fin.read(_CHUNK), b''):
+                digest.update(chunk)
+                fout.write(chunk)
+            fout.flush()
+            os.fsync(fout.fileno())
+        checksum = digest.hexdigest()
+        if file_checksum(tmp) == checksum and (expected is None or expected == checksum):
+            os.utime(tmp, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            os.replace(tmp, dst)
+            return checksum
+        print(f"  ⚠ Checksum mismatch copying {src} (attempt {attempt + 1}/{COPY_ATTEMPTS})")
+    os.remove(tmp)
+    raise IOError(f"Could not copy {src} to {dst} with a matching checksum")
+
+
+class ScratchMirror:
+    """
+    Background copy of the top-level entry `name` of local_root to remote_root
+
+    siblings names further top-level entries the caller writes next to it
+    (training_data.material.npz, training_data_dedup, ..._quarantine). Only
+    these exact entries are touched, so several mirrors (batch dir, output,
+    checkpoints) can share one scratch_dir and one remote parent directory
+    as long as their entries don't overlap.
+    """
+
+    def __init__(self, local_root: str, remote_root: str, name: str, interval: float = 30.0,
+                 first: Sequence[str] = (), last: Sequence[str] = (), siblings: Sequence[str] = ()):
+        self.local_root = local_root
+        self.remote_root = remote_root
+        self.name = name
+        self.entries = {name, *siblings}
+        self.interval = interval
+        self.first = set(first)
+        self.last = set(last)
+        self.manifest_path = os.path.join(remote_root, f".sync_{name}.json")
+        self.checksums: Dict[str, str] = self._read_manifest()  # relative path -> sha256 of the remote copy
+        self.synced: Dict[str, Tuple[int, int]] = {}            # relative path -> (size, mtime_ns) last copied
+        self.requested = threading.Event()
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.bytes_copied = 0
+
+    def _read_manifest(self) -> Dict[str, str]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, 'r') as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.checksums, f, indent=0, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def _files(self, root: str) -> Iterator[str]:
+        """Relative paths of the mirrored files under root"""
+        if not os.path.isdir(root):
+            return
+        for entry in sorted(os.listdir(root)):
+            if not self._mirrored(entry) or entry.endswith(SKIP_SUFFIXES):
+                continue
+            path = os.path.join(root, entry)
+            if os.path.isfile(path):
+                yield entry
+                continue
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames[:] = sorted(d for d in dirnames if not d.endswith(SKIP_SUFFIXES))
+                for filename in sorted(filenames):
+                    if not filename.endswith(SKIP_SUFFIXES):
+                        yield os.path.relpath(os.path.join(dirpath, filename), root)
+
+    def _mirrored(self, entry: str) -> bool:
+        return entry in self.entries
+
+    def _order(self, rel: str) -> int:
+        base = os.path.basename(rel)
+        return 0 if base in self.first else 2 if base in self.last else 1
+
+    def pull(self) -> int:
+        """
+        Bring the durable copy into scratch (files missing or different
+        locally); remote files whose checksum doesn't match the sync
+        manifest are reported and skipped
+
+        Returns:
+            number of files copied
+        """
+        start = time.time()
+        copied = 0
+        for rel in sorted(self._files(self.remote_root), key=self._order):
+            src, dst = os.path.join(self.remote_root, rel), os.path.join(self.local_root, rel)
+            expected = self.checksums.get(rel)
+            if os.path.exists(dst) and os.path.getsize(dst) == os.path.getsize(src) and (
+                    expected is None or file_checksum(dst) == expected):
+                pass
+            else:
+                try:
+                    self.checksums[rel] = copy_verified(src, dst, expected)
+                except IOError as e:
+                    print(f"  ✗ {e} (durable copy damaged?)")
+                    continue
+                copied += 1
+                self.bytes_copied += os.path.getsize(dst)
+            stat = os.stat(dst)
+            self.synced[rel] = (stat.st_size, stat.st_mtime_ns)
+        if copied:
+            print(f"Staged {copied} file(s) of {self.name} from {self.remote_root} into {self.local_root} "
+                  f"({time.time() - start:.1f}s)")
+        return copied
+
+    def sync_once(self) -> int:
+        """One pass: copy changed files to the durable location, drop deleted ones"""
+        copied = 0
+        present = set()
+        for rel in sorted(self._files(self.local_root), key=self._order):
+            present.add(rel)
+            src = os.path.join(self.local_root, rel)
+            try:
+                stat = os.stat(src)
+            except FileNotFoundError:
+                continue  # replaced or removed since the listing
+            if self.synced.get(rel) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            try:
+                self.checksums[rel] = copy_verified(src, os.path.join(self.remote_root, rel))
+            except FileNotFoundError:
+                continue
+            self.synced[rel] = (stat.st_size, stat.st_mtime_ns)
+            self.bytes_copied += stat.st_size
+            copied += 1
+
+        for rel in [rel for rel in self.synced if rel not in present]:
+            if os.path.exists(os.path.join(self.local_root, rel)):
+                continue  # being replaced (e.g. a shard rewritten) while listing; next pass copies it
+            try:
+                os.remove(os.path.join(self.remote_root, rel))
+            except FileNotFoundError:
+                pass
+            del self.synced[rel]
+            self.checksums.pop(rel, None)
+
+        if copied or len(self.checksums) != len(self.synced):
+            self.checksums = {rel: self.checksums[rel] for rel in self.synced if rel in self.checksums}
+            os.makedirs(self.remote_root, exist_ok=True)
+            self._write_manifest()
+        return copied
+
+    def _loop(self):
+        while not self.stopped.is_set():
+            self.requested.wait(self.interval)
+            self.requested.clear()
+            try:
+                self.sync_once()
+            except Exception as e:  # keep the run going; the next pass retries
+                print(f"  ⚠ Sync of {self.name} to {self.remote_root} failed: {e}")
+
+    def start(self):
+        """Start syncing in the background"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, daemon=True)
+            self.thread.start()
+
+    def request(self):
+        """Ask for a pass now (returns immediately)"""
+        self.requested.set()
+
+    def close(self):
+        """Stop the background thread and run a final pass (blocks until durable)"""
+        self.stopped.set()
+        self.requested.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        start = time.time()
+        copied = self.sync_once()
+        print(f"Synced {self.name} → {self.remote_root} ({copied} file(s) in the final pass, "
+              f"{self.bytes_copied / 1024 / 1024:.1f} MB in total, {time.time() - start:.1f}s)")
+
+
+def stage(path: str, scratch_dir: str, interval: float = 30.0, first: Sequence[str] = (),
+          last: Sequence[str] = (), siblings: Sequence[str] = ()) -> Tuple[str, ScratchMirror]:
+    """
+    Scratch twin of a durable path (directory or file) and the mirror that
+    syncs it back
+
+    Args:
+        siblings: Other paths next to path that come along (e.g. its dedup copy);
+                  paths inside a directory path are mirrored with it anyway
+
+    Returns:
+        (local path to use instead of path, mirror)
+    """
+    path = os.path.normpath(path)
+    name = os.path.basename(path)
+    parent = os.path.dirname(path)
+    entries = []
+    for sibling in map(os.path.normpath, siblings):
+        if os.path.dirname(sibling) == parent:
+            entries.append(os.path.basename(sibling))
+        elif not sibling.startswith(path + os.sep):
+            raise ValueError(f"{sibling} is not next to {path}")
+    os.makedirs(scratch_dir, exist_ok=True)
+    mirror = ScratchMirror(scratch_dir, parent or '.', name, interval, first, last, entries)
+    return os.path.join(scratch_dir, name), mirror
+
+
+def pull_to_scratch(path: str, scratch_dir: str, siblings: Sequence[str] = ()) -> str:
+    """Read-only staging: copy path (e.g. a dataset) into scratch_dir once; returns the local path"""
+    local_path, mirror = stage(path, scratch_dir, siblings=siblings)
+    mirror.pull()
+    return local_path
@@ -7,61 +7,134 @@ Train a neural network on self-play data for Makhos evaluation and move predicti
 import argparse
 import os
 import time
-from typing import Tuple
+from typing import Dict, Optional, Tuple
 
 import numpy as np
 import torch
-import torch.nn as nn
 import torch.optim as optim
 from torch.utils.data import Dataset, DataLoader, random_split
 
 from model import create_model
+from dataset_store import is_sharded, open_dataset, read_manifest
+from material_index import MaterialSampler, index_path, load_material_index, print_index_summary
+from scratch_sync import pull_to_scratch, stage
+from makhos import initial_position, batch_legal_masks
+from makhos.encoding import encode_states, encode_planes, compact_from_planes, sparse_from_dense
 
 class MakhosDataset(Dataset):
-    """PyTorch dataset for Makhos training data"""
+    """
+    PyTorch dataset over the compact training format
+
+    Rows stay as bitboards + sparse policy pairs (see
+    makhos.encoding.COMPACT_FIELDS); items are just row indices and
+    collate() expands a whole batch at once into input planes and legal
+    move masks. Policy targets stay sparse all the way into the loss.
 
-    def __init__(self, states: np.ndarray, policy_targets: np.ndarray, legal_masks: np.ndarray, values: np.ndarray):
+    Deduplicated datasets (dedup.py) carry a per-row weights field, the
+    number of merged occurrences; other datasets weigh every row 1.
+    """
+
+    def __init__(self, data: Dict[str, np.ndarray]):
         """
         Args:
-            states: (N, 6, 32) board states
-            policy_targets: (N, 32, 32) policy distributions from search
-            legal_masks: (N, 32, 32) legal move masks
-            values: (N,) game outcomes
+            data: compact dataset arrays (boards, sides, halfmoves, policy_indices, policy_probs, values
+                  and optionally weights)
         """
-        self.states = torch.from_numpy(states).float()
-        self.policy_targets = torch.from_numpy(policy_targets).float()
-        self.legal_masks = torch.from_numpy(legal_masks).float()
-        self.values = torch.from_numpy(values).float().unsqueeze(1)
+        self.boards = data['boards']
+        self.sides = data['sides']
+        self.halfmoves = data['halfmoves']
+        self.policy_indices = data['policy_indices']
+        self.policy_probs = data['policy_probs']
+        self.values = data['values']
+        self.weights = data.get('weights')
 
     def __len__(self):
-        return len(self.states)
+        return len(self.boards)
 
     def __getitem__(self, idx):
-        return self.states[idx], self.policy_targets[idx], self.legal_masks[idx], self.values[idx]
+        return idx
+
+    def collate(self, indices):
+        """Expand a batch of row indices into (states, policy_indices, policy_probs, legal_masks, values, weights) tensors"""
+        idx = np.sort(np.asarray(indices, dtype=np.int64))  # sorted rows read sequentially
+        boards = self.boards[idx]
+        sides = self.sides[idx]
+        legal_masks, _ = batch_legal_masks(boards, sides)
+        weights = self.weights[idx] if self.weights is not None else np.ones(len(idx))
+        return (
+            torch.from_numpy(encode_planes(boards, sides, self.halfmoves[idx])),
+            torch.from_numpy(self.policy_indices[idx].astype(np.int64)),
+            torch.from_numpy(self.policy_probs[idx].astype(np.float32)),
+            torch.from_numpy(legal_masks.astype(np.float32)),
+            torch.from_numpy(self.values[idx].astype(np.float32)).unsqueeze(1),
+            torch.from_numpy(np.asarray(weights, dtype=np.float32)),
+        )
+
+def load_data(data_path: str) -> Dict[str, np.ndarray]:
+    """
+    Load training data from a sharded dataset directory or an npz file
 
-def load_data(data_path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
-    """Load training data from npz file"""
+    Sharded stores are memory-mapped (nothing is read until a batch touches
+    it); npz archives have to be decompressed into RAM.
+
+    Legacy files are converted to the compact format on load: dense
+    (states / policy_targets / legal_masks planes) and single best-move
+    (best_moves) datasets.
+    """
     print(f"Loading data from {data_path}...")
-    data = np.load(data_path)
-    states = data['states']
-    policy_targets = data['policy_targets']
-    legal_masks = data['legal_masks']
-    values = data['values']
-    print(f"  Loaded {len(states)} training examples")
+    if is_sharded(data_path):
+        data = open_dataset(data_path, mmap_mode='r')
+        print(f"  Memory-mapped {len(read_manifest(data_path)['shards'])} shard(s)")
+    else:
+        data = _load_npz(data_path)
+
+    print(f"  Loaded {len(data['boards'])} training examples")
+    sample = slice(0, 10000)
+    legal_masks, _ = batch_legal_masks(data['boards'][sample], data['sides'][sample])
     print(f"  Avg legal moves per position: {legal_masks.sum(axis=(1,2)).mean():.1f}")
-    return states, policy_targets, legal_masks, values
+    return data
+
+def _load_npz(data_path: str) -> Dict[str, np.ndarray]:
+    with np.load(data_path) as npz:
+        if 'boards' in npz:
+            data = {name: npz[name] for name in npz.files}
+            if 'best_moves' in data:
+                best_moves = data.pop('best_moves').astype(np.int16)
+                data['policy_indices'] = best_moves[:, None]
+                data['policy_probs'] = np.ones((len(best_moves), 1), dtype=np.float16)
+        else:
+            print("  Converting legacy dense dataset to compact format...")
+            boards, sides, halfmoves = compact_from_planes(npz['states'])
+            policy_indices, policy_probs = sparse_from_dense(npz['policy_targets'], k=1)
+            data = {'boards': boards, 'sides': sides, 'halfmoves': halfmoves,
+                    'policy_indices': policy_indices, 'policy_probs': policy_probs, 'values': npz['values']}
+            for name in ('search_scores', 'evaluations'):
+                if name in npz:
+                    data[name] = npz[name]
+    return data
 
 def create_dataloaders(
-    states: np.ndarray,
-    policy_targets: np.ndarray,
-    legal_masks: np.ndarray,
-    values: np.ndarray,
+    data: Dict[str, np.ndarray],
     batch_size: int = 32,
-    val_split: float = 0.1
+    val_split: float = 0.1,
+    sampling: str = "uniform",
+    data_path: Optional[str] = None,
+    endgame_weight: float = 4.0,
+    seed: int = 42
 ) -> Tuple[DataLoader, DataLoader]:
-    """Create train and validation dataloaders"""
+    """
+    Create train and validation dataloaders
 
-    dataset = MakhosDataset(states, policy_targets, legal_masks, values)
+    Args:
+        sampling: "uniform" shuffles the training rows; "balanced" draws
+                  opening / middlegame / endgame positions equally often and
+                  "endgame" makes endgame rows endgame_weight times as likely
+                  (both use the dataset's material index, see material_index.py)
+        data_path: dataset path, to find its material index
+        seed: seeds the train/val split and the order training rows are drawn in
+    """
+
+    dataset = MakhosDataset(data)
 
     # Split into train/val
     val_size = int(len(dataset) * val_split)
@@ -70,25 +143,42 @@ def create_dataloaders(
     train_dataset, val_dataset = random_split(
         dataset,
         [train_size, val_size],
-        generator=torch.Generator().manual_seed(42)
+        generator=torch.Generator().manual_seed(seed)
     )
 
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=0)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=0)
+    if sampling == "uniform":
+        train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=0,
+                                  collate_fn=dataset.collate, generator=torch.Generator().manual_seed(seed))
+    else:
+        index = load_material_index(data_path, data['boards'])
+        print_index_summary(index)
+        sampler = MaterialSampler(index.restrict(np.asarray(train_dataset.indices)), sampling,
+                                  num_samples=train_size, endgame_weight=endgame_weight, seed=seed)
+        # sampler yields global row ids, which are the items of the full dataset
+        train_loader = DataLoader(dataset, batch_size=batch_size, sampler=sampler, num_workers=0,
+                                  collate_fn=dataset.collate)
+        print(f"  Sampling: {sampling}")
+    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=0, collate_fn=dataset.collate)
 
     print(f"  Train examples: {len(train_dataset)}")
     print(f"  Val examples: {len(val_dataset)}")
 
     return train_loader, val_loader
 
-def policy_loss_fn(policy_logits: torch.Tensor, policy_targets: torch.Tensor, legal_masks: torch.Tensor) -> torch.Tensor:
+def policy_loss_fn(policy_logits: torch.Tensor, policy_indices: torch.Tensor, policy_probs: torch.Tensor,
+                   legal_masks: torch.Tensor, weights: Optional[torch.Tensor] = None) -> torch.Tensor:
     """
     Compute policy loss (cross-entropy with legal move masking)
 
+    Targets are sparse: log-probs are gathered at the target move indices
+    only, instead of multiplying through a dense 1024-wide distribution.
+
     Args:
         policy_logits: (batch, 32, 32) raw logits
-        policy_targets: (batch, 32, 32) target policy distribution
+        policy_indices: (batch, K) target move indices (from * 32 + to), -1 = padding
+        policy_probs: (batch, K) target probabilities, 0 for padding
         legal_masks: (batch, 32, 32) legal move mask
+        weights: (batch,) per-row sample weights (default: all 1)
 
     Returns:
         scalar loss
@@ -101,26 +191,34 @@ def policy_loss_fn(policy_logits: torch.Tensor, policy_targets: torch.Tensor, le
 
     # Flatten for softmax
     logits_flat = masked_logits.view(batch_size, -1)
-    targets_flat = policy_targets.view(batch_size, -1)
 
-    # Log softmax + negative log likelihood
+    # Log softmax + negative log likelihood at the target indices
     log_probs = torch.log_softmax(logits_flat, dim=1)
-    loss = -(targets_flat * log_probs).sum(dim=1).mean()
+    target_log_probs = log_probs.gather(1, policy_indices.clamp(min=0))
+    loss = weighted_mean(-(policy_probs * target_log_probs).sum(dim=1), weights)
 
     return loss
 
-def value_loss_fn(value_pred: torch.Tensor, value_target: torch.Tensor) -> torch.Tensor:
+def value_loss_fn(value_pred: torch.Tensor, value_target: torch.Tensor,
+                  weights: Optional[torch.Tensor] = None) -> torch.Tensor:
     """
     Compute value loss (MSE)
 
     Args:
         value_pred: (batch, 1) predicted values
         value_target: (batch, 1) target values
+        weights: (batch,) per-row sample weights (default: all 1)
 
     Returns:
         scalar loss
     """
-    return nn.functional.mse_loss(value_pred, value_target)
+    return weighted_mean(((value_pred - value_target) ** 2).squeeze(1), weights)
+
+def weighted_mean(losses: torch.Tensor, weights: Optional[torch.Tensor] = None) -> torch.Tensor:
+    """Mean of per-row losses, weighted by occurrence counts if given"""
+    if weights is None:
+        return losses.mean()
+    return (losses * weights).sum() / weights.sum()
 
 def train_epoch(model, train_loader, optimizer, device, policy_weight=1.0, value_weight=1.0):
     """Train for one epoch"""
@@ -131,18 +229,20 @@ def train_epoch(model, train_loader, optimizer, device, policy_weight=1.0, value
     total_value_loss = 0
     num_batches = 0
 
-    for states, policy_targets, legal_masks, values in train_loader:
+    for states, policy_indices, policy_probs, legal_masks, values, weights in train_loader:
         states = states.to(device)
-        policy_targets = policy_targets.to(device)
+        policy_indices = policy_indices.to(device)
+        policy_probs = policy_probs.to(device)
         legal_masks = legal_masks.to(device)
         values = values.to(device)
+        weights = weights.to(device)
 
         # Forward pass
         policy_logits, value_pred = model(states)
 
         # Compute losses
-        p_loss = policy_loss_fn(policy_logits, policy_targets, legal_masks)
-        v_loss = value_loss_fn(value_pred, values)
+        p_loss = policy_loss_fn(policy_logits, policy_indices, policy_probs, legal_masks, weights)
+        v_loss = value_loss_fn(value_pred, values, weights)
         loss = policy_weight * p_loss + value_weight * v_loss
 
         # Backward pass
@@ -172,18 +272,20 @@ def evaluate(model, val_loader, device, policy_weight=1.0, value_weight=1.0):
     num_batches = 0
 
     with torch.no_grad():
-        for states, policy_targets, legal_masks, values in val_loader:
+        for states, policy_indices, policy_probs, legal_masks, values, weights in val_loader:
             states = states.to(device)
-            policy_targets = policy_targets.to(device)
+            policy_indices = policy_indices.to(device)
+            policy_probs = policy_probs.to(device)
             legal_masks = legal_masks.to(device)
             values = values.to(device)
+            weights = weights.to(device)
 
             # Forward pass
             policy_logits, value_pred = model(states)
 
             # Compute losses
-            p_loss = policy_loss_fn(policy_logits, policy_targets, legal_masks)
-            v_loss = value_loss_fn(value_pred, values)
+            p_loss = policy_loss_fn(policy_logits, policy_indices, policy_probs, legal_masks, weights)
+            v_loss = value_loss_fn(value_pred, values, weights)
             loss = policy_weight * p_loss + value_weight * v_loss
 
             total_loss += loss.item()
@@ -199,29 +301,33 @@ def evaluate(model, val_loader, device, policy_weight=1.0, value_weight=1.0):
 
 def save_checkpoint(model, optimizer, epoch, train_metrics, val_metrics, filepath):
     """Save training checkpoint"""
+    # Through a temporary file: a crash (or a sync to Drive) never sees a half-written checkpoint
     torch.save({
         'epoch': epoch,
         'model_state_dict': model.state_dict(),
         'optimizer_state_dict': optimizer.state_dict(),
         'train_metrics': train_metrics,
         'val_metrics': val_metrics
-    }, filepath)
+    }, filepath + '.tmp')
+    os.replace(filepath + '.tmp', filepath)
     print(f"  Checkpoint saved to {filepath}")
 
 def save_model_for_inference(model, filepath):
     """Save model for inference (model only, no optimizer)"""
     torch.save({
         'model_state_dict': model.state_dict(),
-    }, filepath)
+    }, filepath + '.tmp')
+    os.replace(filepath + '.tmp', filepath)
     print(f"  Model saved to {filepath}")
 
     # Also save as TorchScript for deployment
     model.eval()
     device = next(model.parameters()).device
-    example_input = torch.randn(1, 6, 32).to(device)
+    example_input = torch.from_numpy(encode_states([initial_position()])).to(device)
     traced_model = torch.jit.trace(model, example_input)
     torchscript_path = filepath.replace('.pt', '_scripted.pt')
-    traced_model.save(torchscript_path)
+    traced_model.save(torchscript_path + '.tmp')
+    os.replace(torchscript_path + '.tmp', torchscript_path)
     print(f"  TorchScript model saved to {torchscript_path}")
 
 def main():
@@ -234,9 +340,13 @@ def main():
     parser = argparse.ArgumentParser(description="Train Makhos neural network")
 
     # Data
-    parser.add_argument("--data", type=str, default="training_data.npz", help="Training data file")
+    parser.add_argument("--data", type=str, default="training_data", help="Training data directory (sharded) or .npz file")
     parser.add_argument("--batch_size", type=int, default=32, help="Batch size")
     parser.add_argument("--val_split", type=float, default=0.1, help="Validation split ratio")
+    parser.add_argument("--sampling", type=str, default="uniform", choices=["uniform", "balanced", "endgame"],
+                        help="Training row sampling by game phase (uses the material index)")
+    parser.add_argument("--endgame_weight", type=float, default=4.0, help="Endgame oversampling factor for --sampling endgame")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the train/val split and the training row order")
 
     # Model
     parser.add_argument("--model_type", type=str, default="simple", choices=["simple", "resnet"], help="Model architecture")
@@ -253,6 +363,10 @@ def main():
     # Output
     parser.add_argument("--output_dir", type=str, default="checkpoints", help="Directory to save checkpoints")
     parser.add_argument("--save_every", type=int, default=10, help="Save checkpoint every N epochs")
+    parser.add_argument("--scratch_dir", type=str, default=None,
+                        help="Fast local directory: --data is copied in, checkpoints are synced back to --output_dir")
+    parser.add_argument("--sync_interval", type=float, default=30.0,
+                        help="Seconds between background checkpoint syncs (--scratch_dir)")
 
     args = parser.parse_args()
 
@@ -260,11 +374,20 @@ def main():
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"Using device: {device}")
 
-    os.makedirs(args.output_dir, exist_ok=True)
+    mirror = None
+    if args.scratch_dir:
+        args.data = pull_to_scratch(args.data, args.scratch_dir, siblings=(index_path(args.data),))
+        output_dir, mirror = stage(args.output_dir, args.scratch_dir, args.sync_interval)
+        mirror.pull()
+        mirror.start()
+    else:
+        output_dir = args.output_dir
+    os.makedirs(output_dir, exist_ok=True)
 
     # Load data
-    states, policy_targets, legal_masks, values = load_data(args.data)
-    train_loader, val_loader = create_dataloaders(states, policy_targets, legal_masks, values, args.batch_size, args.val_split)
+    data = load_data(args.data)
+    train_loader, val_loader = create_dataloaders(data, args.batch_size, args.val_split, args.sampling, args.data,
+                                                  args.endgame_weight, args.seed)
 
     # Create model
     if args.model_type == "simple":
@@ -279,42 +402,47 @@ def main():
     # Optimizer
     optimizer = optim.Adam(model.parameters(), lr=args.lr)
 
-    # Training loop
-    print(f"\nStarting training for {args.epochs} epochs...\n")
-    best_val_loss = float('inf')
+    try:
+        # Training loop
+        print(f"\nStarting training for {args.epochs} epochs...\n")
+        best_val_loss = float('inf')
 
-    for epoch in range(1, args.epochs + 1):
-        start_time = time.time()
+        for epoch in range(1, args.epochs + 1):
+            start_time = time.time()
 
-        # Train
-        train_metrics = train_epoch(model, train_loader, optimizer, device, args.policy_weight, args.value_weight)
+            # Train
+            train_metrics = train_epoch(model, train_loader, optimizer, device, args.policy_weight, args.value_weight)
 
-        # Validate
-        val_metrics = evaluate(model, val_loader, device, args.policy_weight, args.value_weight)
+            # Validate
+            val_metrics = evaluate(model, val_loader, device, args.policy_weight, args.value_weight)
 
-        epoch_time = time.time() - start_time
+            epoch_time = time.time() - start_time
 
-        # Print metrics
-        print(f"Epoch {epoch}/{args.epochs} ({epoch_time:.1f}s)")
-        print(f"  Train - Loss: {train_metrics['loss']:.4f}, Policy: {train_metrics['policy_loss']:.4f}, Value: {train_metrics['value_loss']:.4f}")
-        print(f"  Val   - Loss: {val_metrics['loss']:.4f}, Policy: {val_metrics['policy_loss']:.4f}, Value: {val_metrics['value_loss']:.4f}")
+            # Print metrics
+            print(f"Epoch {epoch}/{args.epochs} ({epoch_time:.1f}s)")
+            print(f"  Train - Loss: {train_metrics['loss']:.4f}, Policy: {train_metrics['policy_loss']:.4f}, Value: {train_metrics['value_loss']:.4f}")
+            print(f"  Val   - Loss: {val_metrics['loss']:.4f}, Policy: {val_metrics['policy_loss']:.4f}, Value: {val_metrics['value_loss']:.4f}")
 
-        # Save checkpoints
-        if epoch % args.save_every == 0:
-            checkpoint_path = os.path.join(args.output_dir, f"checkpoint_epoch_{epoch}.pt")
-            save_checkpoint(model, optimizer, epoch, train_metrics, val_metrics, checkpoint_path)
+            # Save checkpoints
+            if epoch % args.save_every == 0:
+                checkpoint_path = os.path.join(output_dir, f"checkpoint_epoch_{epoch}.pt")
+                save_checkpoint(model, optimizer, epoch, train_metrics, val_metrics, checkpoint_path)
 
-        # Save best model
-        if val_metrics['loss'] < best_val_loss:
-            best_val_loss = val_metrics['loss']
-            best_model_path = os.path.join(args.output_dir, "best_model.pt")
-            save_checkpoint(model, optimizer, epoch, train_metrics, val_metrics, best_model_path)
-            print(f"  *** New best model (val_loss: {best_val_loss:.4f}) ***")
+            # Save best model
+            if val_metrics['loss'] < best_val_loss:
+                best_val_loss = val_metrics['loss']
+                best_model_path = os.path.join(output_dir, "best_model.pt")
+                save_checkpoint(model, optimizer, epoch, train_metrics, val_metrics, best_model_path)
+                print(f"  *** New best model (val_loss: {best_val_loss:.4f}) ***")
 
-    # Save final model
-    print("\nTraining complete!")
-    final_model_path = os.path.join(args.output_dir, "final_model.pt")
-    save_model_for_inference(model, final_model_path)
+        # Save final model
+        print("\nTraining complete!")
+        final_model_path = os.path.join(output_dir, "final_model.pt")
+        save_model_for_inference(model, final_model_path)
+    finally:
+        # Also on errors / KeyboardInterrupt: the checkpoints so far become durable
+        if mirror:
+            mirror.close()
 
     print(f"\nBest validation loss: {best_val_loss:.4f}")
     print(f"Models saved in: {args.output_dir}/")
@@ -323,7 +451,7 @@ def main():
     print(f"  - final_model_scripted.pt (TorchScript for deployment)")
 
 def train_model(
-    data_path="training_data.npz",
+    data_path="training_data",
     model_type="simple",
     hidden_size=512,
     num_channels=128,
@@ -334,23 +462,39 @@ def train_model(
     policy_weight=1.0,
     value_weight=1.0,
     output_dir="checkpoints",
-    save_every=10
+    save_every=10,
+    sampling="uniform",
+    endgame_weight=4.0,
+    seed=42,
+    scratch_dir=None,
+    sync_interval=30.0
 ):
     """
     Helper function for Jupyter/Colab - call directly without argparse
 
     Example:
-        train_model(data_path="training_data.npz", epochs=30, batch_size=64)
+        train_model(data_path="training_data", epochs=30, batch_size=64)
+        train_model(data_path="training_data", sampling="balanced")   # equal opening / middlegame / endgame
+        # Colab: read the dataset from and write checkpoints to local disk, synced back to Drive
+        train_model(data_path="/content/drive/MyDrive/training_data",
+                    output_dir="/content/drive/MyDrive/checkpoints", scratch_dir="/content/scratch")
     """
     # Setup
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"Using device: {device}")
 
+    mirror = None
+    durable_dir = output_dir
+    if scratch_dir:
+        data_path = pull_to_scratch(data_path, scratch_dir, siblings=(index_path(data_path),))
+        output_dir, mirror = stage(output_dir, scratch_dir, sync_interval)
+        mirror.pull()
+        mirror.start()
     os.makedirs(output_dir, exist_ok=True)
 
     # Load data
-    states, policy_targets, legal_masks, values = load_data(data_path)
-    train_loader, val_loader = create_dataloaders(states, policy_targets, legal_masks, values, batch_size, val_split=0.1)
+    data = load_data(data_path)
+    train_loader, val_loader = create_dataloaders(data, batch_size, 0.1, sampling, data_path, endgame_weight, seed)
 
     # Create model
     if model_type == "simple":
@@ -365,45 +509,50 @@ def train_model(
     # Optimizer
     optimizer = optim.Adam(model.parameters(), lr=lr)
 
-    # Training loop
-    print(f"\nStarting training for {epochs} epochs...\n")
-    best_val_loss = float('inf')
+    try:
+        # Training loop
+        print(f"\nStarting training for {epochs} epochs...\n")
+        best_val_loss = float('inf')
 
-    for epoch in range(1, epochs + 1):
-        start_time = time.time()
+        for epoch in range(1, epochs + 1):
+            start_time = time.time()
 
-        # Train
-        train_metrics = train_epoch(model, train_loader, optimizer, device, policy_weight, value_weight)
+            # Train
+            train_metrics = train_epoch(model, train_loader, optimizer, device, policy_weight, value_weight)
 
-        # Validate
-        val_metrics = evaluate(model, val_loader, device, policy_weight, value_weight)
+            # Validate
+            val_metrics = evaluate(model, val_loader, device, policy_weight, value_weight)
 
-        epoch_time = time.time() - start_time
+            epoch_time = time.time() - start_time
 
-        # Print metrics
-        print(f"Epoch {epoch}/{epochs} ({epoch_time:.1f}s)")
-        print(f"  Train - Loss: {train_metrics['loss']:.4f}, Policy: {train_metrics['policy_loss']:.4f}, Value: {train_metrics['value_loss']:.4f}")
-        print(f"  Val   - Loss: {val_metrics['loss']:.4f}, Policy: {val_metrics['policy_loss']:.4f}, Value: {val_metrics['value_loss']:.4f}")
+            # Print metrics
+            print(f"Epoch {epoch}/{epochs} ({epoch_time:.1f}s)")
+            print(f"  Train - Loss: {train_metrics['loss']:.4f}, Policy: {train_metrics['policy_loss']:.4f}, Value: {train_metrics['value_loss']:.4f}")
+            print(f"  Val   - Loss: {val_metrics['loss']:.4f}, Policy: {val_metrics['policy_loss']:.4f}, Value: {val_metrics['value_loss']:.4f}")
 
-        # Save checkpoints
-        if epoch % save_every == 0:
-            checkpoint_path = os.path.join(output_dir, f"checkpoint_epoch_{epoch}.pt")
-            save_checkpoint(model, optimizer, epoch, train_metrics, val_metrics, checkpoint_path)
+            # Save checkpoints
+            if epoch % save_every == 0:
+                checkpoint_path = os.path.join(output_dir, f"checkpoint_epoch_{epoch}.pt")
+                save_checkpoint(model, optimizer, epoch, train_metrics, val_metrics, checkpoint_path)
 
-        # Save best model
-        if val_metrics['loss'] < best_val_loss:
-            best_val_loss = val_metrics['loss']
-            best_model_path = os.path.join(output_dir, "best_model.pt")
-            save_checkpoint(model, optimizer, epoch, train_metrics, val_metrics, best_model_path)
-            print(f"  *** New best model (val_loss: {best_val_loss:.4f}) ***")
+            # Save best model
+            if val_metrics['loss'] < best_val_loss:
+                best_val_loss = val_metrics['loss']
+                best_model_path = os.path.join(output_dir, "best_model.pt")
+                save_checkpoint(model, optimizer, epoch, train_metrics, val_metrics, best_model_path)
+                print(f"  *** New best model (val_loss: {best_val_loss:.4f}) ***")
 
-    # Save final model
-    print("\nTraining complete!")
-    final_model_path = os.path.join(output_dir, "final_model.pt")
-    save_model_for_inference(model, final_model_path)
+        # Save final model
+        print("\nTraining complete!")
+        final_model_path = os.path.join(output_dir, "final_model.pt")
+        save_model_for_inference(model, final_model_path)
+    finally:
+        # Also on errors / KeyboardInterrupt: the checkpoints so far become durable
+        if mirror:
+            mirror.close()
 
     print(f"\nBest validation loss: {best_val_loss:.4f}")
-    print(f"Models saved in: {output_dir}/")
+    print(f"Models saved in: {durable_dir}/")
     print(f"  - best_model.pt (best validation performance)")
     print(f"  - final_model.pt (last epoch)")
     print(f"  - final_model_scripted.pt (TorchScript for deployment)")
@@ -0,0 +1,226 @@
+"""
+Consistency checks over a compact dataset
+
+validate_dataset() runs every check as whole-array NumPy operations, chunk
+by chunk (legal masks are 1 KB per row), so a 250k-row dataset is checked
+in seconds:
+
+    bad_side:          sides not 1 / -1
+    bad_value:         values outside {-1, 0, 1} ([-1, 1] for deduplicated data)
+    overlap:           a square set in more than one of the four bitboards
+    man_on_last_rank:  a man on its promotion row (should have been crowned)
+    too_many_pieces:   more than 8 pieces for a side
+    no_legal_moves:    side to move has no legal move (positions are recorded before a move)
+    policy_padding:    index -1 with prob > 0, index out of range, or padding before a real entry
+    policy_sum:        target probabilities don't sum to 1
+    argmax_illegal:    most probable target move not in the legal mask
+    policy_illegal:    any target move with prob > 0 not in the legal mask
+    value_vs_mate:     search found a forced win / loss (|score| >= MATE_SCORE) but
+                       the game result for the side to move disagrees
+    not_finite:        NaN / inf search score or evaluation
+
+quarantine_rows() moves the failing rows out of a sharded store: they are
+written as one shard of <data>_quarantine (with their original row ids and
+a bitmask of failed checks) and the affected shards are rewritten without
+them.
+
+Usage:
+    python validate_dataset.py --data training_data
+    python validate_dataset.py --data training_data --quarantine
+"""
+
+import argparse
+import os
+from typing import Dict
+
+import numpy as np
+
+from dataset_store import is_sharded, open_dataset, read_manifest, write_shard
+from material_index import material_counts, write_material_index
+from makhos import batch_legal_masks
+from makhos.bitboards import LAST_RANK
+
+CHECKS = (
+    'bad_side', 'bad_value', 'overlap', 'man_on_last_rank', 'too_many_pieces', 'no_legal_moves',
+    'policy_padding', 'policy_sum', 'argmax_illegal', 'policy_illegal', 'value_vs_mate', 'not_finite',
+)
+MATE_SCORE = 900_000      # search scores are -999999 + ply for a lost position
+MAX_PIECES = 8
+POLICY_SUM_TOLERANCE = 1e-2  # float16 probabilities
+
+
+def check_chunk(chunk: Dict[str, np.ndarray], deduplicated: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Run every check on a chunk of rows
+
+    Returns:
+        dict of check name -> (n,) bool, True where the row fails it
+    """
+    boards = np.asarray(chunk['boards'], dtype=np.uint32)
+    sides = np.asarray(chunk['sides']).astype(np.int64)
+    values = np.asarray(chunk['values']).astype(np.float32)
+    indices = np.asarray(chunk['policy_indices']).astype(np.int64)
+    probs = np.asarray(chunk['policy_probs']).astype(np.float32)
+    n = len(boards)
+    rows = np.arange(n)
+    failed = {}
+
+    failed['bad_side'] = (sides != 1) & (sides != -1)
+    if deduplicated:
+        failed['bad_value'] = (values < -1) | (values > 1)
+    else:
+        failed['bad_value'] = (values != -1) & (values != 0) & (values != 1)
+
+    p1_men, p1_kings, p2_men, p2_kings = boards.T
+    failed['overlap'] = ((p1_men & p1_kings) | ((p1_men | p1_kings) & (p2_men | p2_kings)) | (p2_men & p2_kings)) != 0
+    failed['man_on_last_rank'] = ((p1_men & LAST_RANK[1]) | (p2_men & LAST_RANK[-1])) != 0
+    counts = material_counts(boards).astype(np.int64)
+    failed['too_many_pieces'] = (counts[:, :2].sum(axis=1) > MAX_PIECES) | (counts[:, 2:].sum(axis=1) > MAX_PIECES)
+
+    # Legal masks only make sense for rows with a valid side
+    legal_masks, _ = batch_legal_masks(boards, np.where(failed['bad_side'], 1, sides))
+    legal = legal_masks.reshape(n, -1)
+    failed['no_legal_moves'] = ~legal.any(axis=1)
+
+    padding = indices < 0
+    entry_after_padding = (~padding[:, 1:] & padding[:, :-1]).any(axis=1) if indices.shape[1] > 1 else np.zeros(n, bool)
+    failed['policy_padding'] = ((padding & (probs != 0)).any(axis=1) | (indices >= legal.shape[1]).any(axis=1)
+                                | entry_after_padding)
+    failed['policy_sum'] = np.abs(probs.sum(axis=1) - 1) > POLICY_SUM_TOLERANCE
+
+    safe = np.clip(indices, 0, legal.shape[1] - 1)
+    target_legal = legal[rows[:, None], safe] & ~padding
+    best = probs.argmax(axis=1)
+    failed['argmax_illegal'] = ~target_legal[rows, best]
+    failed['policy_illegal'] = ((probs > 0) & ~target_legal).any(axis=1)
+
+    # search_scores are stored from P1's view (score * side); values from the side to move's
+    scores = np.asarray(chunk['search_scores']).astype(np.float64)
+    own_scores = scores * sides
+    decided = np.abs(own_scores) >= MATE_SCORE
+    failed['value_vs_mate'] = decided & (np.sign(own_scores) != np.sign(values))
+    failed['not_finite'] = ~np.isfinite(scores) | ~np.isfinite(np.asarray(chunk['evaluations'], dtype=np.float64))
+    return failed
+
+
+def validate_dataset(data: Dict[str, np.ndarray], chunk_size: int = 65536) -> Dict[str, np.ndarray]:
+    """
+    Check every row of a compact dataset (see module docstring)
+
+    Returns:
+        dict of check name -> sorted int64 row ids that fail it
+    """
+    num_rows = len(data['boards'])
+    deduplicated = 'weights' in data
+    failed = {name: [] for name in CHECKS}
+    for start in range(0, num_rows, chunk_size):
+        end = min(start + chunk_size, num_rows)
+        chunk = {field: data[field][start:end] for field in data if field != 'weights'}
+        for name, rows in check_chunk(chunk, deduplicated).items():
+            failed[name].append(np.nonzero(rows)[0] + start)
+    return {name: np.concatenate(parts).astype(np.int64) if parts else np.zeros(0, np.int64)
+            for name, parts in failed.items()}
+
+
+def bad_rows(violations: Dict[str, np.ndarray]) -> np.ndarray:
+    """Sorted row ids failing at least one check"""
+    return np.unique(np.concatenate([np.zeros(0, np.int64)] + list(violations.values())))
+
+
+def print_validation_report(violations: Dict[str, np.ndarray], num_rows: int, max_ids: int = 10):
+    rows = bad_rows(violations)
+    print(f"\n{'='*60}")
+    print(f"DATASET VALIDATION")
+    print(f"{'='*60}")
+    for name in CHECKS:
+        ids = violations[name]
+        if len(ids):
+            shown = ', '.join(str(i) for i in ids[:max_ids]) + (', ...' if len(ids) > max_ids else '')
+            print(f"  ✗ {name:<17} {len(ids):>8,}  rows {shown}")
+        else:
+            print(f"  ✓ {name:<17} {0:>8}")
+    print(f"\n  Rows failing any check: {len(rows):,} / {num_rows:,} ({len(rows) / max(num_rows, 1) * 100:.2f}%)")
+    print(f"{'='*60}")
+
+
+def quarantine_path(data_path: str) -> str:
+    return data_path.rstrip('/') + "_quarantine"
+
+
+def quarantine_rows(data_path: str, violations: Dict[str, np.ndarray]) -> int:
+    """
+    Move failing rows of a sharded store into a new shard of <data>_quarantine
+    and rewrite the affected shards without them (material index rebuilt)
+
+    Returns:
+        number of rows moved
+    """
+    if not is_sharded(data_path):
+        raise ValueError(f"Quarantine needs a sharded dataset directory, not {data_path}")
+    rows = bad_rows(violations)
+    if len(rows) == 0:
+        return 0
+
+    checks = np.zeros(len(rows), dtype=np.uint16)
+    for bit, name in enumerate(CHECKS):
+        checks[np.isin(rows, violations[name])] |= 1 << bit
+
+    shards = read_manifest(data_path)['shards']
+    offsets = np.cumsum([0] + [entry['rows'] for entry in shards])
+    data = open_dataset(data_path)
+    quarantined = {field: np.asarray(column[rows]) for field, column in data.items()}
+    quarantined['source_rows'] = rows
+    quarantined['failed_checks'] = checks
+
+    target = quarantine_path(data_path)
+    name = f"quarantine_{len(read_manifest(target)['shards']):04d}"
+    write_shard(target, name, quarantined)
+
+    for shard_idx, entry in enumerate(shards):
+        start, end = offsets[shard_idx], offsets[shard_idx + 1]
+        local = rows[(rows >= start) & (rows < end)] - start
+        if len(local) == 0:
+            continue
+        keep = np.ones(end - start, dtype=bool)
+        keep[local] = False
+        shard_dir = os.path.join(data_path, entry['name'])
+        # Loaded into memory: write_shard replaces these files
+        write_shard(data_path, entry['name'],
+                    {field: np.load(os.path.join(shard_dir, f"{field}.npy"))[keep] for field in data})
+        print(f"  - {entry['name']}: {len(local):,} rows quarantined")
+
+    write_material_index(data_path, open_dataset(data_path, fields=['boards'])['boards'])
+    print(f"  Quarantined {len(rows):,} rows → {target}/{name}")
+    return len(rows)
+
+
+def validate_path(data_path: str, quarantine: bool = False, max_ids: int = 10) -> Dict[str, np.ndarray]:
+    """Validate a sharded store or .npz dataset, print the report and optionally quarantine"""
+    if is_sharded(data_path):
+        data = open_dataset(data_path)
+    else:
+        with np.load(data_path) as npz:
+            data = {name: npz[name] for name in npz.files}
+    violations = validate_dataset(data)
+    print_validation_report(violations, len(data['boards']), max_ids)
+    if quarantine and len(bad_rows(violations)):
+        if is_sharded(data_path):
+            quarantine_rows(data_path, violations)
+        else:
+            print(f"  ⚠ Quarantine needs a sharded dataset; {data_path} left unchanged")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a dataset for inconsistent rows")
+    parser.add_argument("--data", type=str, default="training_data", help="Dataset directory or .npz file")
+    parser.add_argument("--quarantine", action="store_true",
+                        help="Move failing rows into <data>_quarantine and drop them from the dataset")
+    parser.add_argument("--max_ids", type=int, default=10, help="Row ids to print per check")
+    args = parser.parse_args()
+
+    validate_path(args.data, args.quarantine, args.max_ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+File-lease work queue on a shared directory
+
+Several independent gen_data.py processes, on one machine or on several
+machines mounting the same directory (Drive, NFS), pull batches from one
+batch_dir. A unit of work is claimed by creating its lease file
+`<queue_dir>/<name>.lease` with O_CREAT | O_EXCL, which only one process
+can win. The owner rewrites the lease (owner token + heartbeat counter)
+every ttl / 4 seconds from a background thread.
+
+A lease is expired when an observer sees its contents unchanged for ttl
+seconds of its own clock, so hosts don't need synchronized clocks. The
+observer reclaims it by renaming it to a private name (only one rename can
+succeed), checking it is still the expired lease and claiming it again;
+the crashed owner's half-played batch is continued from its journal. An
+owner that notices its lease is gone (its next heartbeat finds another
+token) stops working on it.
+
+Example:
+    with WorkQueue("game_batches/queue", ttl=120) as queue:
+        if queue.claim("games_batch_0003"):
+            ...   # queue.confirm("games_batch_0003") before every write
+            queue.release("games_batch_0003")
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+LEASE_SUFFIX = '.lease'
+DEFAULT_LEASE_TTL = 120.0
+
+
+class WorkQueue:
+    """Leases of named work units in queue_dir, held by this process"""
+
+    def __init__(self, queue_dir: str, ttl: float = DEFAULT_LEASE_TTL, owner: Optional[str] = None):
+        self.queue_dir = queue_dir
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held: Dict[str, int] = {}          # name -> heartbeat counter
+        self.seen: Dict[str, Tuple[str, float]] = {}  # name -> (lease contents, first seen unchanged)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        os.makedirs(queue_dir, exist_ok=True)
+        self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self.heartbeat_thread.start()
+
+    def lease_path(self, name: str) -> str:
+        return os.path.join(self.queue_dir, name + LEASE_SUFFIX)
+
+    def _lease_data(self, beat: int) -> bytes:
+        return json.dumps({'owner': self.owner, 'beat': beat, 'time': time.time()}).encode()
+
+    def claim(self, name: str) -> bool:
+        """
+        Try to take the lease on name; reclaims it if its owner stopped
+        heartbeating for ttl seconds
+
+        Returns:
+            True if this process now holds the lease
+        """
+        with self.lock:
+            if name in self.held:
+                return True
+        path = self.lease_path(name)
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            if not self._expired(name) or not self._reclaim(name):
+                return False
+            return self.claim(name)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self._lease_data(0))
+            f.flush()
+            os.fsync(f.fileno())
+        with self.lock:
+            self.held[name] = 0
+            self.seen.pop(name, None)
+        return True
+
+    def _expired(self, name: str) -> bool:
+        """Whether the lease on name has looked the same for ttl seconds"""
+        try:
+            with open(self.lease_path(name), 'r') as f:
+                contents = f.read()
+        except FileNotFoundError:
+            return False
+        now = time.monotonic()
+        previous = self.seen.get(name)
+        if previous is None or previous[0] != contents:
+            self.seen[name] = (contents, now)
+            return False
+        return now - previous[1] >= self.ttl
+
+    def _reclaim(self, name: str) -> bool:
+        """
+        Remove the expired lease on name so it can be claimed again
+
+        Another observer may have reclaimed it already and created a fresh
+        lease at the same path, so the file is first renamed to a name
+        private to this process and only deleted if it still holds the
+        expired contents; a fresh lease is put back with a hard link, which
+        never replaces a lease created at path in the meantime. Without hard
+        links (some FUSE mounts) the fresh lease is dropped instead: its
+        owner loses it on its next heartbeat, like any reclaimed lease.
+
+        Returns:
+            True if the expired lease was removed by this process
+        """
+        path = self.lease_path(name)
+        private = f"{path}.{self.owner.replace(':', '_')}.stale"
+        try:
+            os.rename(path, private)
+        except FileNotFoundError:
+            return False  # another process reclaimed (or the owner released) it first
+        with open(private, 'r') as f:
+            contents = f.read()
+        if contents != self.seen[name][0]:
+            try:
+                os.link(private, path)
+            except OSError:
+                pass  # a newer lease exists, or no hard links: treat this one as lost
+            os.remove(private)
+            self.seen.pop(name, None)
+            return False
+        os.remove(private)
+        print(f"  ↻ Reclaiming expired lease {name} (owner {self._last_owner(name)})")
+        return True
+
+    def _last_owner(self, name: str) -> str:
+        try:
+            return json.loads(self.seen.get(name, ('{}', 0))[0]).get('owner', '?')
+        except ValueError:
+            return '?'
+
+    def holds(self, name: str) -> bool:
+        """Whether this process still holds the lease on name (as of the last heartbeat)"""
+        with self.lock:
+            return name in self.held
+
+    def confirm(self, name: str) -> bool:
+        """
+        Whether this process still holds the lease on name, read from the
+        lease file itself: a stalled owner's lease can be reclaimed up to
+        ttl / 4 before its next heartbeat notices. Call it right before
+        writing anything the lease protects; a lost lease is dropped.
+        """
+        with self.lock:
+            if name not in self.held:
+                return False
+            if self._owns(name):
+                return True
+            print(f"  ✗ Lost lease {name} (expired and reclaimed by another worker)")
+            del self.held[name]
+            return False
+
+    def release(self, name: str):
+        """Give up the lease (after the work is done or abandoned)"""
+        with self.lock:
+            if self.held.pop(name, None) is None:
+                return
+            if self._owns(name):
+                os.remove(self.lease_path(name))
+
+    def _owns(self, name: str) -> bool:
+        try:
+            with open(self.lease_path(name), 'r') as f:
+                return json.loads(f.read() or '{}').get('owner') == self.owner
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def heartbeat(self):
+        """Refresh every held lease; leases taken over by another process are dropped"""
+        with self.lock:
+            for name in list(self.held):
+                path = self.lease_path(name)
+                try:
+                    # r+ never recreates a lease that was reclaimed (renamed away)
+                    with open(path, 'r+b') as f:
+                        if json.loads(f.read() or b'{}').get('owner') != self.owner:
+                            raise FileNotFoundError(path)
+                        self.held[name] += 1
+                        f.seek(0)
+                        f.write(self._lease_data(self.held[name]))
+                        f.truncate()
+                        f.flush()
+                        os.fsync(f.fileno())
+                except (FileNotFoundError, ValueError):
+                    print(f"  ✗ Lost lease {name} (expired and reclaimed by another worker)")
+                    del self.held[name]
+
+    def _heartbeat_loop(self):
+        while not self.stopped.wait(self.ttl / 4):
+            self.heartbeat()
+
+    def close(self):
+        """Stop heartbeating and release every held lease"""
+        self.stopped.set()
+        for name in list(self.held):
+            self.release(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
@@ -0,0 +1,66 @@
+/**
+ * Search a list of positions (no games) and write the results
+ *
+ * Used by ml/reanalyze.py to relabel stored positions at a bigger budget.
+ * The input has one position per line as a state array
+ * [p1Men, p1Kings, p2Men, p2Kings, side, halfmoveClock]; the output has one
+ * JSON result per input line, in the same order:
+ *   {"policy": [[from * 32 + to, 1.0]], "rootScores"?, "searchDepth", "searchScore", "searchNodes"}
+ * With multiPv > 1, rootScores holds (from * 32 + to, search score) of the
+ * top-K root moves, best first, as in generate_games.ts records.
+ * Positions without a legal move get "policy": [].
+ *
+ * The budget uses generate_games.ts's format (see parseBudget()); maxDepth
+ * caps the depth of every mode.
+ *
+ * Usage:
+ *   npx tsx scripts/analyze_positions.ts <inputFile> <outputFile> [timePerMove] [maxDepth] [multiPv] [budget]
+ */
+
+import * as fs from 'fs';
+import { Position, Side } from '../src/core/position';
+import { parseBudget, budgetToString, searchMove } from '../src/core/search/budget';
+import { TT } from '../src/core/search/tt';
+
+function positionFromArray(s: number[]): Position {
+  return {
+    p1Men: s[0] >>> 0,
+    p1Kings: s[1] >>> 0,
+    p2Men: s[2] >>> 0,
+    p2Kings: s[3] >>> 0,
+    side: s[4] as Side,
+    halfmoveClock: s[5]
+  };
+}
+
+function main() {
+  const args = process.argv.slice(2);
+  const inputFile = args[0];
+  const outputFile = args[1];
+  const timePerMove = parseInt(args[2] || '1000');
+  const maxDepth = parseInt(args[3] || '22');
+  const multiPv = parseInt(args[4] || '1');
+  const budget = parseBudget(args[5] || 'time', timePerMove);
+  budget.depth = Math.min(budget.depth, maxDepth);
+
+  const lines = fs.readFileSync(inputFile, 'utf8').split('\n').filter(l => l.trim() !== '');
+  const out: string[] = [];
+
+  for (const line of lines) {
+    // Fresh table per position so results don't depend on the batch order
+    const result = searchMove(positionFromArray(JSON.parse(line)), budget, new TT(), multiPv);
+    out.push(JSON.stringify({
+      policy: result.best ? [[result.best.from * 32 + result.best.to, 1.0]] : [],
+      rootScores: result.rootScores && result.rootScores.length > 1
+        ? result.rootScores.map(r => [r.move.from * 32 + r.move.to, r.score]) : undefined,
+      searchDepth: result.depth,
+      searchScore: result.score,
+      searchNodes: result.nodes
+    }));
+  }
+
+  fs.writeFileSync(outputFile, out.join('\n') + '\n');
+  console.log(`Analyzed ${lines.length} positions (${budgetToString(budget)}, max depth ${budget.depth}, multi-PV ${multiPv})`);
+}
+
+main();
@@ -1,15 +1,18 @@
 import * as fs from 'fs';
-import { Position, initialPosition, isDrawByInactivity } from '../src/core/position';
+import * as readline from 'readline';
+import * as zlib from 'zlib';
+import { Position, Side, initialPosition, isDrawByInactivity } from '../src/core/position';
 import { generateMoves, applyMove, Move } from '../src/core/movegen';
-import { iterativeDeepening } from '../src/core/search/alphabeta';
 import { TT } from '../src/core/search/tt';
+import { Budget, parseBudget, budgetToString, searchMove } from '../src/core/search/budget';
 import { bitCount } from '../src/core/bitboards';
 import { evaluate } from '../src/core/eval';
 
 interface PositionData {
   state: number[];
-  legalMoves: number[][];
-  policyTarget: number[];
+  ply: number;  // plies played since the initial position (random / opening / fast plies included)
+  policy: [number, number][];  // sparse policy target: (from * 32 + to, probability) pairs
+  rootScores?: [number, number][];  // multi-PV: (from * 32 + to, search score) of the top-K root moves, best first
   searchDepth: number;
   searchScore: number;
   searchNodes: number;
@@ -17,8 +20,10 @@ interface PositionData {
 }
 
 interface GameRecord {
+  id: number;
   positions: PositionData[];
   result: number;
+  adjudicated?: 'resign' | 'draw';  // ended early by an adjudication rule
 }
 
 function positionToArray(p: Position): number[] {
@@ -32,84 +37,327 @@ function positionToArray(p: Position): number[] {
   ];
 }
 
-function moveToArray(m: Move): number[] {
-  return [m.from, m.to, m.captured.length, m.promote ? 1 : 0];
+function moveToPolicyPairs(m: Move): [number, number][] {
+  return [[m.from * 32 + m.to, 1.0]];
 }
 
-function moveToPolicyArray(m: Move): number[] {
-  const policy = new Array(32 * 32).fill(0);
-  const idx = m.from * 32 + m.to;
-  policy[idx] = 1.0;
-  return policy;
+// Seeded PRNG (same mulberry32 variant as zobrist.ts) so every game is reproducible
+function makeRng(seed: number): () => number {
+  return () => {
+    let t = (seed = (seed + 0x6D2B79F5) >>> 0);
+    t = Math.imul(t ^ (t >>> 15), 1 | t);
+    t ^= t + Math.imul(t ^ (t >>> 7), 61 | t);
+    return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+  };
 }
 
-function playOneGame(timePerMove: number): GameRecord | null {
+// Every game gets its own seed from (base seed, game id), so a resumed
+// batch replays exactly the games it still misses
+function gameSeed(seed: number, gameId: number): number {
+  return (seed ^ Math.imul(gameId + 1, 0x9E3779B1)) >>> 0;
+}
+
+// Openings sampled by ml/openings.py: {"plies": N, "positions": {id: state}}
+interface Openings {
+  plies: number;
+  positions: Map<number, Position>;
+}
+
+function positionFromArray(s: number[]): Position {
+  return {
+    p1Men: s[0] >>> 0,
+    p1Kings: s[1] >>> 0,
+    p2Men: s[2] >>> 0,
+    p2Kings: s[3] >>> 0,
+    side: s[4] as Side,
+    halfmoveClock: s[5]
+  };
+}
+
+function loadOpenings(openingsFile: string): Openings | null {
+  if (!openingsFile) return null;
+  const data = JSON.parse(fs.readFileSync(openingsFile, 'utf8'));
+  const positions = new Map<number, Position>();
+  for (const [id, state] of Object.entries(data.positions)) {
+    positions.set(parseInt(id), positionFromArray(state as number[]));
+  }
+  return { plies: data.plies, positions };
+}
+
+// Adjudication ends decided games early instead of playing them out at full
+// budget. Spec "resignScore,resignPlies,drawScore,drawPlies,drawFromPly":
+//   resign: |searchScore| >= resignScore for resignPlies plies in a row, all
+//           in favour of the same player -> that player wins
+//   draw:   |searchScore| <= drawScore for drawPlies plies in a row, counted
+//           from ply drawFromPly on -> draw
+// A rule with 0 plies is off; an empty spec turns adjudication off.
+interface Adjudication {
+  resignScore: number;
+  resignPlies: number;
+  drawScore: number;
+  drawPlies: number;
+  drawFromPly: number;
+}
+
+function parseAdjudication(spec: string): Adjudication | null {
+  if (!spec) return null;
+  const [resignScore, resignPlies, drawScore, drawPlies, drawFromPly] = spec.split(',').map(v => parseInt(v));
+  return { resignScore, resignPlies, drawScore, drawPlies, drawFromPly: drawFromPly || 0 };
+}
+
+function adjudicationToString(a: Adjudication): string {
+  const rules: string[] = [];
+  if (a.resignPlies > 0) rules.push(`resign at ${a.resignScore} for ${a.resignPlies} plies`);
+  if (a.drawPlies > 0) rules.push(`draw within ${a.drawScore} for ${a.drawPlies} plies from ply ${a.drawFromPly}`);
+  return rules.join(', ');
+}
+
+// Playout cap randomization: only a random fraction of plies get the full
+// budget and are recorded; the others are searched with a small fast budget
+// just to move the game on, so a CPU-hour plays more distinct games at the
+// same label quality. Spec "fraction,fastBudget", e.g. "0.25,nodes:2000".
+interface PlayoutCap {
+  fraction: number;
+  fast: Budget;
+}
+
+function parsePlayoutCap(spec: string, timePerMove: number): PlayoutCap | null {
+  if (!spec) return null;
+  const [fraction, fast] = spec.split(',');
+  return { fraction: parseFloat(fraction), fast: parseBudget(fast, timePerMove) };
+}
+
+function playOneGame(
+  id: number, budget: Budget, rng: () => number, randomPlies: number, openings: Openings | null = null,
+  multiPv = 1, adjudication: Adjudication | null = null, playoutCap: PlayoutCap | null = null
+): GameRecord | null {
   const positions: PositionData[] = [];
+  let resignRun = 0;
+  let resignWinner = 0;
+  let drawRun = 0;
 
   let pos = initialPosition();
   const tt = new TT();
   let plyCount = 0;
   const MAX_PLIES = 200;
 
+  // A sampled opening replaces the random plies (it already counts as played)
+  const opening = openings ? openings.positions.get(id) : undefined;
+  if (openings && opening) {
+    pos = opening;
+    plyCount = openings.plies;
+    randomPlies = 0;
+  }
+
+  // Random opening plies (not searched, not recorded) so parallel workers
+  // with different seeds don't replay the same deterministic game
+  for (let i = 0; i < randomPlies; i++) {
+    const moves = generateMoves(pos);
+    if (moves.length === 0) break;
+    pos = applyMove(pos, moves[Math.floor(rng() * moves.length)]);
+    plyCount++;
+  }
+
   while (plyCount < MAX_PLIES) {
     if (isDrawByInactivity(pos)) {
-      return { positions, result: 0 };
+      return { id, positions, result: 0 };
     }
 
     const legalMoves = generateMoves(pos);
     if (legalMoves.length === 0) {
       const result = pos.side === 1 ? -1 : 1;
-      return { positions, result };
+      return { id, positions, result };
     }
 
-    const searchResult = iterativeDeepening(pos, timePerMove, tt);
+    const fast = playoutCap !== null && rng() >= playoutCap.fraction;
+    const searchResult = fast && playoutCap
+      ? searchMove(pos, playoutCap.fast, tt, 1)
+      : searchMove(pos, budget, tt, multiPv);
     if (!searchResult.best) {
       console.error('No move found');
       return null;
     }
 
-    const posData: PositionData = {
-      state: positionToArray(pos),
-      legalMoves: legalMoves.map(moveToArray),
-      policyTarget: moveToPolicyArray(searchResult.best),
-      searchDepth: searchResult.depth,
-      searchScore: searchResult.score,
-      searchNodes: searchResult.nodes,
-      evaluation: evaluate(pos)
-    };
+    if (!fast) {
+      const posData: PositionData = {
+        state: positionToArray(pos),
+        ply: plyCount,
+        policy: moveToPolicyPairs(searchResult.best),
+        searchDepth: searchResult.depth,
+        searchScore: searchResult.score,
+        searchNodes: searchResult.nodes,
+        evaluation: evaluate(pos)
+      };
+      if (searchResult.rootScores && searchResult.rootScores.length > 1) {
+        posData.rootScores = searchResult.rootScores.map(r => [r.move.from * 32 + r.move.to, r.score]);
+      }
+      positions.push(posData);
+    }
 
-    positions.push(posData);
+    // Only full-budget plies count toward adjudication: fast playout-cap
+    // scores are too shallow to end a game on. searchScore is from the side
+    // to move's view.
+    if (adjudication && !fast) {
+      const score = searchResult.score;
+      const winner = Math.sign(score) * pos.side;
+      if (Math.abs(score) >= adjudication.resignScore) {
+        resignRun = winner === resignWinner ? resignRun + 1 : 1;
+        resignWinner = winner;
+      } else {
+        resignRun = 0;
+      }
+      drawRun = plyCount >= adjudication.drawFromPly && Math.abs(score) <= adjudication.drawScore ? drawRun + 1 : 0;
+      if (adjudication.resignPlies > 0 && resignRun >= adjudication.resignPlies) {
+        return { id, positions, result: resignWinner, adjudicated: 'resign' };
+      }
+      if (adjudication.drawPlies > 0 && drawRun >= adjudication.drawPlies) {
+        return { id, positions, result: 0, adjudicated: 'draw' };
+      }
+    }
 
     pos = applyMove(pos, searchResult.best);
     plyCount++;
   }
 
-  return { positions, result: 0 };
+  return { id, positions, result: 0 };
+}
+
+
+// Appends one compact JSON record per finished game (NDJSON) to the batch
+// journal, outputFile + '.partial'. With a .gz output file every record is
+// its own gzip member, so the stream stays readable while it grows. Each
+// record is fsynced before its id goes into the completed-games manifest,
+// so after a crash every id in the manifest has a complete record and at
+// most the game in flight is lost. The journal is renamed to outputFile
+// once the batch is done, so resume never mistakes a partial batch for a
+// finished one.
+function openGameWriter(outputFile: string, manifestFile: string) {
+  const partialFile = outputFile + '.partial';
+  const gzip = outputFile.endsWith('.gz');
+  const fd = fs.openSync(partialFile, 'a');
+  return {
+    write(game: GameRecord) {
+      const line = JSON.stringify(game) + '\n';
+      fs.writeSync(fd, gzip ? zlib.gzipSync(line) : Buffer.from(line));
+      fs.fsyncSync(fd);
+      markCompleted(manifestFile, game.id);
+    },
+    close() {
+      fs.closeSync(fd);
+      fs.renameSync(partialFile, outputFile);
+    }
+  };
+}
+
+// Completed-games manifest: one game id per line. Games that failed are
+// listed too (without a record), so resume doesn't retry them forever.
+function readCompleted(manifestFile: string): Set<number> {
+  if (!manifestFile || !fs.existsSync(manifestFile)) return new Set();
+  const ids = fs.readFileSync(manifestFile, 'utf8').split('\n').filter(l => l.trim() !== '');
+  return new Set(ids.map(l => parseInt(l)));
+}
+
+function markCompleted(manifestFile: string, id: number) {
+  if (!manifestFile) return;
+  const fd = fs.openSync(manifestFile, 'a');
+  fs.writeSync(fd, `${id}\n`);
+  fs.fsyncSync(fd);
+  fs.closeSync(fd);
+}
+
+// Persistent worker mode (ml/generator_pool.py): one JSON game request per
+// stdin line, one JSON line back on stdout per request - the game record, or
+// {"id", "failed": true} when the search found no move - after a first
+// {"ready": true} line once the script has loaded. The process stays up for
+// the whole run, so startup and JIT warm-up are paid once.
+interface GameRequest {
+  id: number;
+  timePerMove: number;
+  budget?: string;  // see parseBudget(); default "time"
+  seed: number;
+  randomPlies: number;
+  opening?: number[] | null;  // start position state, played openingPlies plies in
+  openingPlies?: number;
+  multiPv?: number;
+  adjudication?: string;  // see parseAdjudication(); default off
+  playoutCap?: string;  // see parsePlayoutCap(); default off (every ply full budget)
+}
+
+function serve() {
+  process.stdout.write(JSON.stringify({ ready: true }) + '\n');
+  const rl = readline.createInterface({ input: process.stdin, terminal: false });
+  rl.on('line', line => {
+    if (line.trim() === '') return;
+    const req: GameRequest = JSON.parse(line);
+    const openings: Openings | null = req.opening
+      ? { plies: req.openingPlies || 0, positions: new Map([[req.id, positionFromArray(req.opening)]]) }
+      : null;
+    const game = playOneGame(req.id, parseBudget(req.budget || 'time', req.timePerMove), makeRng(gameSeed(req.seed, req.id)), req.randomPlies,
+                             openings, req.multiPv || 1, parseAdjudication(req.adjudication || ''),
+                             parsePlayoutCap(req.playoutCap || '', req.timePerMove));
+    process.stdout.write(JSON.stringify(game || { id: req.id, failed: true }) + '\n');
+  });
 }
 
 function main() {
   const args = process.argv.slice(2);
+  if (args[0] === '--serve') {
+    serve();
+    return;
+  }
   const numGames = parseInt(args[0] || '100');
   const timePerMove = parseInt(args[1] || '500');
-  const outputFile = args[2] || 'games_data.json';
+  const outputFile = args[2] || 'games_data.ndjson';
+  const seed = parseInt(args[3] || '0');
+  const randomPlies = parseInt(args[4] || '0');
+  const firstGameId = parseInt(args[5] || '0');
+  const manifestFile = args[6] || '';
+  const openings = loadOpenings(args[7] || '');
+  const multiPv = parseInt(args[8] || '1');
+  const budget = parseBudget(args[9] || 'time', timePerMove);
+  const adjudication = parseAdjudication(args[10] || '');
+  const playoutCap = parsePlayoutCap(args[11] || '', timePerMove);
 
-  console.log(`Generating ${numGames} games with ${timePerMove}ms per move...`);
+  const completed = readCompleted(manifestFile);
+  const gameIds: number[] = [];
+  for (let id = firstGameId; id < firstGameId + numGames; id++) {
+    if (!completed.has(id)) gameIds.push(id);
+  }
+
+  const openingStr = openings ? `${openings.plies}-ply sampled openings` : `${randomPlies} random plies`;
+  const pvStr = multiPv > 1 ? `, multi-PV ${multiPv}` : '';
+  console.log(`Generating ${numGames} games with ${budgetToString(budget)} (seed ${seed}, ${openingStr}${pvStr})...`);
+  if (adjudication) {
+    console.log(`Adjudication: ${adjudicationToString(adjudication)}`);
+  }
+  if (playoutCap) {
+    console.log(`Playout cap: ${playoutCap.fraction} of plies full and recorded, rest ${budgetToString(playoutCap.fast)}`);
+  }
+  if (gameIds.length < numGames) {
+    console.log(`Resuming: ${numGames - gameIds.length} games already in the journal`);
+  }
 
-  const allGames: GameRecord[] = [];
+  const writer = openGameWriter(outputFile, manifestFile);
+  let saved = 0;
 
-  for (let i = 0; i < numGames; i++) {
-    console.log(`Game ${i + 1}/${numGames}...`);
-    const game = playOneGame(timePerMove);
+  for (const id of gameIds) {
+    console.log(`Game ${id - firstGameId + 1}/${numGames}...`);
+    const game = playOneGame(id, budget, makeRng(gameSeed(seed, id)), randomPlies, openings, multiPv, adjudication,
+                             playoutCap);
     if (game) {
-      allGames.push(game);
+      writer.write(game);
+      saved++;
       const resultStr = game.result === 1 ? 'P1 wins' : game.result === -1 ? 'P2 wins' : 'Draw';
-      const avgDepth = game.positions.reduce((s, p) => s + p.searchDepth, 0) / game.positions.length;
-      console.log(`  ${resultStr} (${game.positions.length} moves, avg depth: ${avgDepth.toFixed(1)})`);
+      const avgDepth = game.positions.reduce((s, p) => s + p.searchDepth, 0) / Math.max(game.positions.length, 1);
+      const adjudicatedStr = game.adjudicated ? `, adjudicated: ${game.adjudicated}` : '';
+      console.log(`  ${resultStr} (${game.positions.length} moves, avg depth: ${avgDepth.toFixed(1)}${adjudicatedStr})`);
+    } else {
+      markCompleted(manifestFile, id);
     }
   }
 
-  fs.writeFileSync(outputFile, JSON.stringify(allGames, null, 2));
-  console.log(`\nSaved ${allGames.length} games to ${outputFile}`);
+  writer.close();
+  console.log(`\nSaved ${saved} games to ${outputFile}`);
 }
 
-main();
\ No newline at end of file
+main();
@@ -8,7 +8,8 @@ import { hashPosition } from './zobrist';
 import { bitCount } from '../bitboards';
 
 export interface SearchInfo { depth: number; score: number; nodes: number; pv: Move[]; }
-export interface SearchResult { best?: Move; score: number; nodes: number; depth: number; }
+export interface RootScore { move: Move; score: number; }
+export interface SearchResult { best?: Move; score: number; nodes: number; depth: number; rootScores?: RootScore[]; }
 type OnInfo = (info: SearchInfo) => void;
 
 const INF = 1e9 | 0;
@@ -19,40 +20,70 @@ const killers0 = new Int32Array(MAX_PLY).fill(-1);
 const killers1 = new Int32Array(MAX_PLY).fill(-1);
 const history = new Int32Array(32 * 32);
 
+// Nodes searched in the current iteration, and how many it may still use
+// (the node budget minus the nodes of earlier iterations)
+interface NodeCount { nodes: number; limit: number; }
+function outOfBudget(deadline: number, acc: NodeCount): boolean {
+  return Date.now() > deadline || acc.nodes > acc.limit;
+}
+
 function keyMove(m: Move) { return (m.from << 5) | m.to; }
 function sameMove(m: Move, key: number) { return key === ((m.from << 5) | m.to); }
 
-export function iterativeDeepening(root: Position, timeMs: number, tt = new TT(), onInfo?: OnInfo): SearchResult {
+// multiPv > 1 also returns the exact scores of the best multiPv root moves
+// (rootScores, best first) from the last completed depth.
+// Budgets: timeMs (wall clock), maxDepth and maxNodes; the search stops at
+// whichever is hit first. With timeMs = Infinity the result only depends on
+// the position, the table and the depth / node limits, not on machine load.
+// When maxNodes runs out, onNodeLimit (if given) may return a bigger node
+// budget; the interrupted depth is then searched again and deepening goes on.
+export function iterativeDeepening(root: Position, timeMs: number, tt = new TT(), onInfo?: OnInfo, maxDepth = 22, multiPv = 1,
+                                   maxNodes = Infinity, onNodeLimit?: () => number): SearchResult {
   const deadline = Date.now() + timeMs;
   killers0.fill(-1); killers1.fill(-1); history.fill(0);
 
   let best: Move | undefined; let bestScore = 0; let nodes = 0; let reached = 0;
   let lastScore = 0; let haveLast = false;
-
-  for (let depth = 1; depth <= 22; depth++) {
-    let alpha = haveLast ? lastScore - 80 : -INF;
+  let rootScores: RootScore[] | undefined;
+  let depthScores: RootScore[] = [];
+
+  for (let depth = 1; depth <= maxDepth; depth++) {
+    const nodeLimit = depth === 1 ? Infinity : maxNodes;  // always finish depth 1, so there is a move
+    // Multi-PV keeps the lower side of the window open: root moves failing
+    // low against an aspiration alpha only get upper bounds, not scores
+    let alpha = haveLast && multiPv === 1 ? lastScore - 80 : -INF;
     let beta  = haveLast ? lastScore + 80 : +INF;
 
     let result;
     while (true) {
-      const st = { nodes: 0 };
-      result = searchRoot(root, depth, alpha, beta, tt, deadline, st, 0);
+      const st = { nodes: 0, limit: nodeLimit - nodes };
+      depthScores = [];
+      result = searchRoot(root, depth, alpha, beta, tt, deadline, st, 0, multiPv, depthScores);
       nodes += st.nodes;
 
-      if (Date.now() > deadline) break;
+      if (Date.now() > deadline || nodes > nodeLimit) break;
       if (result.score <= alpha) { alpha = Math.max(-INF, alpha - 160); continue; } // fail-low
       if (result.score >= beta)  { beta  = Math.min(+INF, beta  + 160); continue; } // fail-high
       break;
     }
 
     if (Date.now() > deadline) break;
-    if (result.move) { best = result.move; bestScore = result.score; reached = depth; }
+    if (nodes > nodeLimit) {
+      const extended = onNodeLimit?.() ?? maxNodes;
+      if (extended <= maxNodes) break;
+      maxNodes = extended; depth--;  // redo the interrupted depth (the table keeps its work)
+      continue;
+    }
+    if (result.move) {
+      best = result.move; bestScore = result.score; reached = depth;
+      if (multiPv > 1) rootScores = depthScores.sort((x, y) => y.score - x.score).slice(0, multiPv);
+    }
     lastScore = result.score; haveLast = true;
 
     onInfo?.({ depth, score: bestScore, nodes, pv: getPV(root, tt, 12) });
   }
 
-  return { best, score: bestScore, nodes, depth: reached };
+  return { best, score: bestScore, nodes, depth: reached, rootScores };
 }
 
 
@@ -64,7 +95,8 @@ function clampDepth(parentDepth: number, childDepth: number): number {
   return childDepth;
 }
 
-function searchRoot(pos: Position, depth: number, alpha: number, beta: number, tt: TT, deadline: number, acc: {nodes: number}, ply: number) {
+function searchRoot(pos: Position, depth: number, alpha: number, beta: number, tt: TT, deadline: number, acc: NodeCount, ply: number,
+                    multiPv = 1, rootScores?: RootScore[]) {
   if (isDrawByInactivity(pos)) return { move: undefined as Move | undefined, score: 0 };
   const moves = generateMoves(pos);
   if (moves.length === 0) return { move: undefined as Move | undefined, score: -999999 + ply };
@@ -79,7 +111,7 @@ function searchRoot(pos: Position, depth: number, alpha: number, beta: number, t
   const a0 = alpha, b0 = beta;
 
   for (let i = 0; i < ordered.length; i++) {
-    if (Date.now() > deadline) break;
+    if (outOfBudget(deadline, acc)) break;
     const m = ordered[i];
     const child = applyMove(pos, m);
 
@@ -102,17 +134,24 @@ function searchRoot(pos: Position, depth: number, alpha: number, beta: number, t
     if (lateQuiet) depthToUse = d - 1;
     depthToUse = clampDepth(depth, depthToUse);
 
+    // Multi-PV: a move only has to be proven worse than the multiPv-th best
+    // score so far, so the top multiPv moves all get exact scores (the root
+    // alpha is -INF then, see iterativeDeepening); moves failing low against
+    // the floor rank below them and are cut by the slice
+    const floor = multiPv > 1 ? Math.min(alpha, kthBestScore(rootScores ?? [], multiPv, a0)) : alpha;
+
     let sc: number;
     if (i === 0) {
-      sc = -alphabeta(child, depthToUse, -beta, -alpha, tt, deadline, acc, ply + 1);
+      sc = -alphabeta(child, depthToUse, -beta, -floor, tt, deadline, acc, ply + 1);
     } else {
-      sc = -alphabeta(child, depthToUse, -(alpha + 1), -alpha, tt, deadline, acc, ply + 1);
-      if (sc > alpha && sc < beta) {
-        sc = -alphabeta(child, depthToUse, -beta, -alpha, tt, deadline, acc, ply + 1);
+      sc = -alphabeta(child, depthToUse, -(floor + 1), -floor, tt, deadline, acc, ply + 1);
+      if (sc > floor && sc < beta) {
+        sc = -alphabeta(child, depthToUse, -beta, -floor, tt, deadline, acc, ply + 1);
       }
     }
 
     acc.nodes++;
+    rootScores?.push({ move: m, score: sc });
     if (sc > bestScore) { bestScore = sc; bestMove = m; }
     if (sc > alpha) alpha = sc;
     if (alpha >= beta) {
@@ -130,10 +169,15 @@ function searchRoot(pos: Position, depth: number, alpha: number, beta: number, t
   return { move: bestMove, score: bestScore };
 }
 
-function alphabeta(pos: Position, depth: number, alpha: number, beta: number, tt: TT, deadline: number, acc: {nodes: number}, ply: number): number {
+function kthBestScore(scores: RootScore[], k: number, fallback: number): number {
+  if (scores.length < k) return fallback;
+  return scores.map(s => s.score).sort((x, y) => y - x)[k - 1];
+}
+
+function alphabeta(pos: Position, depth: number, alpha: number, beta: number, tt: TT, deadline: number, acc: NodeCount, ply: number): number {
   if (isDrawByInactivity(pos)) return 0;
   if (ply >= MAX_PLY - 1) return evaluate(pos);
-  if (Date.now() > deadline) return evaluate(pos);
+  if (outOfBudget(deadline, acc)) return evaluate(pos);
   if (depth <= 0) return quiesce(pos, alpha, beta, deadline, acc, ply);
 
   const key = hashPosition(pos);
@@ -155,7 +199,7 @@ function alphabeta(pos: Position, depth: number, alpha: number, beta: number, tt
   let bestKey = -1;
 
   for (let i = 0; i < ordered.length; i++) {
-    if (Date.now() > deadline) break;
+    if (outOfBudget(deadline, acc)) break;
     const m = ordered[i];
     const child = applyMove(pos, m);
 
@@ -203,10 +247,10 @@ function alphabeta(pos: Position, depth: number, alpha: number, beta: number, tt
   return best;
 }
 
-function quiesce(pos: Position, alpha: number, beta: number, deadline: number, acc: {nodes: number}, ply: number): number {
+function quiesce(pos: Position, alpha: number, beta: number, deadline: number, acc: NodeCount, ply: number): number {
   if (isDrawByInactivity(pos)) return 0;
   if (ply >= MAX_PLY - 1) return evaluate(pos);
-  if (Date.now() > deadline) return evaluate(pos);
+  if (outOfBudget(deadline, acc)) return evaluate(pos);
 
   let stand = evaluate(pos);
   if (stand >= beta) return stand;
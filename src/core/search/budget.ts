@@ -0,0 +1,69 @@
+// src/core/search/budget.ts
+// Search budgets shared by scripts/generate_games.ts and scripts/analyze_positions.ts
+import { Position } from '../position';
+import { iterativeDeepening, SearchInfo, SearchResult } from './alphabeta';
+import { TT } from './tt';
+
+// Search budget per move. "time" uses timePerMove of wall clock; the others
+// are deterministic (no wall clock), so labels don't depend on machine load
+// or on how many workers share the machine:
+//   time:MS     MS milliseconds instead of timePerMove
+//   depth:D     search to depth D
+//   nodes:N     stop after about N nodes (the last completed depth counts)
+//   adaptive:N  N nodes, and ADAPTIVE_FACTOR * N in total when the score or
+//               best move still changed between the last two completed depths
+export type BudgetMode = 'time' | 'depth' | 'nodes' | 'adaptive';
+
+export interface Budget {
+  mode: BudgetMode;
+  timeMs: number;
+  depth: number;
+  nodes: number;
+}
+
+const ADAPTIVE_FACTOR = 4;
+const VOLATILE_SCORE = 30;  // score swing between depths that counts as volatile
+
+export function parseBudget(spec: string, timePerMove: number): Budget {
+  const [mode, value] = (spec || 'time').split(':');
+  const budget: Budget = { mode: mode as BudgetMode, timeMs: timePerMove, depth: 22, nodes: Infinity };
+  if (mode === 'time' && value) {
+    budget.timeMs = parseInt(value);
+  } else if (mode === 'depth') {
+    budget.timeMs = Infinity; budget.depth = parseInt(value);
+  } else if (mode === 'nodes' || mode === 'adaptive') {
+    budget.timeMs = Infinity; budget.nodes = parseInt(value);
+  } else if (mode !== 'time') {
+    throw new Error(`Unknown budget ${spec}`);
+  }
+  if (!(budget.timeMs >= 1 && budget.depth >= 1 && budget.nodes >= 1)) {
+    throw new Error(`Budget ${spec} must be at least 1`);  // depth 0 never completes a depth: no move
+  }
+  return budget;
+}
+
+export function budgetToString(b: Budget): string {
+  if (b.mode === 'time') return `${b.timeMs}ms per move`;
+  if (b.mode === 'depth') return `depth ${b.depth} per move`;
+  return `${b.nodes} nodes per move${b.mode === 'adaptive' ? ' (adaptive)' : ''}`;
+}
+
+export function searchMove(pos: Position, budget: Budget, tt: TT, multiPv: number): SearchResult {
+  if (budget.mode !== 'adaptive') {
+    return iterativeDeepening(pos, budget.timeMs, tt, undefined, budget.depth, multiPv, budget.nodes);
+  }
+  // When the N nodes run out, keep deepening up to ADAPTIVE_FACTOR * N in
+  // total if the last two completed depths disagree
+  const scores: number[] = [];
+  const bestMoves: number[] = [];
+  const onInfo = (info: SearchInfo) => {
+    scores.push(info.score);
+    bestMoves.push(info.pv.length > 0 ? info.pv[0].from * 32 + info.pv[0].to : -1);
+  };
+  const onNodeLimit = () => {
+    const n = scores.length;
+    const volatile = n >= 2 && (Math.abs(scores[n - 1] - scores[n - 2]) > VOLATILE_SCORE || bestMoves[n - 1] !== bestMoves[n - 2]);
+    return volatile ? budget.nodes * ADAPTIVE_FACTOR : budget.nodes;
+  };
+  return iterativeDeepening(pos, Infinity, tt, onInfo, budget.depth, multiPv, budget.nodes, onNodeLimit);
+}